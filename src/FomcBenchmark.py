@@ -0,0 +1,287 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing import get_context
+from datetime import datetime
+from queue import Empty
+import subprocess
+import threading
+import tempfile
+import platform
+import resource
+import hashlib
+import shutil
+import json
+import time
+import sys
+import os
+
+import requests
+
+# Benchmark cases. The calendar is run by FomcGetCalendar.get_calendar and the others by FomcBase subclasses.
+cases_all = ('calendar', 'statement', 'minutes', 'meeting_script', 'presconf_script', 'speech', 'testimony')
+upstream_url = 'https://www.federalreserve.gov'
+class_names = {
+    'statement': 'FomcStatement',
+    'minutes': 'FomcMinutes',
+    'meeting_script': 'FomcMeetingScript',
+    'presconf_script': 'FomcPresConfScript',
+    'speech': 'FomcSpeech',
+    'testimony': 'FomcTestimony'
+}
+# Modules which should not be loaded only to import a scraper class
+heavy_modules = ('pandas', 'textract', 'sklearn', 'scipy', 'torch')
+# Default budget in milliseconds to import the package and a scraper class in a new interpreter
+import_budget_ms = 300
+
+class FixtureStore:
+    '''
+    Recorded responses stored as one file per body with an index of path -> (status, content type, body file)
+    '''
+    def __init__(self, fixtures_dir):
+        self.fixtures_dir = fixtures_dir
+        self.index_path = os.path.join(fixtures_dir, 'index.json')
+        self.lock = threading.Lock()
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                self.index = json.load(f)
+
+    def get(self, path):
+        entry = self.index.get(path)
+        if entry is None:
+            return None
+        with open(os.path.join(self.fixtures_dir, 'bodies', entry['body']), 'rb') as f:
+            return entry['status'], entry['content_type'], f.read()
+
+    def put(self, path, status, content_type, body):
+        body_name = hashlib.sha1(body).hexdigest()
+        os.makedirs(os.path.join(self.fixtures_dir, 'bodies'), exist_ok=True)
+        with open(os.path.join(self.fixtures_dir, 'bodies', body_name), 'wb') as f:
+            f.write(body)
+        with self.lock:
+            self.index[path] = {'status': status, 'content_type': content_type, 'body': body_name}
+            with open(self.index_path + '.tmp', 'w') as f:
+                json.dump(self.index, f, indent=1, sort_keys=True)
+            os.replace(self.index_path + '.tmp', self.index_path)
+
+    def snapshot_id(self):
+        '''
+        Returns a hash of the index, so that results are compared only on the same snapshot
+        '''
+        return hashlib.sha1(json.dumps(self.index, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    '''
+    A local stand-in of the FOMC website. In record mode, responses are fetched from the website and recorded.
+    In replay mode, only recorded responses are served and the others are 404.
+    '''
+    store = None
+    record = False
+    latency = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        response = self.store.get(self.path)
+        if response is None and self.record:
+            res = requests.get(upstream_url + self.path)
+            response = (res.status_code, res.headers.get('Content-Type', 'text/html'), res.content)
+            self.store.put(self.path, *response)
+        if response is None:
+            response = (404, 'text/html', b'')
+        elif self.latency > 0:
+            time.sleep(self.latency)
+
+        status, content_type, body = response
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class UnthrottledLimiter:
+    '''
+    A pass-through of FomcRateLimiter.get, so that a replay measures the scraper rather than the rate limit
+    '''
+    def get(self, url, get=requests.get, metrics=None, content_type=''):
+        return get(url)
+
+def run_case(case, base_url, from_year, max_threads, result_queue, throttle=False):
+    '''
+    Run one case in a separate process and put the result to the queue, so that the peak RSS is per case.
+    The rate limiter of the scrapers is kept only if throttle is True, i.e. when recording from the website.
+    '''
+    from fomc_get_data.FomcMetrics import FomcMetrics
+    metrics = FomcMetrics(mode='full')
+    work_dir = tempfile.mkdtemp(prefix='fomc_bench_') + '/'
+    os.makedirs(work_dir + 'script_pdf', exist_ok=True)
+
+    start = time.perf_counter()
+    if case == 'calendar':
+        from FomcGetCalendar import get_calendar
+
+        def timed_get(url):
+            with metrics.timer('article', case):
+                return requests.get(url)
+        df = get_calendar(from_year, base_url, get=timed_get)
+        # Documents of the calendar are the calendar and historical pages
+        docs = metrics.stages[(case, 'article')][0]
+    else:
+        import fomc_get_data
+        fomc = getattr(fomc_get_data, class_names[case])(verbose=False, max_threads=max_threads, base_dir=work_dir)
+        fomc.metrics = metrics
+        if not throttle:
+            fomc.limiter = UnthrottledLimiter()
+        fomc.base_url = base_url
+        fomc.calendar_url = base_url + '/monetarypolicy/fomccalendars.htm'
+        if hasattr(fomc, 'speech_base_url'):
+            fomc.speech_base_url = base_url + '/newsevents/speech'
+        df = fomc.get_contents(from_year, resume=False)
+        docs = len(df)
+    seconds = time.perf_counter() - start
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+    stages = {stage: total for (content_type, stage), (count, total, buckets) in metrics.stages.items()}
+    result_queue.put({
+        'case': case,
+        'docs': docs,
+        'seconds': seconds,
+        'docs_per_second': docs / seconds if seconds > 0 else 0.0,
+        'p50_seconds': metrics.percentile('article', 50, case),
+        'p99_seconds': metrics.percentile('article', 99, case),
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'bytes': metrics.counters.get((case, 'bytes'), 0),
+        'stage_seconds': stages
+    })
+
+def measure_import(case, repeat=5):
+    '''
+    Returns the median milliseconds to import the scraper class of the case in a new interpreter,
+     and the heavy modules loaded by the import
+    '''
+    code = ("import time; start = time.perf_counter(); import fomc_get_data; fomc_get_data.{}; "
+            "elapsed = (time.perf_counter() - start) * 1000; import sys; "
+            "print(elapsed, ','.join(m for m in {!r} if m in sys.modules))").format(class_names[case], heavy_modules)
+    timings = []
+    for i in range(repeat):
+        output = subprocess.check_output([sys.executable, '-c', code]).decode('utf-8').split()
+        timings.append(float(output[0]))
+        loaded = output[1] if len(output) > 1 else ''
+    return sorted(timings)[repeat // 2], loaded
+
+def check_imports(budget_ms):
+    '''
+    Print the import time per content type and returns False if any exceeds the budget or loads a heavy module
+    '''
+    ok = True
+    print("{:<16}{:>10}  {}".format('case', 'import ms', 'heavy modules'))
+    for case in class_names:
+        ms, loaded = measure_import(case)
+        over = ms > budget_ms or loaded != ''
+        ok = ok and not over
+        print("{:<16}{:>10.1f}  {}{}".format(case, ms, loaded or '-', '  OVER BUDGET' if over else ''))
+    return ok
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], stderr=subprocess.DEVNULL).decode('utf-8').strip()
+    except Exception:
+        return 'unknown'
+
+def print_results(results, baseline=None):
+    base = {r['case']: r for r in baseline['results']} if baseline else {}
+    print("{:<16}{:>8}{:>10}{:>10}{:>10}{:>10}{:>10}{:>10}".format('case', 'docs', 'seconds', 'docs/s', 'p50 ms', 'p99 ms', 'rss MB', 'vs base'))
+    for r in results:
+        p50 = r['p50_seconds'] * 1000 if r['p50_seconds'] is not None else float('nan')
+        p99 = r['p99_seconds'] * 1000 if r['p99_seconds'] is not None else float('nan')
+        ratio = ''
+        if r['case'] in base and r['seconds'] > 0:
+            ratio = "{:.2f}x".format(base[r['case']]['seconds'] / r['seconds'])
+        print("{:<16}{:>8}{:>10.2f}{:>10.1f}{:>10.1f}{:>10.1f}{:>10.1f}{:>10}".format(
+            r['case'], r['docs'], r['seconds'], r['docs_per_second'], p50, p99, r['peak_rss_mb'], ratio))
+
+if __name__ == '__main__':
+    '''
+    This program benchmarks the scrapers against a local stand-in server replaying recorded responses.
+        record: run all cases through the server in record mode, which fetches from the FOMC website once
+        run: run cases only from the recorded responses and save the result with the git commit
+        imports: check the time to import each scraper class against the budget
+    Results are saved in ../data/benchmark/results. Specify a previous result file to compare.
+    '''
+    pg_name = sys.argv[0]
+    args = sys.argv[1:]
+
+    if len(args) < 1 or args[0] not in ('record', 'run', 'imports'):
+        print("Usage: python {} record|run [from_year] [case,...] [baseline result json]".format(pg_name))
+        print("   cases: ", ','.join(cases_all))
+        print("       python {} imports [budget_ms]".format(pg_name))
+        sys.exit(1)
+
+    mode = args[0]
+    if mode == 'imports':
+        # Fails when importing a scraper class takes longer than the budget or loads a heavy module
+        budget_ms = float(args[1]) if len(args) > 1 else import_budget_ms
+        sys.exit(0 if check_imports(budget_ms) else 1)
+    from_year = int(args[1]) if len(args) > 1 else 2010
+    cases = args[2].split(',') if len(args) > 2 else list(cases_all)
+    baseline_path = args[3] if len(args) > 3 else None
+    for case in cases:
+        if case not in cases_all:
+            print("Unknown case: ", case)
+            sys.exit(1)
+
+    bench_dir = '../data/benchmark/'
+    ReplayHandler.store = FixtureStore(bench_dir + 'fixtures')
+    ReplayHandler.record = (mode == 'record')
+    ReplayHandler.latency = float(os.environ.get('FOMC_BENCH_LATENCY', '0'))
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ReplayHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = 'http://127.0.0.1:{}'.format(server.server_address[1])
+    print("Stand-in server on {} ({} mode, {} recorded responses)".format(base_url, mode, len(ReplayHandler.store.index)))
+
+    # Each case runs in a spawned process to measure peak RSS separately
+    ctx = get_context('spawn')
+    results = []
+    for case in cases:
+        print("Running ", case)
+        queue = ctx.Queue()
+        p = ctx.Process(target=run_case, args=(case, base_url, from_year, 10, queue, mode == 'record'))
+        p.start()
+        result = None
+        while result is None and (p.is_alive() or not queue.empty()):
+            try:
+                result = queue.get(timeout=1)
+            except Empty:
+                pass
+        p.join()
+        if result is None:
+            print("Failed: {} exited with code {}".format(case, p.exitcode))
+            continue
+        results.append(result)
+    server.shutdown()
+
+    if mode == 'record':
+        print("Recorded {} responses in {}".format(len(ReplayHandler.store.index), bench_dir + 'fixtures'))
+        sys.exit(0)
+
+    output = {
+        'commit': git_commit(),
+        'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'snapshot': ReplayHandler.store.snapshot_id(),
+        'from_year': from_year,
+        'python': platform.python_version(),
+        'results': results
+    }
+    baseline = None
+    if baseline_path:
+        with open(baseline_path, 'r') as f:
+            baseline = json.load(f)
+        if baseline.get('snapshot') != output['snapshot'] or baseline.get('from_year') != from_year:
+            print("Warning: the baseline is taken on a different snapshot or from_year, so not comparable.")
+    print_results(results, baseline)
+
+    filepath = bench_dir + 'results/{}_{}.json'.format(datetime.now().strftime('%Y%m%d_%H%M%S'), output['commit'])
+    os.makedirs(os.path.dirname(filepath), exist_ok=True)
+    print("Writing to ", filepath)
+    with open(filepath, 'w') as f:
+        json.dump(output, f, indent=2)
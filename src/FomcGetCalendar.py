@@ -11,6 +11,9 @@ from bs4 import BeautifulSoup
 
 from tqdm import tqdm
 
+from fomc_get_data.FomcArchive import FomcArchive
+from fomc_get_data.FomcRateLimiter import FomcRateLimiter
+
 def dump_df(df, filename="output"):
         '''
         Dump an internal DataFrame df to a pickle file and csv
@@ -36,45 +39,16 @@ def is_integer(n):
     else:
         return float(n).is_integer()
 
-if __name__ == '__main__':
+def get_calendar(from_year=1936, base_url='https://www.federalreserve.gov', get=requests.get):
     '''
-    This program get all calendar date of the past and announced FOMC meetings.
-    The first argument is optional to specify from which year to get the date.
-    It creates a dataframe and saves a pickle file and csv file.
+    Returns a dataframe of all past and announced FOMC meeting dates from from_year.
+    get is a function which takes a url and returns a response, requests.get by default.
     '''
-    # FOMC website URLs
-    base_url = 'https://www.federalreserve.gov'
     calendar_url = base_url + '/monetarypolicy/fomccalendars.htm'
-
     date_list = []
-    pg_name = sys.argv[0]
-
-    if len(sys.argv) != 2:
-        print("Usage: ", pg_name)
-        print("Please specify the first argument between 1936 and 2015")
-        sys.exit(1)    
-        
-    from_year = sys.argv[1]
-
-    # Handles the first argument, from_year
-    if from_year:
-        if is_integer(from_year):
-            from_year = int(from_year)
-        else:
-            print("Usage: ", pg_name)
-            print("Please specify the first argument between 1936 and 2015")
-            sys.exit(1)
-        
-        if (from_year < 1936) or (from_year>2015):
-            print("Usage: ", pg_name)
-            print("Please specify the first argument between 1936 and 2015")
-            sys.exit(1)
-    else:
-        from_year = 1936
-        print("From year is set as 1936. Please specify the year as the first argument if required.")
 
     # Retrieve FOMC Meeting date from current page - from 2015 to 2020
-    r = requests.get(calendar_url)
+    r = get(calendar_url)
     soup = BeautifulSoup(r.text, 'html.parser')
     panel_divs = soup.find_all('div', {"class": "panel panel-default"})
 
@@ -121,7 +95,7 @@ if __name__ == '__main__':
     # Retrieve FOMC Meeting date older than 2015
     for year in range(from_year, 2015):
         hist_url = base_url + '/monetarypolicy/fomchistorical' + str(year) + '.htm'
-        r = requests.get(hist_url)
+        r = get(hist_url)
         soup = BeautifulSoup(r.text, 'html.parser')
         if year in (2011, 2012, 2013, 2014):
             panel_headings = soup.find_all('h5', {"class": "panel-heading"})
@@ -153,6 +127,52 @@ if __name__ == '__main__':
 
     df = pd.DataFrame(date_list).sort_values(by=['date'])
     df.reset_index(drop=True, inplace=True)
+    return df
+
+if __name__ == '__main__':
+    '''
+    This program get all calendar date of the past and announced FOMC meetings.
+    The first argument is optional to specify from which year to get the date.
+    It creates a dataframe and saves a pickle file and csv file.
+    '''
+    # FOMC website URLs
+    base_url = 'https://www.federalreserve.gov'
+
+    pg_name = sys.argv[0]
+
+    if len(sys.argv) != 2:
+        print("Usage: ", pg_name)
+        print("Please specify the first argument between 1936 and 2015")
+        sys.exit(1)    
+        
+    from_year = sys.argv[1]
+
+    # Handles the first argument, from_year
+    if from_year:
+        if is_integer(from_year):
+            from_year = int(from_year)
+        else:
+            print("Usage: ", pg_name)
+            print("Please specify the first argument between 1936 and 2015")
+            sys.exit(1)
+        
+        if (from_year < 1936) or (from_year>2015):
+            print("Usage: ", pg_name)
+            print("Please specify the first argument between 1936 and 2015")
+            sys.exit(1)
+    else:
+        from_year = 1936
+        print("From year is set as 1936. Please specify the year as the first argument if required.")
+
+    # Raw responses are archived with those of FomcGetData.py. FOMC_ARCHIVE=replay gets them only from the archive.
+    limiter = FomcRateLimiter()
+    archive_mode = os.environ.get('FOMC_ARCHIVE', 'record')
+    if archive_mode != 'off':
+        archive = FomcArchive('../data/FOMC/archive/', mode=archive_mode)
+        df = get_calendar(from_year, base_url, get=lambda url: archive.get(url, limiter.get))
+        archive.close()
+    else:
+        df = get_calendar(from_year, base_url, get=limiter.get)
     print(df)
 
     # Save
@@ -1,22 +1,39 @@
-from datetime import date
-import numpy as np
-import pandas as pd
-import pickle
 import sys
-from fomc_get_data.FomcStatement import FomcStatement
-from fomc_get_data.FomcMinutes import FomcMinutes
-from fomc_get_data.FomcMeetingScript import FomcMeetingScript
-from fomc_get_data.FomcPresConfScript import FomcPresConfScript
-from fomc_get_data.FomcSpeech import FomcSpeech
-from fomc_get_data.FomcTestimony import FomcTestimony
+import os
+# Scraper classes are imported per content type in __main__, so that each run loads only what it uses
+import fomc_get_data
+from fomc_get_data.FomcMetrics import FomcMetrics
+from fomc_get_data.FomcArchive import FomcArchive
+from fomc_get_data.FomcRateLimiter import FomcRateLimiter
+
+# Shared by all content types. Set FOMC_METRICS=off|basic|full and FOMC_METRICS_PORT to serve /metrics
+metrics = FomcMetrics()
+# Raw responses are archived in ../data/FOMC/archive/. Set FOMC_ARCHIVE=replay to rebuild the corpus only from
+# the archive without the network, or FOMC_ARCHIVE=off not to archive.
+archive_mode = os.environ.get('FOMC_ARCHIVE', 'record')
+archive = FomcArchive('../data/FOMC/archive/', mode=archive_mode) if archive_mode != 'off' else None
+# One request budget for all content types, which adapts to the sustainable rate of the website
+limiter = FomcRateLimiter()
+# Outputs are saved as the pickle and text files, which the notebooks and the other tools read.
+# Set FOMC_STORAGE=both to save them to the compressed store in ../data/FOMC/store/ as well.
+storage = os.environ.get('FOMC_STORAGE', 'files')
 
 def download_data(fomc, from_year):
-    df = fomc.get_contents(from_year)
+    fomc.metrics = metrics
+    fomc.archive = archive
+    fomc.limiter = limiter
+    # Nothing to resume when the articles are extracted from the archive again
+    df = fomc.get_contents(from_year, resume=(archive_mode != 'replay'))
+    df = fomc.tag_duplicates()
     print("Shape of the downloaded data: ", df.shape)
     print("The first 5 rows of the data: \n", df.head())
     print("The last 5 rows of the data: \n", df.tail())
     fomc.pickle_dump_df(filename = fomc.content_type + ".pickle")
     fomc.save_texts(prefix = fomc.content_type + "/FOMC_" + fomc.content_type + "_")
+    if storage == 'both':
+        fomc.save_store()
+    if metrics.enabled:
+        metrics.write_json(fomc.base_dir + "metrics/" + fomc.content_type + ".json")
 
 if __name__ == '__main__':
     pg_name = sys.argv[0]
@@ -46,31 +63,22 @@ if __name__ == '__main__':
         print("Please specify the second argument between 1980 and 2020")
         sys.exit(1)
 
-    if content_type == 'all':
-        fomc = FomcStatement()
-        download_data(fomc, from_year)
-        fomc = FomcMinutes()
-        download_data(fomc, from_year)
-        fomc = FomcMeetingScript()
-        download_data(fomc, from_year)
-        fomc = FomcPresConfScript()
-        download_data(fomc, from_year)
-        fomc = FomcSpeech()
-        download_data(fomc, from_year)
-        fomc = FomcTestimony()
-        download_data(fomc, from_year)
-    else:
-        if content_type == 'statement':
-            fomc = FomcStatement()
-        elif content_type == 'minutes':
-            fomc = FomcMinutes()
-        elif content_type == 'meeting_script':
-            fomc = FomcMeetingScript()
-        elif content_type == 'presconf_script':
-            fomc = FomcPresConfScript()
-        elif content_type == 'speech':
-            fomc = FomcSpeech()
-        elif content_type == 'testimony':
-            fomc = FomcTestimony()
+    if storage not in ('files', 'both'):
+        print("FOMC_STORAGE should be either files or both. You gave: ", storage)
+        sys.exit(1)
+
+    if os.environ.get('FOMC_METRICS_PORT'):
+        metrics.start_http_server(int(os.environ['FOMC_METRICS_PORT']))
 
+    class_names = {
+        'statement': 'FomcStatement',
+        'minutes': 'FomcMinutes',
+        'meeting_script': 'FomcMeetingScript',
+        'presconf_script': 'FomcPresConfScript',
+        'speech': 'FomcSpeech',
+        'testimony': 'FomcTestimony'
+    }
+    content_types = content_type_all[:-1] if content_type == 'all' else (content_type,)
+    for content_type in content_types:
+        fomc = getattr(fomc_get_data, class_names[content_type])()
         download_data(fomc, from_year)
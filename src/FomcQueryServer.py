@@ -0,0 +1,310 @@
+from collections import OrderedDict
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import urlparse, parse_qs, urlencode
+from urllib.request import urlopen
+from urllib.error import HTTPError
+import http.client
+import threading
+import socket
+import pickle
+import json
+import glob
+import time
+import sys
+import os
+
+import pandas as pd
+
+class CorpusData:
+    '''
+    Read-only data loaded once from the outputs of FomcGetData.py, FomcGetCalendar.py and QuandlGetData.py.
+    A background thread checks modification time of the files, and reloads those updated by the ingestion.
+    '''
+    def __init__(self, fomc_dir='../data/FOMC/', quandl_dir='../data/MarketData/Quandl/', reload_interval=5, verbose=True):
+        self.fomc_dir = fomc_dir
+        self.quandl_dir = quandl_dir
+        self.reload_interval = reload_interval
+        self.verbose = verbose
+
+        self.lock = threading.Lock()
+        # name -> (mtime, DataFrame). Names are content types, 'fomc_calendar' and Quandl codes.
+        self.data = {}
+        # name -> mtime of the pickles which are not DataFrames, e.g. corpus_index.pickle, so that they are not loaded again
+        self.skipped = {}
+        # Incremented on every reload so that cached responses are invalidated
+        self.generation = 0
+        self.refresh()
+
+    def _scan(self):
+        '''
+        Returns a dict of name -> file path for all the files to serve
+        '''
+        files = {}
+        for filepath in glob.glob(os.path.join(self.fomc_dir, '*.pickle')):
+            files[os.path.basename(filepath)[:-len('.pickle')]] = filepath
+        for filepath in glob.glob(os.path.join(self.quandl_dir, '*.csv')):
+            files[os.path.basename(filepath)[:-len('.csv')]] = filepath
+        return files
+
+    def _load(self, filepath):
+        if filepath.endswith('.pickle'):
+            with open(filepath, 'rb') as input_file:
+                return pickle.load(input_file)
+        else:
+            df = pd.read_csv(filepath, parse_dates=[0], index_col=0)
+            df.index.name = 'date'
+            return df
+
+    def refresh(self):
+        '''
+        Load new or updated files and drop removed ones. Returns True if anything is reloaded.
+        '''
+        files = self._scan()
+        updates = {}
+        not_frames = []
+        for name, filepath in files.items():
+            try:
+                mtime = os.path.getmtime(filepath)
+                if name in self.data and self.data[name][0] == mtime or self.skipped.get(name) == mtime:
+                    continue
+                if self.verbose: print("Loading ", filepath)
+                df = self._load(filepath)
+                if not isinstance(df, pd.DataFrame):
+                    if self.verbose: print("Skipping {}, which is not a DataFrame".format(filepath))
+                    self.skipped[name] = mtime
+                    if name in self.data:
+                        not_frames.append(name)
+                    continue
+                self.skipped.pop(name, None)
+                updates[name] = (mtime, df)
+            except Exception as e:
+                # The file may be being written by the ingestion. Try again next time.
+                print("Failed to load {}: {}".format(filepath, e))
+
+        removed = [name for name in self.data if name not in files] + not_frames
+        for name in list(self.skipped):
+            if name not in files:
+                del self.skipped[name]
+        if updates or removed:
+            with self.lock:
+                self.data.update(updates)
+                for name in removed:
+                    del self.data[name]
+                self.generation += 1
+            return True
+        return False
+
+    def start_watcher(self):
+        '''
+        Start a daemon thread to reload updated files periodically
+        '''
+        def watch():
+            while True:
+                time.sleep(self.reload_interval)
+                self.refresh()
+        thread = threading.Thread(target=watch, daemon=True)
+        thread.start()
+        return thread
+
+    def get(self, name):
+        with self.lock:
+            entry = self.data.get(name)
+        return None if entry is None else entry[1]
+
+    def names(self):
+        with self.lock:
+            return sorted(self.data.keys())
+
+class QueryHandler(BaseHTTPRequestHandler):
+    '''
+    Handles GET requests:
+        /datasets
+        /documents/<content_type>?from=yyyy-mm-dd&to=yyyy-mm-dd&speaker=...&contents=1
+        /documents/<content_type>/<index>
+        /calendar?from=yyyy-mm-dd&to=yyyy-mm-dd
+        /series/<quandl_code>?from=yyyy-mm-dd&to=yyyy-mm-dd  (e.g. /series/FRED_DFF)
+    '''
+    corpus = None
+    cache = OrderedDict()
+    cache_size = 256
+    cache_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        if self.corpus.verbose:
+            sys.stderr.write("[{}] {}\n".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), format % args))
+
+    def _filter_dates(self, df, params, column=None):
+        dates = df.index if column is None else df[column]
+        mask = pd.Series(True, index=df.index)
+        if 'from' in params:
+            mask &= (dates >= pd.Timestamp(params['from'][0]))
+        if 'to' in params:
+            mask &= (dates <= pd.Timestamp(params['to'][0]))
+        return df.loc[mask.values]
+
+    def _query(self, parts, params):
+        '''
+        Returns (status, JSON string) for the request
+        '''
+        if parts == ['datasets']:
+            return 200, json.dumps(self.corpus.names())
+
+        if len(parts) in (2, 3) and parts[0] == 'documents':
+            df = self.corpus.get(parts[1])
+            if df is None or 'contents' not in df.columns:
+                return 404, json.dumps({'error': 'content type not found: ' + parts[1]})
+            if len(parts) == 3:
+                if not parts[2].isdigit() or int(parts[2]) >= len(df):
+                    return 404, json.dumps({'error': 'document not found: ' + parts[2]})
+                df = df.iloc[[int(parts[2])]]
+            else:
+                df = self._filter_dates(df, params, 'date')
+                if 'speaker' in params:
+                    df = df.loc[df['speaker'].isin(params['speaker'])]
+                if params.get('contents', ['0'])[0] != '1':
+                    df = df.drop(columns=['contents'])
+            return 200, df.reset_index().rename(columns={'index': 'id'}).to_json(orient='records', date_format='iso')
+
+        if parts == ['calendar']:
+            df = self.corpus.get('fomc_calendar')
+            if df is None:
+                return 404, json.dumps({'error': 'fomc_calendar not found'})
+            return 200, self._filter_dates(df, params, 'date').to_json(orient='records', date_format='iso')
+
+        if len(parts) == 2 and parts[0] == 'series':
+            df = self.corpus.get(parts[1])
+            if df is None or 'contents' in df.columns:
+                return 404, json.dumps({'error': 'series not found: ' + parts[1]})
+            return 200, self._filter_dates(df, params).reset_index().to_json(orient='records', date_format='iso')
+
+        return 404, json.dumps({'error': 'unknown path'})
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        key = (self.corpus.generation, url.path, url.query)
+        with self.cache_lock:
+            response = self.cache.get(key)
+            if response is not None:
+                self.cache.move_to_end(key)
+
+        if response is None:
+            parts = [part for part in url.path.split('/') if part]
+            try:
+                response = self._query(parts, parse_qs(url.query))
+            except Exception as e:
+                response = (400, json.dumps({'error': str(e)}))
+            if response[0] == 200:
+                with self.cache_lock:
+                    self.cache[key] = response
+                    while len(self.cache) > self.cache_size:
+                        self.cache.popitem(last=False)
+
+        status, body = response
+        body = body.encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+class UnixQueryHandler(QueryHandler):
+    '''
+    QueryHandler for a unix socket, which has no client address
+    '''
+    def address_string(self):
+        return 'unix'
+
+class ThreadingUnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    '''
+    HTTPConnection over a unix socket
+    '''
+    def __init__(self, socket_path, timeout=60):
+        super().__init__('localhost', timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+class FomcQueryClient:
+    '''
+    A thin client of the query server, which returns DataFrames.
+    base_url is either http://host:port or unix:<socket path> of the server.
+    Example Usage:
+        client = FomcQueryClient('http://127.0.0.1:8050')
+        df = client.documents('statement', from_date='2015-01-01')
+        client = FomcQueryClient('unix:/tmp/fomc.sock')
+    '''
+    def __init__(self, base_url='http://127.0.0.1:8050'):
+        self.base_url = base_url.rstrip('/')
+        self.socket_path = base_url[len('unix:'):] if base_url.startswith('unix:') else None
+
+    def _get(self, path, params):
+        query = urlencode([(k, v) for k, v in params.items() if v is not None])
+        url = path + ('?' + query if query else '')
+        if self.socket_path is None:
+            with urlopen(self.base_url + url) as res:
+                return json.loads(res.read().decode('utf-8'))
+
+        conn = UnixHTTPConnection(self.socket_path)
+        try:
+            conn.request('GET', url)
+            res = conn.getresponse()
+            body = res.read()
+            if res.status != 200:
+                raise HTTPError('unix:' + self.socket_path + url, res.status, res.reason, res.headers, None)
+            return json.loads(body.decode('utf-8'))
+        finally:
+            conn.close()
+
+    def _to_df(self, records):
+        df = pd.DataFrame(records)
+        if 'date' in df.columns:
+            df['date'] = pd.to_datetime(df['date'])
+        return df
+
+    def documents(self, content_type, from_date=None, to_date=None, speaker=None, contents=True):
+        params = {'from': from_date, 'to': to_date, 'speaker': speaker, 'contents': 1 if contents else 0}
+        return self._to_df(self._get('/documents/' + content_type, params))
+
+    def calendar(self, from_date=None, to_date=None):
+        return self._to_df(self._get('/calendar', {'from': from_date, 'to': to_date}))
+
+    def series(self, code, from_date=None, to_date=None):
+        return self._to_df(self._get('/series/' + code.replace('/', '_'), {'from': from_date, 'to': to_date})).set_index('date')
+
+if __name__ == '__main__':
+    '''
+    This program serves the downloaded FOMC documents, calendar and Quandl data from a single process.
+    The first argument is optional to specify a port number (default 8050) or a unix socket path.
+    '''
+    pg_name = sys.argv[0]
+    args = sys.argv[1:]
+
+    if len(args) > 1:
+        print("Usage: ", pg_name, "[port or unix socket path]")
+        sys.exit(1)
+
+    address = args[0] if len(args) == 1 else '8050'
+    QueryHandler.corpus = CorpusData()
+    QueryHandler.corpus.start_watcher()
+
+    if address.isdigit():
+        server = ThreadingHTTPServer(('127.0.0.1', int(address)), QueryHandler)
+        print("Serving on http://127.0.0.1:{}".format(address))
+    else:
+        if os.path.exists(address):
+            os.remove(address)
+        server = ThreadingUnixHTTPServer(address, UnixQueryHandler)
+        print("Serving on unix socket ", address)
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
@@ -0,0 +1,303 @@
+from multiprocessing import Process
+import pickle
+import json
+import time
+import sys
+import os
+import re
+
+import fomc_get_data
+from fomc_get_data.FomcMetrics import FomcMetrics
+from fomc_get_data.FomcArchive import FomcArchive
+from fomc_get_data.FomcRateLimiter import FomcRateLimiter
+from fomc_get_data.FomcLinkRecords import FomcLinkRecords
+from fomc_get_data.FomcShardQueue import FomcShardQueue
+
+class_names = {
+    'statement': 'FomcStatement',
+    'minutes': 'FomcMinutes',
+    'meeting_script': 'FomcMeetingScript',
+    'presconf_script': 'FomcPresConfScript',
+    'speech': 'FomcSpeech',
+    'testimony': 'FomcTestimony'
+}
+
+base_dir = '../data/FOMC/'
+shard_dir = base_dir + 'shards/'
+# Same as FomcGetData. FOMC_ARCHIVE=replay rebuilds only from the archive, FOMC_STORAGE=files|both for the merge.
+archive_mode = os.environ.get('FOMC_ARCHIVE', 'record')
+storage = os.environ.get('FOMC_STORAGE', 'files')
+# Requests per second to the website by all workers of all nodes together, the same as the limit of FomcGetData.
+# Set FOMC_SHARD_NODES to the number of nodes running the workers when planning.
+max_rate = 20.0
+
+def _scraper(content_type, rate_limit=max_rate):
+    '''
+    Returns a scraper of the content type with the archive and a rate limiter of this process up to rate_limit
+    '''
+    fomc = getattr(fomc_get_data, class_names[content_type])(verbose=False, base_dir=base_dir)
+    fomc.metrics = FomcMetrics()
+    fomc.archive = FomcArchive(base_dir + 'archive/', mode=archive_mode) if archive_mode != 'off' else None
+    fomc.limiter = FomcRateLimiter(rate=min(5.0, rate_limit), min_rate=min(0.5, rate_limit), max_rate=rate_limit)
+    return fomc
+
+def _budget_path(queue):
+    return os.path.join(queue.queue_dir, 'budget.json')
+
+def _rate_limit(queue, processes):
+    '''
+    Returns the rate limit of a worker process, splitting max_rate by all worker processes of all nodes
+    '''
+    nodes = 1
+    if os.path.exists(_budget_path(queue)):
+        with open(_budget_path(queue), 'r') as f:
+            nodes = json.load(f)['nodes']
+    return max_rate / (nodes * processes)
+
+def _write_pickle(path, obj):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + '.tmp', 'wb') as f:
+        pickle.dump(obj, f)
+    os.replace(path + '.tmp', path)
+
+def _shard_path(content_type, year, ext='.pickle'):
+    return os.path.join(shard_dir, content_type, str(year) + ext)
+
+def plan(content_types, from_year, queue, score=False, nodes=1):
+    '''
+    Get the links of the content types and put an ingest task per (content type, year) to the queue.
+    If score is True, each ingest task puts a score task of the same shard when it is done.
+    The number of nodes is kept in the queue, so that the workers split the request budget between all nodes.
+    '''
+    with open(_budget_path(queue), 'w') as f:
+        json.dump({'nodes': nodes, 'max_rate': max_rate}, f)
+    for content_type in content_types:
+        fomc = _scraper(content_type)
+        fomc._get_links(from_year)
+        shards = {}
+        for position, record in enumerate(fomc.records):
+            shards.setdefault(record.date.year, []).append(
+                [position, record.link, record.date.strftime('%Y-%m-%d'), record.speaker, record.title])
+
+        # Outputs of the previous plan are removed, so that the merge never mixes two plans
+        os.makedirs(os.path.join(shard_dir, content_type), exist_ok=True)
+        for name in os.listdir(os.path.join(shard_dir, content_type)):
+            os.remove(os.path.join(shard_dir, content_type, name))
+        for year, links in sorted(shards.items()):
+            task = {'kind': 'ingest', 'content_type': content_type, 'year': year, 'links': links, 'score': score}
+            queue.put('ingest-{}-{}'.format(content_type, year), task, replace=True)
+        with open(os.path.join(shard_dir, content_type, 'plan.json'), 'w') as f:
+            json.dump({'from_year': from_year, 'years': sorted(shards), 'links': len(fomc.records)}, f)
+        print("Planned {} shards of {} links for {}".format(len(shards), len(fomc.records), content_type))
+
+def run_ingest(task, queue, processes=1):
+    '''
+    Get the articles of the links in the task and save them as the shard output
+    '''
+    content_type, year = task['content_type'], task['year']
+    fomc = _scraper(content_type, _rate_limit(queue, processes))
+    fomc.records = FomcLinkRecords()
+    positions = []
+    for position, link, date, speaker, title in task['links']:
+        fomc.records.append(link, date, speaker, title)
+        positions.append(position)
+    fomc.failures = {}
+    fomc.journal = None
+    fomc._get_articles_multi_threaded()
+    if fomc.archive is not None:
+        fomc.archive.close()
+    if fomc.failures:
+        return "{} of {} articles failed: {}".format(len(fomc.failures), len(positions), '; '.join(
+            "{} - {}".format(link, error) for link, error in sorted(fomc.failures.items())))
+
+    df = fomc.records.to_frame(fomc.articles)
+    df['position'] = positions
+    _write_pickle(_shard_path(content_type, year), df)
+    if task.get('score'):
+        queue.put('score-{}-{}'.format(content_type, year), {'kind': 'score', 'content_type': content_type, 'year': year}, replace=True)
+    return None
+
+# Loaded once per worker process
+_engine = None
+
+def run_score(task, queue, processes=1):
+    '''
+    Score the sentences of the documents in the shard by the BERT model and save them as the shard output
+    '''
+    global _engine
+    import pandas as pd
+    if _engine is None:
+        from fomc_analysis.BertInference import BertInference
+        _engine = BertInference(verbose=False)
+
+    content_type, year = task['content_type'], task['year']
+    df = pd.read_pickle(_shard_path(content_type, year))
+    rows = []
+    for date, link_position, contents in zip(df['date'], df['position'], df['contents']):
+        # Same sentence split as the sentiment handler of FomcWatcher
+        sentences = [s.strip() for section in (contents or '').split('[SECTION]') for s in re.split(r'(?<=\.)\s+', section) if s.strip()]
+        for i, sentence in enumerate(sentences):
+            rows.append((content_type, date, link_position, i, sentence))
+    sent_df = pd.DataFrame(rows, columns=['type', 'date', 'position', 'sentence', 'text'])
+    if len(sent_df) > 0:
+        sent_df = _engine.score_df(sent_df, 'text')
+    _write_pickle(_shard_path(content_type, year, '.scores.pickle'), sent_df)
+    return None
+
+def _worker_loop(queue_dir, processes, idle_timeout):
+    queue = FomcShardQueue(queue_dir)
+    runners = {'ingest': run_ingest, 'score': run_score}
+    idle_since = None
+    while True:
+        task = queue.claim()
+        if task is None:
+            if queue.requeue_stale() > 0:
+                continue
+            # Running tasks may still put score tasks, so wait until the queue is empty
+            if queue.empty():
+                return
+            idle_since = idle_since or time.time()
+            if idle_timeout is not None and time.time() - idle_since > idle_timeout:
+                return
+            time.sleep(1)
+            continue
+        idle_since = None
+        print("[{}] {} {} {}".format(queue.worker_id, task['kind'], task['content_type'], task['year']))
+        try:
+            with queue.heartbeat(task):
+                error = runners[task['kind']](task, queue, processes)
+        except Exception as e:
+            error = "{}: {}".format(type(e).__name__, e)
+        if error is None:
+            queue.complete(task)
+        else:
+            print("[{}] Failed {}: {}".format(queue.worker_id, task['id'], error))
+            queue.fail(task, error)
+
+def work(queue_dir, processes=1, idle_timeout=None):
+    '''
+    Run the tasks in the queue by the local worker processes until the queue is empty.
+    Run this on each node sharing the data directory to scale out, with the same number of processes on each node,
+     as the rate limit of each process is max_rate / (nodes in the plan * processes).
+    '''
+    if processes == 1:
+        _worker_loop(queue_dir, processes, idle_timeout)
+        return
+    workers = [Process(target=_worker_loop, args=(queue_dir, processes, idle_timeout)) for _ in range(processes)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+
+def _read_plan(content_type):
+    path = os.path.join(shard_dir, content_type, 'plan.json')
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def merge(content_types):
+    '''
+    Merge the shard outputs of each content type to the same pickle and text files as FomcGetData,
+     in the order of the date and then the order of the links. Content types with missing shards are skipped.
+    '''
+    import pandas as pd
+    for content_type in content_types:
+        plan_info = _read_plan(content_type)
+        if plan_info is None:
+            print("No plan for {}".format(content_type))
+            continue
+        missing = [year for year in plan_info['years'] if not os.path.exists(_shard_path(content_type, year))]
+        if missing:
+            print("Skipping {}: shards of {} are not done".format(content_type, ','.join(str(year) for year in missing)))
+            continue
+
+        df = pd.concat([pd.read_pickle(_shard_path(content_type, year)) for year in plan_info['years']], ignore_index=True)
+        df = df.sort_values(by=['date', 'position'], kind='mergesort').drop(columns=['position']).reset_index(drop=True)
+        fomc = getattr(fomc_get_data, class_names[content_type])(base_dir=base_dir)
+        fomc.df = df
+        df = fomc.tag_duplicates()
+        print("Shape of the merged data: ", df.shape)
+        fomc.pickle_dump_df(filename = fomc.content_type + ".pickle")
+        fomc.save_texts(prefix = fomc.content_type + "/FOMC_" + fomc.content_type + "_")
+        if storage == 'both':
+            fomc.save_store()
+
+        scores = [_shard_path(content_type, year, '.scores.pickle') for year in plan_info['years']]
+        if all(os.path.exists(path) for path in scores):
+            sent_df = pd.concat([pd.read_pickle(path) for path in scores], ignore_index=True)
+            sent_df = sent_df.sort_values(by=['date', 'position', 'sentence'], kind='mergesort').reset_index(drop=True)
+            _write_pickle(base_dir + 'sentence_scores/' + content_type + '.pickle', sent_df)
+            print("Merged {} scored sentences of {}".format(len(sent_df), content_type))
+
+def status(queue):
+    counts = queue.counts()
+    print(', '.join("{}: {}".format(state, counts[state]) for state in queue.states))
+    for task in queue.tasks('failed'):
+        print("  {} - {}".format(task['id'], task.get('error')))
+
+if __name__ == '__main__':
+    '''
+    This program splits the crawl and the sentence scoring into (content type, year) shards, run by any number
+     of worker processes on one or more nodes sharing ../data/FOMC/shards/, and merges the outputs.
+        plan content_type|all [from_year] [score] - put the shards to the queue. Set FOMC_SHARD_NODES to the number of nodes.
+        work [processes] - run the shards in the queue until it is empty
+        merge [content_type|all] - merge the outputs to the pickle and text files
+        status - show the numbers of shards per state and the failures
+        retry - put the failed shards back to the queue
+    '''
+    pg_name = sys.argv[0]
+    args = sys.argv[1:]
+    content_type_all = tuple(class_names) + ('all',)
+    commands = ('plan', 'work', 'merge', 'status', 'retry')
+
+    def usage():
+        print("Usage: ", pg_name, "plan content_type [from_year] [score] | work [processes] | merge [content_type] | status | retry")
+        print("Please specify content_type from ", content_type_all)
+        print("\n You specified: ", ','.join(args))
+        sys.exit(1)
+
+    if len(args) == 0 or args[0] not in commands:
+        usage()
+    if storage not in ('files', 'both'):
+        print("FOMC_STORAGE should be either files or both. You gave: ", storage)
+        sys.exit(1)
+
+    queue = FomcShardQueue(shard_dir + 'queue/')
+    command = args[0]
+    if command == 'plan':
+        if len(args) < 2 or len(args) > 4 or args[1].lower() not in content_type_all:
+            usage()
+        content_type = args[1].lower()
+        try:
+            from_year = int(args[2]) if len(args) >= 3 else 1990
+        except ValueError:
+            usage()
+        if (from_year < 1980) or (from_year > 2020):
+            print("Please specify from_year between 1980 and 2020")
+            sys.exit(1)
+        score = len(args) == 4 and args[3] == 'score'
+        try:
+            nodes = int(os.environ.get('FOMC_SHARD_NODES', '1'))
+        except ValueError:
+            nodes = 0
+        if nodes < 1:
+            print("FOMC_SHARD_NODES should be the number of nodes running the workers. You gave: ", os.environ['FOMC_SHARD_NODES'])
+            sys.exit(1)
+        plan(content_type_all[:-1] if content_type == 'all' else (content_type,), from_year, queue, score, nodes)
+    elif command == 'work':
+        try:
+            processes = int(args[1]) if len(args) >= 2 else os.cpu_count()
+        except ValueError:
+            usage()
+        work(queue.queue_dir, processes)
+        status(queue)
+    elif command == 'merge':
+        content_type = args[1].lower() if len(args) >= 2 else 'all'
+        if content_type not in content_type_all:
+            usage()
+        merge(content_type_all[:-1] if content_type == 'all' else (content_type,))
+    elif command == 'status':
+        status(queue)
+    elif command == 'retry':
+        print("{} failed shards are put back to the queue".format(queue.retry_failed()))
@@ -0,0 +1,416 @@
+from datetime import datetime, timedelta
+import threading
+import hashlib
+import pickle
+import json
+import time
+import sys
+import os
+import re
+
+import requests
+
+import fomc_get_data
+from fomc_get_data.FomcLinkRecords import FomcLinkRecords
+from fomc_get_data.FomcRateLimiter import FomcRateLimiter
+
+class FomcEventQueue:
+    '''
+    A local queue of events in a directory. Each event is a JSON file written atomically, named by time
+     so that consumers read them in order. pop() claims the oldest event by renaming it, so that each event is
+     consumed by only one consumer process.
+    '''
+    def __init__(self, queue_dir='../data/FOMC/events/'):
+        self.queue_dir = queue_dir
+        self.lock = threading.Lock()
+        self.seq = 0
+        os.makedirs(queue_dir, exist_ok=True)
+
+    def put(self, event):
+        with self.lock:
+            self.seq += 1
+            name = '{}-{}-{:06d}.json'.format(datetime.now().strftime('%Y%m%d%H%M%S%f'), os.getpid(), self.seq)
+        tmp_path = os.path.join(self.queue_dir, '.' + name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(event, f)
+        os.replace(tmp_path, os.path.join(self.queue_dir, name))
+        return name
+
+    def pop(self):
+        '''
+        Returns the oldest event and removes it from the queue, or None if empty
+        '''
+        for name in sorted(os.listdir(self.queue_dir)):
+            if name.startswith('.') or not name.endswith('.json'):
+                continue
+            claimed = os.path.join(self.queue_dir, '.' + name + '.claimed')
+            try:
+                os.rename(os.path.join(self.queue_dir, name), claimed)
+            except FileNotFoundError:
+                # Claimed by another consumer
+                continue
+            with open(claimed, 'r') as f:
+                event = json.load(f)
+            os.remove(claimed)
+            return event
+        return None
+
+class PolledPages:
+    '''
+    Pages already fetched by the watcher, served to the scrapers through the archive hook of FomcBase._get,
+     so that _get_links parses the polled page instead of fetching it again
+    '''
+    mode = 'record'
+
+    def __init__(self):
+        self.pages = {}
+
+    def get(self, url, get=requests.get):
+        res = self.pages.get(url)
+        return res if res is not None else get(url)
+
+class FomcWatcher:
+    '''
+    A long-running watcher of newly published documents.
+    It polls the calendar page and the press release index with conditional requests (ETag and Last-Modified),
+     and when either changed, finds the links by _get_links of each scraper and fetches only the new links.
+    The poll interval is tight around the scheduled release times of statements (the last day of the meeting)
+     and minutes (three weeks later) known from fomc_calendar, and loose otherwise.
+    New links are kept pending in the state until the article is retrieved, and tried again at every poll,
+     as a statement link can be listed before the page is published.
+    Each new document is put to the event queue, appended to the pickle of the content type and passed to the handlers.
+
+    Example Usage:
+        watcher = FomcWatcher(content_types=('statement', 'minutes'))
+        watcher.run()
+    '''
+    class_names = {
+        'statement': 'FomcStatement',
+        'minutes': 'FomcMinutes',
+        'presconf_script': 'FomcPresConfScript'
+    }
+    statement_pattern = re.compile(r'^/newsevents/pressreleases/monetary\d{8}[ax].htm')
+
+    # (seconds from a release time, min interval, max interval) from the closest to the release
+    intervals = [
+        (15 * 60, 2, 5),
+        (3 * 60 * 60, 15, 60),
+        (None, 300, 1800)
+    ]
+    # Releases are at 2:00 p.m. Eastern Time
+    release_hour = 14
+
+    def __init__(self, content_types=('statement', 'minutes'), base_dir='../data/FOMC/',
+                 calendar_path='../data/FOMC/fomc_calendar.pickle', queue=None, handlers=None,
+                 limiter=None, update_pickle=True, verbose=True):
+        self.content_types = content_types
+        self.base_dir = base_dir
+        self.queue = queue if queue is not None else FomcEventQueue(base_dir + 'events/')
+        self.handlers = handlers if handlers is not None else []
+        self.limiter = limiter if limiter is not None else FomcRateLimiter(rate=1, max_rate=5, max_concurrency=4)
+        self.update_pickle = update_pickle
+        self.verbose = verbose
+        self.state_path = base_dir + 'watcher/state.json'
+
+        self.pages = PolledPages()
+        self.scrapers = {}
+        for content_type in content_types:
+            fomc = getattr(fomc_get_data, self.class_names[content_type])(verbose=False, base_dir=base_dir)
+            fomc.limiter = self.limiter
+            fomc.archive = self.pages
+            self.scrapers[content_type] = fomc
+        base_url = self.scrapers[content_types[0]].base_url
+        self.calendar_url = base_url + '/monetarypolicy/fomccalendars.htm'
+        self.press_url = base_url + '/json/ne-press.json'
+
+        # url -> {'etag', 'last_modified', 'sha1'}, content type -> set of known links,
+        #  and content type -> {link: [date, speaker, title]} of new links not retrieved yet
+        self.validators = {}
+        self.known_links = {}
+        self.pending = {}
+        # Validators of the pages polled in this check, kept only after their links are found
+        self.polled = {}
+        self.load_state()
+        self.release_times = self._load_release_times(calendar_path)
+        self.interval = None
+
+    def load_state(self):
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r') as f:
+                state = json.load(f)
+            self.validators = state.get('validators', {})
+            self.known_links = {k: set(v) for k, v in state.get('links', {}).items()}
+            self.pending = state.get('pending', {})
+
+    def save_state(self):
+        os.makedirs(os.path.dirname(self.state_path), exist_ok=True)
+        state = {'validators': self.validators, 'links': {k: sorted(v) for k, v in self.known_links.items()},
+                 'pending': self.pending}
+        with open(self.state_path + '.tmp', 'w') as f:
+            json.dump(state, f, indent=1)
+        os.replace(self.state_path + '.tmp', self.state_path)
+
+    def _load_release_times(self, calendar_path):
+        '''
+        Returns a sorted list of the scheduled release times in Eastern Time (naive) from fomc_calendar
+        '''
+        if not os.path.exists(calendar_path):
+            print("{} not found. Run FomcGetCalendar.py to poll tightly around the meetings.".format(calendar_path))
+            return []
+        with open(calendar_path, 'rb') as f:
+            df = pickle.load(f)
+        release_times = []
+        for m_date in df['date']:
+            release = datetime(m_date.year, m_date.month, m_date.day, self.release_hour)
+            release_times.append(release)
+            if 'minutes' in self.content_types:
+                release_times.append(release + timedelta(days=21))
+        return sorted(release_times)
+
+    def _eastern_now(self):
+        try:
+            from zoneinfo import ZoneInfo
+            return datetime.now(ZoneInfo('America/New_York')).replace(tzinfo=None)
+        except ImportError:
+            import pytz
+            return datetime.now(pytz.timezone('America/New_York')).replace(tzinfo=None)
+
+    def _interval_range(self, now):
+        '''
+        Returns (min interval, max interval, seconds to the next tighter window) at now in Eastern Time
+        '''
+        distance = min([abs((t - now).total_seconds()) for t in self.release_times], default=None)
+        for i, (window, min_interval, max_interval) in enumerate(self.intervals):
+            if window is None or (distance is not None and distance <= window):
+                break
+        # Wake up when the next tighter window starts
+        next_window = None
+        if i > 0:
+            tighter = self.intervals[i - 1][0]
+            upcoming = [(t - now).total_seconds() - tighter for t in self.release_times if (t - now).total_seconds() > tighter]
+            next_window = min(upcoming) if upcoming else None
+        return min_interval, max_interval, next_window
+
+    def _next_sleep(self, changed):
+        min_interval, max_interval, next_window = self._interval_range(self._eastern_now())
+        if changed or self.interval is None:
+            self.interval = min_interval
+        else:
+            # Back off while nothing changes
+            self.interval = self.interval * 1.5
+        self.interval = max(min_interval, min(max_interval, self.interval))
+        if next_window is not None:
+            return max(1, min(self.interval, next_window))
+        return self.interval
+
+    def poll(self, url):
+        '''
+        GET the url with the validators of the last response. Returns the response, or None if not modified.
+        The new validators are kept in polled until check() has found the links of the page.
+        '''
+        validator = self.validators.get(url, {})
+        headers = {}
+        if validator.get('etag'):
+            headers['If-None-Match'] = validator['etag']
+        if validator.get('last_modified'):
+            headers['If-Modified-Since'] = validator['last_modified']
+
+        res = self.limiter.get(url, get=lambda u: requests.get(u, headers=headers, timeout=30))
+        if res.status_code == 304:
+            return None
+        if res.status_code >= 400:
+            print("Failed to poll {}: {}".format(url, res.status_code))
+            return None
+        digest = hashlib.sha1(res.content).hexdigest()
+        changed = digest != validator.get('sha1')
+        if not changed:
+            self.validators[url] = {'etag': res.headers.get('ETag'), 'last_modified': res.headers.get('Last-Modified'), 'sha1': digest}
+            return None
+        self.polled[url] = {'etag': res.headers.get('ETag'), 'last_modified': res.headers.get('Last-Modified'), 'sha1': digest}
+        return res
+
+    def _press_statement_links(self, res):
+        '''
+        Returns statement links in the press release index, which can be published before the calendar page
+        '''
+        try:
+            records = json.loads(res.text)
+        except ValueError:
+            return []
+        return [record['l'] for record in records if record.get('l') and self.statement_pattern.match(record['l'])]
+
+    def check(self):
+        '''
+        Poll the pages once, add new links to the pending ones and process the pending links.
+        Returns the number of new documents.
+        '''
+        self.polled.clear()
+        calendar_res = self.poll(self.calendar_url)
+        press_res = self.poll(self.press_url) if 'statement' in self.scrapers else None
+        if calendar_res is None and press_res is None and not any(self.pending.values()):
+            return 0
+
+        added = 0
+        try:
+            if calendar_res is not None or press_res is not None:
+                self._find_new_links(calendar_res, press_res)
+            # The pages are regarded as seen only after their links are found, so that a failure polls them again
+            self.validators.update(self.polled)
+            for content_type, fomc in self.scrapers.items():
+                pending = self.pending.get(content_type)
+                if not pending:
+                    continue
+                records = FomcLinkRecords()
+                for link, (date, speaker, title) in sorted(pending.items(), key=lambda x: (x[1][0], x[0])):
+                    records.append(link, date, speaker, title)
+                added += self._process_new(fomc, records)
+        finally:
+            self.polled.clear()
+            self.pages.pages.clear()
+            self.save_state()
+        return added
+
+    def _find_new_links(self, calendar_res, press_res):
+        '''
+        Find the links in the changed pages by the scrapers, and add the links not known to the pending ones
+        '''
+        if calendar_res is not None:
+            self.pages.pages[self.calendar_url] = calendar_res
+        year = self._eastern_now().year
+        for content_type, fomc in self.scrapers.items():
+            if calendar_res is not None:
+                fomc._get_links(year)
+            else:
+                fomc.records = FomcLinkRecords()
+            if content_type == 'statement' and press_res is not None:
+                listed = set(fomc.links)
+                for link in self._press_statement_links(press_res):
+                    if link not in listed:
+                        fomc._add_link(link)
+                        listed.add(link)
+
+            known = self.known_links.get(content_type)
+            if known is None:
+                # The first run only takes the current links as known
+                self.known_links[content_type] = set(fomc.links)
+                if self.verbose: print("{} links of {} are known".format(len(fomc.links), content_type))
+                continue
+            pending = self.pending.setdefault(content_type, {})
+            for record in fomc.records:
+                if record.link not in known and record.link not in pending:
+                    pending[record.link] = [record.date.strftime('%Y-%m-%d'), record.speaker, record.title]
+
+    def _process_new(self, fomc, records):
+        '''
+        Fetch the articles of the pending links, and emit the events. Links failed or empty stay pending.
+        '''
+        content_type = fomc.content_type
+        if self.verbose: print("{} pending links for {}: {}".format(len(records), content_type, ', '.join(records.links)))
+        fomc.records = records
+        fomc.failures = {}
+        fomc.journal = None
+        fomc._get_articles_multi_threaded()
+
+        rows = []
+        for i, record in enumerate(records):
+            contents = fomc.articles[i]
+            if record.link in fomc.failures or not contents.strip():
+                print("Not published yet or failed: {} {}".format(record.link, fomc.failures.get(record.link, '')))
+                continue
+            event = {
+                'event': 'new_document',
+                'content_type': content_type,
+                'link': record.link,
+                'date': record.date.strftime('%Y-%m-%d'),
+                'speaker': record.speaker,
+                'title': record.title,
+                'contents': contents,
+                'detected_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            }
+            for handler in self.handlers:
+                handler(event)
+            self.queue.put(event)
+            self.known_links[content_type].add(record.link)
+            self.pending[content_type].pop(record.link, None)
+            rows.append(i)
+            if self.verbose: print("New {} of {} published".format(content_type, event['date']))
+
+        if rows and self.update_pickle:
+            self._append_pickle(fomc, records.to_frame(fomc.articles).iloc[rows])
+        return len(rows)
+
+    def _append_pickle(self, fomc, new_df):
+        '''
+        Append new documents to the pickle written by FomcGetData, so that the query server and the index reload them
+        '''
+        import pandas as pd
+        filename = fomc.content_type + '.pickle'
+        filepath = fomc.base_dir + filename
+        if os.path.exists(filepath):
+            with open(filepath, 'rb') as f:
+                df = pickle.load(f)
+            if 'duplicate_of' in df.columns:
+                new_df = new_df.assign(duplicate_of=-1)
+            df = pd.concat([df, new_df], ignore_index=True)
+        else:
+            df = new_df
+        fomc.df = df.sort_values(by=['date']).reset_index(drop=True)
+        fomc.pickle_dump_df(filename=filename)
+
+    def run(self):
+        '''
+        Poll until interrupted
+        '''
+        while True:
+            try:
+                changed = self.check() > 0
+            except Exception as e:
+                # Keep watching on network errors
+                print("{} Failed to check: {}: {}".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), type(e).__name__, e))
+                changed = False
+            sleep = self._next_sleep(changed)
+            if self.verbose: print("{} Next poll in {:.0f} seconds".format(datetime.now().strftime('%Y-%m-%d %H:%M:%S'), sleep))
+            time.sleep(sleep)
+
+def sentiment_handler(model_path='../data/models/finphrase_bert_trained.dict'):
+    '''
+    Returns a handler which adds the number of sentences per predicted class by BertInference to the event
+    '''
+    from fomc_analysis.BertInference import BertInference
+    engine = BertInference(model_path=model_path, verbose=False)
+
+    def handler(event):
+        sentences = [s.strip() for section in event['contents'].split('[SECTION]') for s in re.split(r'(?<=\.)\s+', section) if s.strip()]
+        if not sentences:
+            return
+        predictions = engine.predict(sentences).argmax(axis=1)
+        event['sentiment'] = {name: int((predictions == i).sum()) for i, name in enumerate(engine.class_names)}
+    return handler
+
+if __name__ == '__main__':
+    '''
+    This program watches the FOMC website for newly published documents and puts events in ../data/FOMC/events/.
+    The first argument is optional to specify content types separated by comma (default statement,minutes).
+    Set FOMC_WATCH_SCORE=1 to score new documents by the BERT model.
+    '''
+    pg_name = sys.argv[0]
+    args = sys.argv[1:]
+
+    if len(args) > 1:
+        print("Usage: ", pg_name, "[content types separated by comma from {}]".format(','.join(FomcWatcher.class_names)))
+        sys.exit(1)
+
+    content_types = tuple(args[0].split(',')) if args else ('statement', 'minutes')
+    for content_type in content_types:
+        if content_type not in FomcWatcher.class_names:
+            print("Usage: ", pg_name, "[content types separated by comma from {}]".format(','.join(FomcWatcher.class_names)))
+            sys.exit(1)
+
+    handlers = []
+    if os.environ.get('FOMC_WATCH_SCORE') == '1':
+        handlers.append(sentiment_handler())
+    watcher = FomcWatcher(content_types=content_types, handlers=handlers)
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.save_state()
@@ -0,0 +1,254 @@
+from multiprocessing import get_context
+import hashlib
+import pickle
+import os
+
+import numpy as np
+
+# Engine shared with the forked worker processes. Set just before the pool is created.
+_worker_engine = None
+
+# Model versions by (path, size, mtime) of the state dict file, so that the file is hashed once per process
+_model_versions = {}
+
+def _init_worker(num_threads):
+    '''
+    Initializer of the worker processes. Limit torch threads so that the processes do not compete for cores
+    '''
+    import torch
+    torch.set_num_threads(num_threads)
+
+def _predict_batches(batches):
+    '''
+    Worker function for the process pool. Returns a list of (indices, probabilities) per batch
+    '''
+    return [(indices, _worker_engine._forward(input_ids)) for indices, input_ids in batches]
+
+class BertInference:
+    '''
+    A batched CPU inference engine for the FinPhrase BERT sentence classifier (finphrase_bert_trained.dict).
+    The state dict is loaded only once. Sentences are sorted by token length and grouped in dynamic batches
+     which are padded only to the longest sentence in the batch, instead of scoring one sentence at a time.
+    Optionally, int8 dynamic quantization is applied to the linear layers and the model is traced by TorchScript.
+    Batches can be sharded to multiple processes, each of which runs with a limited number of torch threads.
+    Predictions are cached by the hash of the sentence, so that a rerun scores only new sentences.
+
+    Example Usage:
+        engine = BertInference(cache_path='../data/models/finphrase_bert_cache.pickle')
+        result_df = engine.score_df(train_sent_df, 'text')
+        engine.save_cache()
+    '''
+    class_names = ['Negative', 'Neutral', 'Positive']
+
+    def __init__(self, model_path='../data/models/finphrase_bert_trained.dict', max_len=48, max_tokens=4096,
+                 quantize=False, torchscript=False, processes=1, cache_path=None, verbose=True):
+        self.model_path = model_path
+        self.max_len = max_len
+        self.max_tokens = max_tokens
+        self.quantize = quantize
+        self.torchscript = torchscript
+        self.processes = processes if processes else os.cpu_count()
+        self.cache_path = cache_path
+        self.verbose = verbose
+
+        self.model = None
+        self.tokenizer = None
+        self.model_version = self._get_model_version()
+        self.cache = {}
+        if self.cache_path is not None:
+            self.load_cache()
+
+    def _get_model_version(self):
+        '''
+        Returns a hash of the state dict file, used as the model version of the cached predictions.
+        The hash is kept with the size and mtime of the file in <model_path>.version, so that the large file
+         is hashed again only when it is replaced.
+        '''
+        stat = os.stat(self.model_path)
+        file_key = (os.path.abspath(self.model_path), stat.st_size, stat.st_mtime_ns)
+        version = _model_versions.get(file_key)
+        version_path = self.model_path + '.version'
+        if version is None and os.path.exists(version_path):
+            with open(version_path, 'rb') as f:
+                saved = pickle.load(f)
+            if saved.get('size') == stat.st_size and saved.get('mtime_ns') == stat.st_mtime_ns:
+                version = saved['version']
+        if version is None:
+            if self.verbose: print("Hashing the model file ", self.model_path)
+            sha = hashlib.sha1()
+            with open(self.model_path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    sha.update(chunk)
+            version = sha.hexdigest()[:16]
+            try:
+                with open(version_path + '.tmp', 'wb') as f:
+                    pickle.dump({'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'version': version}, f)
+                os.replace(version_path + '.tmp', version_path)
+            except OSError:
+                # The model directory may be read-only. The version is kept in this process only.
+                pass
+        _model_versions[file_key] = version
+        if self.quantize:
+            version += '-int8'
+        return version
+
+    def _load_model(self):
+        '''
+        Load the tokenizer and the model only once. torch and transformers are imported here as they are heavy.
+        '''
+        if self.model is not None:
+            return
+
+        import torch
+        from transformers import BertTokenizerFast, BertForSequenceClassification
+
+        if self.verbose: print("Loading a BERT model from ", self.model_path)
+        self.tokenizer = BertTokenizerFast.from_pretrained('bert-base-uncased', do_lower_case=True)
+        model = BertForSequenceClassification.from_pretrained('bert-base-uncased', num_labels=3)
+        model.load_state_dict(torch.load(self.model_path, map_location=torch.device('cpu')))
+        model.eval()
+        model.to("cpu")
+
+        if self.quantize:
+            if self.verbose: print("Applying int8 dynamic quantization...")
+            model = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+        if self.torchscript:
+            if self.verbose: print("Tracing the model by TorchScript...")
+            model.config.return_dict = False
+            example = torch.ones((2, 8), dtype=torch.long)
+            model = torch.jit.trace(model, (example, example, torch.zeros_like(example)), strict=False)
+            model = torch.jit.freeze(model) if hasattr(torch.jit, 'freeze') else model
+
+        self.model = model
+
+    def _sentence_key(self, text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def _encode(self, texts):
+        '''
+        Returns a list of token ids per text, starting with [CLS] and ending with [SEP] and truncated to max_len.
+        '''
+        encoded = self.tokenizer(list(texts), add_special_tokens=True, truncation=True, max_length=self.max_len)
+        return encoded['input_ids']
+
+    def _make_batches(self, token_ids):
+        '''
+        Returns a list of (indices, token ids) batches. Sentences are sorted by length, and each batch is filled
+         up to max_tokens after padding to the longest sentence in the batch.
+        '''
+        order = sorted(range(len(token_ids)), key=lambda i: len(token_ids[i]))
+        batches = []
+        batch = []
+        for i in order:
+            # Sorted by length, so the current sentence is the longest in the batch
+            if batch and (len(batch) + 1) * len(token_ids[i]) > self.max_tokens:
+                batches.append((batch, [token_ids[j] for j in batch]))
+                batch = []
+            batch.append(i)
+        if batch:
+            batches.append((batch, [token_ids[j] for j in batch]))
+        return batches
+
+    def _forward(self, input_ids):
+        '''
+        Returns softmax probabilities for a batch of token ids
+        '''
+        import torch
+        import torch.nn.functional as F
+
+        seq_len = max(len(ids) for ids in input_ids)
+        ids = torch.zeros((len(input_ids), seq_len), dtype=torch.long)
+        masks = torch.zeros((len(input_ids), seq_len), dtype=torch.long)
+        for row, x in enumerate(input_ids):
+            ids[row, :len(x)] = torch.tensor(x, dtype=torch.long)
+            masks[row, :len(x)] = 1
+        segments = torch.zeros_like(ids)
+
+        with torch.no_grad():
+            outputs = self.model(ids, masks, segments)[0]
+        return F.softmax(outputs, dim=1).cpu().numpy()
+
+    def _run_batches(self, batches):
+        '''
+        Run the batches in this process or shard them to worker processes
+        '''
+        if self.processes <= 1 or len(batches) < self.processes:
+            return [(indices, self._forward(input_ids)) for indices, input_ids in batches]
+
+        global _worker_engine
+        _worker_engine = self
+        # Deal the batches in turn so that each shard has both short and long sentences
+        shards = [batches[i::self.processes] for i in range(self.processes)]
+        num_threads = max(1, os.cpu_count() // self.processes)
+        if self.verbose: print("Scoring {} batches with {} processes...".format(len(batches), self.processes))
+        try:
+            with get_context('fork').Pool(self.processes, initializer=_init_worker, initargs=(num_threads,)) as pool:
+                results = pool.map(_predict_batches, shards)
+        finally:
+            _worker_engine = None
+        return [result for shard in results for result in shard]
+
+    def predict(self, texts):
+        '''
+        Returns an array of probabilities in the order of class_names for the given list of sentences.
+        Only sentences not in the cache are scored.
+        '''
+        texts = list(texts)
+        keys = [self._sentence_key(text) for text in texts]
+        scores = np.zeros((len(texts), len(self.class_names)), dtype=np.float32)
+
+        new_texts = {}
+        for i, key in enumerate(keys):
+            if key in self.cache:
+                scores[i] = self.cache[key]
+            elif key not in new_texts:
+                new_texts[key] = texts[i]
+
+        if self.verbose: print("{} sentences given, {} to be scored.".format(len(texts), len(new_texts)))
+        if new_texts:
+            self._load_model()
+            new_keys = list(new_texts.keys())
+            token_ids = self._encode(new_texts.values())
+            for indices, probs in self._run_batches(self._make_batches(token_ids)):
+                for j, prob in zip(indices, probs):
+                    self.cache[new_keys[j]] = prob
+            for i, key in enumerate(keys):
+                if key in new_texts:
+                    scores[i] = self.cache[key]
+
+        return scores
+
+    def score_df(self, df, text_column='text'):
+        '''
+        Add score and prediction columns to the given dataframe as score_text() in the notebook
+        '''
+        scores = self.predict(df[text_column])
+        df['score'] = list(scores)
+        df['prediction'] = [self.class_names[i] for i in np.argmax(scores, axis=1)]
+        return df
+
+    def load_cache(self):
+        '''
+        Load cached predictions. Those predicted by another model version are discarded.
+        '''
+        self.cache = {}
+        if os.path.exists(self.cache_path):
+            with open(self.cache_path, 'rb') as f:
+                cache = pickle.load(f)
+            if cache.get('model_version') == self.model_version:
+                self.cache = cache['scores']
+            if self.verbose: print("{} cached predictions loaded from {}".format(len(self.cache), self.cache_path))
+
+    def save_cache(self):
+        '''
+        Save cached predictions to cache_path
+        '''
+        if self.cache_path is None:
+            return
+        if self.verbose: print("Writing to ", self.cache_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp_path = self.cache_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            pickle.dump({'model_version': self.model_version, 'scores': self.cache}, f)
+        os.replace(tmp_path, self.cache_path)
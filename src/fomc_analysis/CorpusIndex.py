@@ -0,0 +1,259 @@
+from collections import OrderedDict
+import hashlib
+import pickle
+import re
+import os
+
+import numpy as np
+import pandas as pd
+
+def _encode_varint(value, out):
+    '''
+    Append an unsigned integer to the bytearray in variable length encoding
+    '''
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_varints(data):
+    '''
+    Returns an array of unsigned integers decoded from variable length encoding, vectorized by numpy
+    '''
+    arr = np.frombuffer(bytes(data), dtype=np.uint8)
+    ends = np.flatnonzero(arr < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    group = np.repeat(np.arange(len(ends)), ends - starts + 1)
+    shifts = 7 * (np.arange(len(arr)) - starts[group])
+    values = np.zeros(len(ends), dtype=np.int64)
+    np.add.at(values, group, (arr & 0x7f).astype(np.int64) << shifts)
+    return values
+
+class CorpusIndex:
+    '''
+    A full-text inverted index over the FOMC documents downloaded by FomcGetData.
+    Postings keep the word positions for phrase queries, and are compressed by delta and variable length encoding.
+    Postings of recently queried terms are kept decoded in an LRU cache, and phrases are matched by array intersections.
+    Documents can be filtered by date range, speaker and content type from the metadata in the FomcBase outputs.
+    New documents are added incrementally. Documents already in the index are skipped.
+
+    Example Usage:
+        index = CorpusIndex()
+        for content_type in ('statement', 'minutes', 'speech'):
+            index.add_pickle('../data/FOMC/{}.pickle'.format(content_type), content_type)
+        index.search('transitory', from_date='2020-01-01', content_types=['statement'])
+        index.phrase_frequency('patient', freq='Y')
+        index.save('../data/FOMC/corpus_index.pickle')
+    '''
+    token_pattern = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+    # Decoded postings are keys of doc id << position_bits | position
+    position_bits = 32
+
+    def __init__(self, cache_size=1024, verbose=True):
+        self.verbose = verbose
+        self.cache_size = cache_size
+        # LRU cache of the decoded postings per term, not saved
+        self._cache = OrderedDict()
+        # Compressed postings per term: [doc id delta, number of positions, position deltas...] repeated
+        self.postings = {}
+        # The last doc id appended to the postings per term, used for delta encoding of doc ids
+        self.last_doc = {}
+        self.doc_keys = {}
+        self.content_types = []
+        self.dates = []
+        self.speakers = []
+        self.titles = []
+        self.doc_lengths = []
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_cache', None)
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('cache_size', 1024)
+        self.__dict__.update(state)
+        self._cache = OrderedDict()
+
+    def _tokenize(self, text):
+        return self.token_pattern.findall(text.replace("[SECTION]", " ").lower())
+
+    def _doc_key(self, content_type, contents):
+        return content_type + ':' + hashlib.sha1(contents.encode('utf-8')).hexdigest()
+
+    def add_document(self, content_type, date, speaker, title, contents):
+        '''
+        Add one document to the index. Returns the doc id, or None if the document is already indexed.
+        '''
+        key = self._doc_key(content_type, contents)
+        if key in self.doc_keys:
+            return None
+
+        doc_id = len(self.content_types)
+        self.doc_keys[key] = doc_id
+        self.content_types.append(content_type)
+        self.dates.append(np.datetime64(pd.Timestamp(date).date(), 'D'))
+        self.speakers.append(speaker)
+        self.titles.append(title)
+
+        positions = {}
+        tokens = self._tokenize(contents)
+        for position, token in enumerate(tokens):
+            positions.setdefault(token, []).append(position)
+        self.doc_lengths.append(len(tokens))
+
+        for token, token_positions in positions.items():
+            self._cache.pop(token, None)
+            out = self.postings.setdefault(token, bytearray())
+            _encode_varint(doc_id - self.last_doc.get(token, -1) - 1, out)
+            _encode_varint(len(token_positions), out)
+            prev = 0
+            for position in token_positions:
+                _encode_varint(position - prev, out)
+                prev = position
+            self.last_doc[token] = doc_id
+        return doc_id
+
+    def add_df(self, df, content_type):
+        '''
+        Add documents in a dataframe created by FomcBase.get_contents(). Returns the number of new documents.
+        '''
+        added = 0
+        for row in df.itertuples(index=False):
+            if self.add_document(content_type, row.date, row.speaker, row.title, row.contents) is not None:
+                added += 1
+        if self.verbose: print("{} new documents added for {}. Total {} documents.".format(added, content_type, len(self.content_types)))
+        return added
+
+    def add_pickle(self, filepath, content_type):
+        '''
+        Add documents in a pickle file written by FomcBase.pickle_dump_df()
+        '''
+        with open(filepath, 'rb') as input_file:
+            df = pickle.load(input_file)
+        return self.add_df(df, content_type)
+
+    def _postings(self, term):
+        '''
+        Returns a sorted array of doc id << position_bits | position for the term.
+        Decoded postings are kept in an LRU cache of cache_size terms.
+        '''
+        keys = self._cache.get(term)
+        if keys is not None:
+            self._cache.move_to_end(term)
+            return keys
+        data = self.postings.get(term)
+        if data is None:
+            return np.zeros(0, dtype=np.int64)
+
+        values = _decode_varints(data)
+        # Walk only the headers of [doc id delta, number of positions, position deltas...]
+        doc_ids, starts, lengths = [], [], []
+        doc_id = -1
+        i = 0
+        while i < len(values):
+            doc_id += int(values[i]) + 1
+            n = int(values[i + 1])
+            doc_ids.append(doc_id)
+            starts.append(i + 2)
+            lengths.append(n)
+            i += 2 + n
+        lengths = np.array(lengths, dtype=np.int64)
+        # Position deltas of all documents, and their cumulative sums restarting at each document
+        ends = np.cumsum(lengths)
+        index = np.arange(ends[-1]) - np.repeat(ends - lengths, lengths) + np.repeat(np.array(starts, dtype=np.int64), lengths)
+        sums = np.cumsum(values[index])
+        positions = sums - np.repeat(np.concatenate([[0], sums[ends[:-1] - 1]]), lengths)
+        keys = (np.repeat(np.array(doc_ids, dtype=np.int64), lengths) << self.position_bits) | positions
+
+        self._cache[term] = keys
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return keys
+
+    def _doc_filter(self, from_date=None, to_date=None, speakers=None, content_types=None):
+        '''
+        Returns a boolean array of documents matching the filters
+        '''
+        mask = np.ones(len(self.content_types), dtype=bool)
+        if from_date is not None or to_date is not None:
+            dates = np.array(self.dates, dtype='datetime64[D]')
+            if from_date is not None:
+                mask &= dates >= np.datetime64(pd.Timestamp(from_date).date(), 'D')
+            if to_date is not None:
+                mask &= dates <= np.datetime64(pd.Timestamp(to_date).date(), 'D')
+        if speakers is not None:
+            mask &= np.isin(np.array(self.speakers, dtype=object), list(speakers))
+        if content_types is not None:
+            mask &= np.isin(np.array(self.content_types, dtype=object), list(content_types))
+        return mask
+
+    def phrase_counts(self, phrase, **filters):
+        '''
+        Returns a dict of doc id to the number of occurrences of the phrase, for documents matching the filters.
+        Filters are from_date, to_date, speakers and content_types.
+        '''
+        terms = self._tokenize(phrase)
+        if not terms:
+            return {}
+        # Keys where the phrase starts, shifted back by the offset of each term
+        starts = self._postings(terms[0])
+        for offset, term in enumerate(terms[1:], 1):
+            if len(starts) == 0:
+                break
+            starts = np.intersect1d(starts, self._postings(term) - offset, assume_unique=True)
+        doc_ids = starts >> self.position_bits
+        if filters:
+            doc_ids = doc_ids[self._doc_filter(**filters)[doc_ids]]
+        doc_ids, counts = np.unique(doc_ids, return_counts=True)
+        return dict(zip(doc_ids.tolist(), counts.tolist()))
+
+    def search(self, phrase, **filters):
+        '''
+        Returns a dataframe of documents containing the phrase with the number of occurrences, sorted by date
+        '''
+        counts = self.phrase_counts(phrase, **filters)
+        doc_ids = sorted(counts, key=lambda x: (self.dates[x], x))
+        return pd.DataFrame({
+            'doc_id': doc_ids,
+            'type': [self.content_types[i] for i in doc_ids],
+            'date': pd.to_datetime([self.dates[i] for i in doc_ids]),
+            'speaker': [self.speakers[i] for i in doc_ids],
+            'title': [self.titles[i] for i in doc_ids],
+            'count': [counts[i] for i in doc_ids]
+        })
+
+    def phrase_frequency(self, phrase, freq='Y', normalize=False, **filters):
+        '''
+        Returns a time series of the number of occurrences of the phrase per period (e.g. 'Y', 'Q', 'M').
+        If normalize is True, it is divided by the number of words of the documents in the period.
+        '''
+        counts = self.phrase_counts(phrase, **filters)
+        periods = pd.PeriodIndex([pd.Timestamp(self.dates[i]).to_period(freq) for i in counts], freq=freq)
+        series = pd.Series([counts[i] for i in counts], index=periods, dtype=float)
+        series = series.groupby(level=0).sum().sort_index()
+        if normalize:
+            mask = self._doc_filter(**filters)
+            doc_ids = np.flatnonzero(mask)
+            words = pd.Series([self.doc_lengths[i] for i in doc_ids],
+                              index=pd.PeriodIndex([pd.Timestamp(self.dates[i]).to_period(freq) for i in doc_ids], freq=freq), dtype=float)
+            words = words.groupby(level=0).sum().sort_index()
+            series = (series.reindex(words.index, fill_value=0) / words.replace(0, np.nan)).fillna(0)
+        return series
+
+    def save(self, filepath):
+        '''
+        Save the index to a pickle file
+        '''
+        if self.verbose: print("Writing to ", filepath)
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, 'wb') as output_file:
+            pickle.dump(self, output_file)
+
+    @classmethod
+    def load(cls, filepath):
+        '''
+        Load the index from a pickle file
+        '''
+        with open(filepath, 'rb') as input_file:
+            return pickle.load(input_file)
@@ -0,0 +1,187 @@
+from collections import Counter
+import pickle
+import re
+import os
+
+import numpy as np
+import scipy.sparse as sp
+
+class IncrementalTfidf:
+    '''
+    An incremental TF-IDF vectorizer with the cosine similarity to the previous document of the same type.
+    Vocabulary, document frequencies and raw term counts are kept as persistent state, so that new documents
+     are appended as sparse rows without refitting the whole corpus.
+    TF-IDF values follow TfidfVectorizer defaults (smooth idf, l2 norm). The similarity to the previous document
+     is computed only for new rows with the idf at the time they are added, i.e. only the documents available
+     at that time are used. Call refresh_similarities() to recompute all of them with the current idf.
+
+    Example Usage:
+        vec = IncrementalTfidf(vocabulary=lemma_sentiment_df['word'])
+        vec.add_documents(lemma_docs, doc_types=list(train_df['type']))
+        train_df['cos_sim'] = vec.similarities
+        vec.save('../data/train_data/tfidf_state.pickle')
+
+        vec = IncrementalTfidf.load('../data/train_data/tfidf_state.pickle')
+        new_sims = vec.add_documents([new_statement], doc_types=['statement'])
+    '''
+    def __init__(self, vocabulary=None, lowercase=True, token_pattern=r"(?u)\b\w\w+\b", sublinear_tf=False, verbose=True):
+        self.lowercase = lowercase
+        self.token_pattern = token_pattern
+        self.sublinear_tf = sublinear_tf
+        self.verbose = verbose
+
+        # When the vocabulary is given, it is fixed and other words are ignored
+        self.fixed_vocabulary = vocabulary is not None
+        self.vocabulary = {}
+        if vocabulary is not None:
+            for word in vocabulary:
+                if word not in self.vocabulary:
+                    self.vocabulary[word] = len(self.vocabulary)
+
+        self.n_docs = 0
+        self.doc_freq = np.zeros(len(self.vocabulary), dtype=np.int64)
+        self.counts = sp.csr_matrix((0, len(self.vocabulary)), dtype=np.float64)
+        self.doc_types = []
+        self.similarities = np.zeros(0, dtype=np.float64)
+        # The last row index per document type
+        self.last_rows = {}
+        self._pattern = re.compile(token_pattern)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_pattern']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._pattern = re.compile(self.token_pattern)
+
+    def _count_rows(self, docs):
+        '''
+        Returns a csr matrix of raw term counts for the given documents, adding new words to the vocabulary
+        '''
+        indptr = [0]
+        indices = []
+        data = []
+        for doc in docs:
+            if self.lowercase:
+                doc = doc.lower()
+            for word, count in Counter(self._pattern.findall(doc)).items():
+                col = self.vocabulary.get(word)
+                if col is None:
+                    if self.fixed_vocabulary:
+                        continue
+                    col = len(self.vocabulary)
+                    self.vocabulary[word] = col
+                indices.append(col)
+                data.append(count)
+            indptr.append(len(indices))
+        return sp.csr_matrix((np.array(data, dtype=np.float64), np.array(indices, dtype=np.int64), np.array(indptr, dtype=np.int64)),
+                             shape=(len(docs), len(self.vocabulary)))
+
+    @property
+    def idf(self):
+        '''
+        Smoothed idf, the same as TfidfVectorizer(smooth_idf=True)
+        '''
+        return np.log((1 + self.n_docs) / (1 + self.doc_freq)) + 1
+
+    def _tfidf(self, counts):
+        '''
+        Returns l2 normalized tfidf rows for the given raw count rows
+        '''
+        tf = counts.copy()
+        if self.sublinear_tf:
+            tf.data = np.log(tf.data) + 1
+        tfidf = tf @ sp.diags(self.idf)
+        norms = np.sqrt(np.asarray(tfidf.multiply(tfidf).sum(axis=1)).ravel())
+        norms[norms == 0] = 1
+        return sp.csr_matrix(sp.diags(1 / norms) @ tfidf)
+
+    def _prev_rows(self, start):
+        '''
+        Returns a list of the previous row of the same type for the rows from start, or -1 if there is none
+        '''
+        prev_rows = []
+        for row in range(start, self.n_docs):
+            doc_type = self.doc_types[row]
+            prev_rows.append(self.last_rows.get(doc_type, -1))
+            self.last_rows[doc_type] = row
+        return prev_rows
+
+    def _row_similarities(self, rows, prev_rows):
+        '''
+        Returns cosine similarities between rows and prev_rows by row-wise sparse dot products
+        '''
+        sims = np.zeros(len(rows), dtype=np.float64)
+        has_prev = np.array(prev_rows) >= 0
+        if has_prev.any():
+            rows = np.array(rows)[has_prev]
+            prev_rows = np.array(prev_rows)[has_prev]
+            cur = self._tfidf(self.counts[rows])
+            prev = self._tfidf(self.counts[prev_rows])
+            sims[has_prev] = np.asarray(cur.multiply(prev).sum(axis=1)).ravel()
+        return sims
+
+    def add_documents(self, docs, doc_types=None):
+        '''
+        Append documents in chronological order and returns their cosine similarities to the previous document
+         of the same type (0 for the first document of a type, as done in the notebook).
+        '''
+        docs = list(docs)
+        if doc_types is None:
+            doc_types = ['all'] * len(docs)
+        if len(doc_types) != len(docs):
+            raise ValueError("docs and doc_types must have the same length")
+
+        new_counts = self._count_rows(docs)
+        self.counts.resize((self.counts.shape[0], len(self.vocabulary)))
+        self.counts = sp.vstack([self.counts, new_counts], format='csr')
+
+        new_df = np.bincount(new_counts.indices, minlength=len(self.vocabulary))
+        self.doc_freq = np.concatenate([self.doc_freq, np.zeros(len(self.vocabulary) - len(self.doc_freq), dtype=np.int64)])
+        self.doc_freq += new_df
+
+        start = self.n_docs
+        self.n_docs += len(docs)
+        self.doc_types.extend(doc_types)
+
+        new_sims = self._row_similarities(range(start, self.n_docs), self._prev_rows(start))
+        self.similarities = np.concatenate([self.similarities, new_sims])
+        if self.verbose: print("{} documents added. Total {} documents and {} words.".format(len(docs), self.n_docs, len(self.vocabulary)))
+        return new_sims
+
+    def refresh_similarities(self):
+        '''
+        Recompute the similarities of all documents with the current idf
+        '''
+        self.last_rows = {}
+        self.similarities = self._row_similarities(range(self.n_docs), self._prev_rows(0))
+        return self.similarities
+
+    def transform(self, rows=None):
+        '''
+        Returns tfidf matrix with the current idf for the given row indices (all rows if None)
+        '''
+        counts = self.counts if rows is None else self.counts[rows]
+        return self._tfidf(counts)
+
+    def get_feature_names(self):
+        return sorted(self.vocabulary, key=self.vocabulary.get)
+
+    def save(self, filepath):
+        '''
+        Save the state to a pickle file
+        '''
+        if self.verbose: print("Writing to ", filepath)
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, 'wb') as output_file:
+            pickle.dump(self, output_file)
+
+    @classmethod
+    def load(cls, filepath):
+        '''
+        Load the state from a pickle file
+        '''
+        with open(filepath, 'rb') as input_file:
+            return pickle.load(input_file)
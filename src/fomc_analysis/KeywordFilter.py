@@ -0,0 +1,96 @@
+from multiprocessing import Pool
+import os
+
+
+def _count_keywords(keywords, section):
+    '''
+    Count all keyword matches in one section in a single scan of the tokens
+    '''
+    counts = {}
+    for token in section.split():
+        if token in keywords:
+            counts[token] = counts.get(token, 0) + 1
+    return counts
+
+def _filter_sections(args):
+    '''
+    Worker function for the process pool. Returns sections having keywords at least min_times.
+    Defined at module level so that it can be pickled to the worker processes.
+    '''
+    keywords, min_times, distinct, sections = args
+    new_sections = []
+    for section in sections:
+        counts = _count_keywords(keywords, section)
+        hits = len(counts) if distinct else sum(counts.values())
+        if hits >= min_times:
+            new_sections.append(section)
+    return new_sections
+
+class KeywordFilter:
+    '''
+    A keyword filter for the text_keyword stage of the text preprocessing.
+    The keyword list is kept as one hashed set, so that every section is scanned only once
+     regardless of the number of keywords. Documents are processed in a process pool.
+    Keywords are matched as whitespace delimited tokens as done by set(section.split()).intersection(keywords)
+     in the notebook, so a keyword with a space, e.g. 'federal fund' in the default list, never matches.
+    By default, a section is kept when it has at least min_times different keywords.
+    Set distinct=False to count every occurrence instead.
+
+    Example Usage:
+        kf = KeywordFilter()
+        keyword_df = remove_short_section(kf.filter_df(proc_statement_df))
+        kf.set_keywords(['inflation', 'transitory'])
+        keyword_df = kf.filter_df(proc_statement_df)
+    '''
+    default_keywords = ['rate', 'rates', 'federal fund', 'outlook', 'forecast', 'employ', 'economy']
+
+    def __init__(self, keywords=None, min_times=2, distinct=True, processes=None, verbose=True):
+        self.min_times = min_times
+        self.distinct = distinct
+        self.processes = processes if processes else os.cpu_count()
+        self.verbose = verbose
+        self.keywords = None
+        self.keyword_set = None
+        self.set_keywords(keywords if keywords is not None else self.default_keywords)
+
+    def set_keywords(self, keywords):
+        '''
+        Set a new keyword list. The corpus does not need to be processed again for this.
+        '''
+        self.keywords = sorted(set(keywords))
+        self.keyword_set = frozenset(self.keywords)
+
+    def count_keywords(self, section):
+        '''
+        Returns a dict of the number of matches per keyword in the given section
+        '''
+        return _count_keywords(self.keyword_set, section)
+
+    def filter_sections(self, sections):
+        '''
+        Returns a list of sections having keywords at least min_times for one document
+        '''
+        return _filter_sections((self.keyword_set, self.min_times, self.distinct, sections))
+
+    def filter_documents(self, documents):
+        '''
+        Returns a list of filtered section lists for the given list of section lists.
+        Documents are distributed to a process pool when there are enough of them.
+        '''
+        args = [(self.keyword_set, self.min_times, self.distinct, sections) for sections in documents]
+        if self.processes <= 1 or len(args) < self.processes * 2:
+            return [_filter_sections(arg) for arg in args]
+
+        if self.verbose: print("Filtering {} documents by {} keywords with {} processes...".format(len(args), len(self.keywords), self.processes))
+        chunksize = max(1, len(args) // (self.processes * 4))
+        with Pool(self.processes) as pool:
+            return pool.map(_filter_sections, args, chunksize=chunksize)
+
+    def filter_df(self, df, column='text_sections'):
+        '''
+        Returns a copy of the given dataframe, of which sections in the given column are
+         filtered by keywords. Apply remove_short_section() afterwards as before.
+        '''
+        new_df = df.copy()
+        new_df[column] = self.filter_documents(list(new_df[column]))
+        return new_df
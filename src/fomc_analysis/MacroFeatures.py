@@ -0,0 +1,395 @@
+from datetime import datetime
+import pickle
+import os
+
+import numpy as np
+import pandas as pd
+
+def _rolling_means(values, windows):
+    '''
+    Returns a dict of window -> moving averages of the 2d array values for all windows from one cumulative sum.
+    Same as DataFrame.rolling(window).mean(), i.e. NaN unless all values in the window are available.
+    '''
+    missing = np.isnan(values)
+    sums = np.vstack([np.zeros((1, values.shape[1])), np.cumsum(np.where(missing, 0.0, values), axis=0)])
+    counts = np.vstack([np.zeros((1, values.shape[1]), dtype=np.int64), np.cumsum(missing, axis=0)])
+
+    means = {}
+    for window in windows:
+        if window == 1:
+            means[window] = values
+            continue
+        result = np.full(values.shape, np.nan)
+        if window <= len(values):
+            window_sums = sums[window:] - sums[:-window]
+            window_missing = counts[window:] - counts[:-window]
+            result[window - 1:] = np.where(window_missing == 0, window_sums / window, np.nan)
+        means[window] = result
+    return means
+
+def _take(values, positions):
+    '''
+    Returns values at positions, NaN (or NaT) where the position is -1
+    '''
+    missing = np.datetime64('NaT') if np.issubdtype(values.dtype, np.datetime64) else np.nan
+    # Position -1 takes the padded missing row at the end
+    padded = np.concatenate([values, np.full((1,) + values.shape[1:], missing, dtype=values.dtype)])
+    return padded[positions]
+
+class MacroFeatures:
+    '''
+    Meeting level economic indices and Taylor rule features, as the nontext_* outputs of the non-text preprocessing.
+    All indices downloaded by QuandlGetData are joined onto the meeting dates in one vectorized pass per index,
+     using the latest observation published before each meeting (observation date plus its release lag),
+     so that no value is used before it was available.
+    Moving averages of all windows are computed from one cumulative sum per index.
+    New meetings and new or revised observations are added by update(), which recomputes only the meetings
+     on or after the earliest date affected by the change.
+
+    Example Usage:
+        features = MacroFeatures()
+        outputs = features.build()
+        features.save()
+
+        features = MacroFeatures.load()
+        outputs = features.update(observations={'FRED_CPIAUCSL': new_cpi_df})
+        features.save()
+    '''
+    # (prefix, file name, value column, periods per year, percent change, release lag in months and days)
+    indices = [
+        ('GDP', 'FRED_GDPC1', 'GDPC1', 4, True, 4, -2),
+        ('GDPPOT', 'FRED_GDPPOT', 'GDPPOT', 4, True, 4, -2),
+        ('PCE', 'FRED_PCEPILFE', 'PCEPILFE', 12, True, 2, -1),
+        ('CPI', 'FRED_CPIAUCSL', 'CPIAUCSL', 12, True, 1, 9),
+        ('Unemp', 'FRED_UNRATE', 'UNRATE', 12, False, 1, 2),
+        ('Employ', 'FRED_PAYEMS', 'PAYEMS', 12, False, 1, 2),
+        ('PMI', 'ISM_MAN_PMI', 'PMI', 12, False, 1, 2),
+        ('NMI', 'ISM_NONMAN_NMI', 'NMI', 12, False, 1, 2),
+        ('Rsales', 'FRED_RRSFS', 'RRSFS', 12, True, 1, 2),
+        ('Hsales', 'FRED_HSN1F', 'HSN1F', 12, True, 1, 2)
+    ]
+    # Bigger unemployment is worse, so the sign is flipped
+    negated = ('UNRATE',)
+
+    # The target rate, a range from 2008 of which the lower side is used
+    rate_files = ('FRED_DFEDTAR', 'FRED_DFEDTARL')
+
+    # Output name -> (window of the indices in periods, window of the Taylor rule in days)
+    outputs = {
+        'nontext_data': (1, 1),
+        'nontext_ma2': (2, 60),
+        'nontext_ma3': (3, 90),
+        'nontext_ma6': (6, 180),
+        'nontext_ma12': (12, 360)
+    }
+
+    chair_list = [["Volcker", "Paul", "1979-08-06", "1987-08-10"],
+                  ["Greenspan", "Alan", "1987-08-11", "2006-01-31"],
+                  ["Bernanke", "Ben", "2006-02-01", "2014-01-31"],
+                  ["Yellen", "Janet", "2014-02-03", "2018-02-03"],
+                  ["Powell", "Jerome", "2018-02-05", "2022-02-05"]]
+
+    # Quantitative easing and tapering as lower and hike events: (date, RateDecision, RateDiff)
+    qe_events = [
+        ('2009-03-18', -1, -0.5), # QE1 Expanded
+        ('2010-11-03', -1, -0.5), # QE2 Announced
+        ('2011-09-21', -1, -0.5), # Operation Twist Announced
+        ('2012-06-20', -1, -0.5), # Operation Twist Extended
+        ('2012-09-13', -1, -0.5), # QE3 Announced
+        ('2012-12-12', -1, -0.5), # QE3 Expanded
+        ('2013-06-19', 1, 1), # Tapering Announced
+        ('2013-12-18', 1, 1), # Tapering Begins
+        ('2014-10-29', 1, 0.5), # QE3 Terminated
+        ('2017-06-14', 1, 0.5), # Signaled Balance Sheet Normalization
+        ('2017-09-20', 1, 0.5) # Stated Balance Sheet Normalization Begins in Oct
+    ]
+    # QE1 was announced on 2008-11-25, which is not in the calendar
+    qe_meeting = ('2008-11-25', 'Ben Bernanke', 0, -1, -1)
+
+    # The target rate is available from this date
+    start_date = '1982-09-27'
+
+    def __init__(self, quandl_dir='../data/MarketData/Quandl/', calendar_path='../data/FOMC/fomc_calendar.pickle', verbose=True):
+        self.quandl_dir = quandl_dir
+        self.calendar_path = calendar_path
+        self.verbose = verbose
+
+        # File name -> Series of raw observations
+        self.series = {}
+        self.calendar = None
+        self.results = {}
+
+    def __getstate__(self):
+        # Results are saved separately as the nontext_* files
+        state = self.__dict__.copy()
+        state['results'] = {}
+        return state
+
+    def _read_series(self, file_name, column):
+        df = pd.read_csv(os.path.join(self.quandl_dir, file_name + '.csv'), header=0, usecols=[0, 1], names=['Date', column])
+        series = pd.Series(df[column].astype(float).values, index=pd.to_datetime(df['Date'], format="%Y-%m-%d"), name=column)
+        return self._clean_series(series)
+
+    def _clean_series(self, series):
+        series = series[~series.index.duplicated(keep='last')].sort_index()
+        series.index.name = 'Date'
+        return series
+
+    def load_data(self):
+        '''
+        Read the calendar and all indices from the files
+        '''
+        for prefix, file_name, column, periods, pct, months, days in self.indices:
+            self.series[file_name] = self._read_series(file_name, column)
+        for file_name in self.rate_files:
+            self.series[file_name] = self._read_series(file_name, 'Rate')
+        with open(self.calendar_path, 'rb') as f:
+            self.calendar = pickle.load(f)
+
+    def _index_spec(self, file_name):
+        for spec in self.indices:
+            if spec[1] == file_name:
+                return spec
+        return None
+
+    def _rates(self):
+        rates = pd.concat([self.series[file_name] for file_name in self.rate_files])
+        return self._clean_series(rates)
+
+    def _chairpersons(self, dates):
+        from_dates = pd.to_datetime([chair[2] for chair in self.chair_list]).values
+        to_dates = pd.to_datetime([chair[3] for chair in self.chair_list]).values
+        names = np.array([chair[1] + " " + chair[0] for chair in self.chair_list] + [None], dtype=object)
+        positions = np.searchsorted(from_dates, dates.values, side='right') - 1
+        found = (positions >= 0) & (dates.values <= to_dates[np.maximum(positions, 0)])
+        return names[np.where(found, positions, -1)]
+
+    def _meetings(self):
+        '''
+        Returns the calendar indexed by date with the chairperson, rate and rate decision
+        '''
+        calendar = self.calendar.loc[self.calendar['date'] >= pd.Timestamp(self.start_date)].copy()
+        calendar = calendar.set_index('date')
+        calendar['ChairPerson'] = self._chairpersons(calendar.index)
+
+        # The target range was sometimes changed a couple of days after the meeting in the past,
+        #  so compare the rate three days after the meeting with the rate on the previous day.
+        rates = self._rates()
+        positions = rates.index.get_indexer(calendar.index)
+        valid = (positions >= 1) & (positions + 3 < len(rates))
+        after = _take(rates.values, np.where(valid, positions + 3, -1))
+        before = _take(rates.values, np.where(valid, positions - 1, -1))
+        calendar['Rate'] = after
+        calendar['RateDiff'] = after - before
+        calendar['RateDecision'] = pd.array(np.sign(after - before), dtype='Int8')
+
+        # Remove the future dates
+        calendar = calendar.loc[calendar.index < datetime.now()]
+
+        date, chair, rate, rate_diff, decision = self.qe_meeting
+        if pd.Timestamp(date) not in calendar.index:
+            qe = pd.DataFrame({'unscheduled': [True], 'forecast': [False], 'confcall': [False], 'ChairPerson': [chair],
+                               'Rate': [float(rate)], 'RateDiff': [float(rate_diff)], 'RateDecision': pd.array([decision], dtype='Int8')},
+                              index=pd.DatetimeIndex([pd.Timestamp(date)], name=calendar.index.name))
+            calendar = pd.concat([calendar, qe[[c for c in qe.columns if c in calendar.columns]]])
+        for date, decision, rate_diff in self.qe_events:
+            selected = calendar.index == pd.Timestamp(date)
+            calendar.loc[selected, 'RateDecision'] = decision
+            calendar.loc[selected, 'RateDiff'] = rate_diff
+        calendar = calendar.sort_index()
+        calendar['RateChanged'] = (calendar['RateDecision'] != 0).fillna(True).astype(int)
+        return calendar
+
+    def _index_table(self, file_name, periods, pct):
+        '''
+        Returns an array of value, diff_prev and diff_year columns of the index
+        '''
+        series = self.series[file_name]
+        if series.name in self.negated:
+            series = series * -1
+        if pct:
+            diff_prev = series.diff() / series.shift(1) * 100
+            diff_year = series.diff(periods=periods) / series.shift(periods) * 100
+        else:
+            diff_prev = series.diff()
+            diff_year = series.diff(periods=periods)
+        return np.column_stack([series.values, diff_prev.values, diff_year.values])
+
+    def _available_positions(self, file_name, months, days, dates):
+        '''
+        Returns the position of the latest observation published strictly before each date, or -1
+        '''
+        observed = self.series[file_name].index
+        available = (observed + pd.DateOffset(months=months, days=days)).values
+        # The release lag keeps the order of observation dates, so the latest available one is found by bisection
+        return np.searchsorted(available, dates.values, side='left') - 1
+
+    def _taylor_table(self):
+        '''
+        Returns the daily rates of Taylor, Balanced-approach and Inertia rules with the information available each day
+        '''
+        rates = self._rates()
+
+        def available(file_name, column):
+            prefix, file_name, name, periods, pct, months, days = self._index_spec(file_name)
+            positions = self._available_positions(file_name, months, days, rates.index)
+            return _take(self._index_table(file_name, periods, pct)[:, column], positions)
+
+        # Real GDP, potential GDP and the PCE inflation from the same period in the previous year
+        y = available('FRED_GDPC1', 0)
+        y_pot = available('FRED_GDPPOT', 0)
+        pi = available('FRED_PCEPILFE', 2)
+        y_gap = (np.log(y * 10**9) - np.log(y_pot * 10**9)) * 100
+        pi_target, r = 2, 2
+
+        rate = rates.values
+        taylor = r + pi + 0.5 * (pi - pi_target) + 0.5 * y_gap
+        balanced = r + pi + 0.5 * (pi - pi_target) + y_gap
+        balanced = np.where(balanced < 0, 0, balanced)
+        inertia = 0.85 * rate - 0.15 * balanced
+        table = np.column_stack([taylor, balanced, inertia, taylor - rate, balanced - rate, inertia - rate])
+        return rates.index, table
+
+    taylor_columns = ['Taylor', 'Balanced', 'Inertia', 'Taylor-Rate', 'Balanced-Rate', 'Inertia-Rate']
+
+    def _features(self, meetings):
+        '''
+        Returns a dict of output name -> DataFrame with the indices and Taylor rule features for the meetings
+        '''
+        windows = [window for window, days in self.outputs.values()]
+        taylor_windows = [days for window, days in self.outputs.values()]
+        dates = meetings.index
+
+        columns = {name: {} for name in self.outputs}
+        for prefix, file_name, column, periods, pct, months, days in self.indices:
+            if self.verbose:
+                print("Processing {}...".format(prefix))
+            positions = self._available_positions(file_name, months, days, dates)
+            observed = _take(self.series[file_name].index.values, positions)
+            means = _rolling_means(self._index_table(file_name, periods, pct), windows)
+            for name, (window, taylor_days) in self.outputs.items():
+                values = _take(means[window], positions)
+                columns[name][prefix + '_date'] = observed
+                columns[name][prefix + '_value'] = values[:, 0]
+                columns[name][prefix + '_diff_prev'] = values[:, 1]
+                columns[name][prefix + '_diff_year'] = values[:, 2]
+
+        if self.verbose:
+            print("Processing Taylor rule...")
+        days, table = self._taylor_table()
+        means = _rolling_means(table, taylor_windows)
+        # Rules are calculated with the information available on the previous day of the meeting
+        positions = days.get_indexer(dates - pd.Timedelta(days=1))
+        for name, (window, taylor_days) in self.outputs.items():
+            values = _take(means[taylor_days], positions)
+            for i, column in enumerate(self.taylor_columns):
+                columns[name][column] = values[:, i]
+
+        return {name: pd.concat([meetings, pd.DataFrame(columns[name], index=dates)], axis=1) for name in self.outputs}
+
+    def _add_diffs(self, df):
+        for column in ('Taylor', 'Balanced', 'Inertia'):
+            df[column + '_diff'] = df[column].diff(1)
+        return df
+
+    def build(self):
+        '''
+        Returns a dict of output name -> DataFrame for all meetings with the rate decision
+        '''
+        if self.calendar is None:
+            self.load_data()
+        meetings = self._meetings().dropna(subset=['Rate'])
+        self.results = {name: self._add_diffs(df) for name, df in self._features(meetings).items()}
+        return self.results
+
+    def _changed_from(self, file_name, series):
+        '''
+        Merge new observations into the index and return the earliest observation date changed, or None
+        '''
+        old = self.series.get(file_name)
+        if old is None:
+            self.series[file_name] = self._clean_series(series)
+            return series.index.min()
+        merged = self._clean_series(series.combine_first(old))
+        aligned = old.reindex(merged.index)
+        changed = merged.index[~((aligned == merged) | (aligned.isnull() & merged.isnull()))]
+        self.series[file_name] = merged
+        return changed.min() if len(changed) > 0 else None
+
+    def update(self, calendar=None, observations=None):
+        '''
+        Add new meetings and new or revised observations, then recompute only the affected meetings.
+        calendar is the new fomc_calendar. observations is a dict of file name (e.g. FRED_CPIAUCSL) -> Series
+         or DataFrame of the first column indexed by the observation date.
+        Returns a dict of output name -> DataFrame.
+        '''
+        if not self.results:
+            if calendar is not None:
+                self.calendar = calendar
+            for file_name, series in (observations or {}).items():
+                self._changed_from(file_name, series.iloc[:, 0] if isinstance(series, pd.DataFrame) else series)
+            return self.build()
+
+        affected = []
+        for file_name, series in (observations or {}).items():
+            if isinstance(series, pd.DataFrame):
+                series = series.iloc[:, 0]
+            series = series.astype(float)
+            series.index = pd.to_datetime(series.index)
+            changed = self._changed_from(file_name, series)
+            if changed is None:
+                continue
+            spec = self._index_spec(file_name)
+            if spec is not None:
+                # A change is published at the release lag and stays in the moving averages afterwards
+                affected.append(changed + pd.DateOffset(months=spec[5], days=spec[6]))
+            else:
+                # The rate of a meeting is taken from the previous day to three days after
+                affected.append(changed - pd.Timedelta(days=3))
+
+        if calendar is not None:
+            self.calendar = calendar
+        meetings = self._meetings().dropna(subset=['Rate'])
+        current = self.results[next(iter(self.outputs))]
+        new_meetings = meetings.index.difference(current.index)
+        if len(new_meetings) > 0:
+            affected.append(new_meetings.min())
+        if len(current.index.difference(meetings.index)) > 0:
+            # Meetings were removed from the calendar, so rebuild all
+            return self.build()
+        if not affected:
+            return self.results
+
+        start = min(affected)
+        recompute = meetings.loc[meetings.index >= start]
+        if self.verbose:
+            print("Recomputing {} of {} meetings from {}".format(len(recompute), len(meetings), start.strftime('%Y-%m-%d')))
+        features = self._features(recompute)
+        for name, df in features.items():
+            kept = self.results[name].loc[self.results[name].index < start]
+            self.results[name] = self._add_diffs(pd.concat([kept, df]))
+        return self.results
+
+    def save(self, dir_name='../data/preprocessed/'):
+        '''
+        Save the outputs to pickle and csv files, and the state to macro_features.pickle for update()
+        '''
+        os.makedirs(dir_name, exist_ok=True)
+        for name, df in self.results.items():
+            with open(os.path.join(dir_name, name + '.pickle'), 'wb') as f:
+                pickle.dump(df, f)
+            df.to_csv(os.path.join(dir_name, name + '.csv'), index=True)
+        with open(os.path.join(dir_name, 'macro_features.pickle'), 'wb') as f:
+            pickle.dump(self, f)
+
+    @classmethod
+    def load(cls, dir_name='../data/preprocessed/'):
+        '''
+        Load the state and the outputs saved by save()
+        '''
+        with open(os.path.join(dir_name, 'macro_features.pickle'), 'rb') as f:
+            features = pickle.load(f)
+        for name in cls.outputs:
+            with open(os.path.join(dir_name, name + '.pickle'), 'rb') as f:
+                features.results[name] = pickle.load(f)
+        return features
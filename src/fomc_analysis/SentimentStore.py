@@ -0,0 +1,178 @@
+import sqlite3
+import pickle
+import os
+
+import pandas as pd
+
+class SentimentStore:
+    '''
+    A persistent store of sentence level predictions with per-meeting aggregates, backed by sqlite.
+    Predictions are keyed by (document, sentence index, model version). The number of sentences per predicted
+     class is kept per (model version, document type, next meeting), and only the meetings touched by a new
+     or updated document are recomputed. The sentiment_bert_* outputs are derived from the aggregates as views.
+
+    Example Usage:
+        store = SentimentStore('../data/train_data/sentiment_bert.db', model_version=engine.model_version)
+        store.add_scored_df(result_df, doc_key_column='key2')
+        stmt_df = store.get_doctype_df('statement')
+        store.save_views('../data/train_data/')
+    '''
+    class_names = ['Negative', 'Neutral', 'Positive']
+
+    # Suffix of the output files per document type
+    output_names = {
+        'statement': 'stmt',
+        'minutes': 'minutes',
+        'presconf_script': 'presconf',
+        'meeting_script': 'm_script',
+        'speech': 'speech',
+        'testimony': 'testimony'
+    }
+
+    def __init__(self, db_path='../data/train_data/sentiment_bert.db', model_version='default', verbose=True):
+        self.db_path = db_path
+        self.model_version = model_version
+        self.verbose = verbose
+
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self._create_tables()
+
+    def _create_tables(self):
+        self.conn.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                doc_key TEXT, model_version TEXT, doc_type TEXT,
+                next_meeting TEXT, next_decision INTEGER, next_rate REAL,
+                PRIMARY KEY (doc_key, model_version));
+            CREATE TABLE IF NOT EXISTS sentences (
+                doc_key TEXT, sentence_index INTEGER, model_version TEXT, prediction TEXT,
+                score_negative REAL, score_neutral REAL, score_positive REAL,
+                PRIMARY KEY (doc_key, sentence_index, model_version));
+            CREATE TABLE IF NOT EXISTS meeting_counts (
+                model_version TEXT, doc_type TEXT, next_meeting TEXT,
+                next_decision INTEGER, next_rate REAL,
+                negative INTEGER, neutral INTEGER, positive INTEGER,
+                PRIMARY KEY (model_version, doc_type, next_meeting));
+            CREATE INDEX IF NOT EXISTS documents_meeting
+                ON documents (model_version, doc_type, next_meeting);
+        ''')
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+    def _to_date_str(self, x):
+        if x is None or pd.isnull(x):
+            return None
+        return pd.Timestamp(x).strftime('%Y-%m-%d')
+
+    def _to_value(self, x, cast):
+        if x is None or pd.isnull(x):
+            return None
+        return cast(x)
+
+    def _update_meeting(self, doc_type, next_meeting):
+        '''
+        Recompute the aggregate of one meeting for one document type
+        '''
+        self.conn.execute('''
+            DELETE FROM meeting_counts WHERE model_version = ? AND doc_type = ? AND next_meeting IS ?
+        ''', (self.model_version, doc_type, next_meeting))
+        self.conn.execute('''
+            INSERT INTO meeting_counts
+            SELECT d.model_version, d.doc_type, d.next_meeting, MAX(d.next_decision), MAX(d.next_rate),
+                   SUM(s.prediction = 'Negative'), SUM(s.prediction = 'Neutral'), SUM(s.prediction = 'Positive')
+            FROM documents d JOIN sentences s
+              ON s.doc_key = d.doc_key AND s.model_version = d.model_version
+            WHERE d.model_version = ? AND d.doc_type = ? AND d.next_meeting IS ?
+            GROUP BY d.model_version, d.doc_type, d.next_meeting
+        ''', (self.model_version, doc_type, next_meeting))
+
+    def add_document(self, doc_key, doc_type, next_meeting, next_decision, next_rate, predictions, scores=None, commit=True):
+        '''
+        Add or replace the sentence predictions of one document and update the aggregate of its meeting.
+        predictions is a list of class names in the sentence order, and scores is an optional list of probabilities.
+        '''
+        next_meeting = self._to_date_str(next_meeting)
+        old = self.conn.execute('''
+            SELECT doc_type, next_meeting FROM documents WHERE doc_key = ? AND model_version = ?
+        ''', (doc_key, self.model_version)).fetchone()
+
+        self.conn.execute('DELETE FROM sentences WHERE doc_key = ? AND model_version = ?', (doc_key, self.model_version))
+        self.conn.execute('INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?, ?, ?)',
+                          (doc_key, self.model_version, doc_type, next_meeting,
+                           self._to_value(next_decision, int), self._to_value(next_rate, float)))
+        if scores is None:
+            scores = [(None, None, None)] * len(predictions)
+        self.conn.executemany('INSERT INTO sentences VALUES (?, ?, ?, ?, ?, ?, ?)',
+                              [(doc_key, i, self.model_version, prediction,
+                                self._to_value(score[0], float), self._to_value(score[1], float), self._to_value(score[2], float))
+                               for i, (prediction, score) in enumerate(zip(predictions, scores))])
+
+        self._update_meeting(doc_type, next_meeting)
+        if old is not None and (old[0], old[1]) != (doc_type, next_meeting):
+            self._update_meeting(old[0], old[1])
+        if commit:
+            self.conn.commit()
+
+    def add_scored_df(self, df, doc_key_column='key2'):
+        '''
+        Add sentence predictions in the dataframe created by score_text() or BertInference.score_df().
+        Sentences are grouped by doc_key_column and keep the order in the dataframe.
+        '''
+        if self.verbose: print("Adding {} sentences to {}".format(df.shape[0], self.db_path))
+        for doc_key, doc_df in df.groupby(doc_key_column, sort=False):
+            first = doc_df.iloc[0]
+            scores = list(doc_df['score']) if 'score' in doc_df.columns else None
+            self.add_document(doc_key, first['type'], first['next_meeting'], first['next_decision'], first['next_rate'],
+                              list(doc_df['prediction']), scores, commit=False)
+        self.conn.commit()
+
+    def has_document(self, doc_key):
+        '''
+        Returns True if the document is already scored by the current model version
+        '''
+        return self.conn.execute('SELECT 1 FROM documents WHERE doc_key = ? AND model_version = ?',
+                                 (doc_key, self.model_version)).fetchone() is not None
+
+    def get_doctype_df(self, doc_type='all'):
+        '''
+        Returns a dataframe of sentence counts per meeting for the given document type,
+         which is the same as get_doctype_df() in the notebook. 'all' sums up all document types.
+        '''
+        query = '''
+            SELECT next_meeting, MAX(next_decision) AS next_decision, MAX(next_rate) AS next_rate,
+                   SUM(negative) AS Negative, SUM(neutral) AS Neutral, SUM(positive) AS Positive
+            FROM meeting_counts WHERE model_version = ? {}
+            GROUP BY next_meeting ORDER BY next_meeting
+        '''
+        if doc_type == 'all':
+            new_df = pd.read_sql_query(query.format(''), self.conn, params=(self.model_version,))
+        else:
+            new_df = pd.read_sql_query(query.format('AND doc_type = ?'), self.conn, params=(self.model_version, doc_type))
+
+        # Documents without the next meeting are not aggregated, as done by groupby in the notebook
+        new_df = new_df.loc[new_df['next_meeting'].notnull() & new_df['next_decision'].notnull() & new_df['next_rate'].notnull()]
+        new_df['next_meeting'] = pd.to_datetime(new_df['next_meeting'])
+        new_df.set_index('next_meeting', inplace=True)
+        new_df['next_decision'] = new_df['next_decision'].astype('Int8')
+        new_df['sentiment'] = new_df['Positive'] - new_df['Negative']
+        new_df['next_rate_change'] = new_df['next_rate'] - new_df['next_rate'].shift(1)
+        new_df['sentiment_pct'] = new_df['sentiment'] / (new_df['Positive'] + new_df['Negative'])
+        new_df['sentiment_chg'] = new_df['sentiment'] - new_df['sentiment'].shift(1)
+        return new_df
+
+    def save_views(self, dir_name='../data/train_data/'):
+        '''
+        Save sentiment_bert_all and sentiment_bert_<type> to pickle and csv files in the given directory
+        '''
+        views = {'all': 'all'}
+        views.update(self.output_names)
+        for doc_type, name in views.items():
+            df = self.get_doctype_df(doc_type)
+            filepath = os.path.join(dir_name, 'sentiment_bert_' + name)
+            if self.verbose: print("Writing to ", filepath)
+            os.makedirs(dir_name, exist_ok=True)
+            with open(filepath + '.pickle', 'wb') as output_file:
+                pickle.dump(df, output_file)
+            df.to_csv(filepath + '.csv', index=True)
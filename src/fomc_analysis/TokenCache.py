@@ -0,0 +1,280 @@
+from multiprocessing import Pool, cpu_count
+from contextlib import contextmanager
+import hashlib
+import pickle
+import fcntl
+import os
+
+import numpy as np
+
+# Flags per token
+ALPHA = 1
+STOPWORD = 2
+
+# Tokenizer, stop words and lemmatizer of the worker process, loaded once
+_worker_nlp = None
+
+def _load_nlp():
+    global _worker_nlp
+    if _worker_nlp is None:
+        # nltk is imported here so that the other classes of fomc_analysis do not need it
+        import nltk
+        from nltk.corpus import stopwords
+        from nltk.tokenize import word_tokenize
+        _worker_nlp = (word_tokenize, set(stopwords.words('english')), nltk.stem.WordNetLemmatizer(), {})
+    return _worker_nlp
+
+def _tokenize_texts(texts):
+    '''
+    Returns a list of (tokens, lemmas, flags) per text, as tokenize_df() in the training notebook
+     but keeping all tokens, with the filters as flags
+    '''
+    word_tokenize, stop, wnl, lemmas = _load_nlp()
+    results = []
+    for text in texts:
+        tokens = word_tokenize(text)
+        words = [token.lower() for token in tokens]
+        flags = [(ALPHA if token.isalpha() else 0) | (STOPWORD if token in stop else 0) for token in tokens]
+        doc_lemmas = []
+        for word in words:
+            # Lemmatization is the most expensive step, and the same words repeat over the documents
+            lemma = lemmas.get(word)
+            if lemma is None:
+                lemma = wnl.lemmatize(wnl.lemmatize(word, 'n'), 'v')
+                lemmas[word] = lemma
+            doc_lemmas.append(lemma)
+        results.append((words, doc_lemmas, flags))
+    return results
+
+class TokenCache:
+    '''
+    Cache of tokenized and lemmatized documents shared by the text models, so that each text is tokenized
+     and lemmatized only once. Each document is kept as three int32 arrays of the same length:
+        tokens - ids of the lower-cased words by nltk word_tokenize
+        lemmas - ids of the lemmas of the words, noun then verb by WordNetLemmatizer as lemmatize_word()
+        flags - ALPHA if the word is alphabetic, STOPWORD if it is an nltk English stop word
+     Ids refer to one vocabulary of words and lemmas, which only grows so that the ids never change.
+    Documents are keyed by the hash of the text, in a directory per tokenizer version, and stored in
+     append-only segments of .npy files which are memory-mapped on read. Only uncached texts are
+     tokenized, in a process pool.
+    The cache can be shared by processes of several stages. Writes take a file lock and reload the index
+     before adding a segment, so that the ids and segments of other processes are kept.
+
+    Example Usage:
+        cache = TokenCache()
+        cache.add(train_df['text'])
+        # The same as tokenize_df() in the training notebook
+        tokenized = cache.lemma_tokens(train_df['text'])
+        # Arrays of the lemma ids of alphabetic non stop words for the models
+        ids = cache.lemma_ids(train_df['text'])
+    '''
+    # Changing the tokenization invalidates the cache
+    tokenizer_version = 'nltk-word_tokenize-wordnet-nv-1'
+
+    def __init__(self, cache_dir='../data/FOMC/token_cache/', processes=None, chunk_size=64, verbose=True):
+        self.cache_dir = os.path.join(cache_dir, self.tokenizer_version)
+        self.processes = processes if processes is not None else cpu_count()
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.load()
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def _dump(self, name, obj):
+        with open(self._path(name) + '.tmp', 'wb') as f:
+            pickle.dump(obj, f)
+        os.replace(self._path(name) + '.tmp', self._path(name))
+
+    @contextmanager
+    def _lock(self):
+        '''
+        Exclusive lock of the cache between processes while the segments and the index are written
+        '''
+        with open(self._path('lock'), 'a') as f:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+    def load(self):
+        '''
+        Load the index and the vocabulary of the cache
+        '''
+        self._read_state()
+        if self.verbose: print("{} tokenized documents in {}".format(len(self.index), self.cache_dir))
+
+    def _read_state(self):
+        self.index = {}
+        self.vocabulary = []
+        self.n_segments = 0
+        if os.path.exists(self._path('index.pickle')):
+            with open(self._path('index.pickle'), 'rb') as f:
+                state = pickle.load(f)
+            self.index = state['index']
+            self.vocabulary = state['vocabulary']
+            self.n_segments = state['n_segments']
+        self.word_ids = {word: i for i, word in enumerate(self.vocabulary)}
+        self._segments = {}
+
+    def key(self, text):
+        return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+    def __contains__(self, text):
+        return self.key(text) in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _word_id(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = len(self.vocabulary)
+            self.word_ids[word] = word_id
+            self.vocabulary.append(word)
+        return word_id
+
+    def add(self, texts):
+        '''
+        Tokenize and lemmatize the texts not in the cache, and save them as a new segment.
+        Returns the number of texts tokenized.
+        '''
+        new_texts = {}
+        for text in texts:
+            text = text if isinstance(text, str) else ''
+            key = self.key(text)
+            if key not in self.index and key not in new_texts:
+                new_texts[key] = text
+        if not new_texts:
+            return 0
+
+        keys = list(new_texts)
+        texts = [new_texts[key] for key in keys]
+        chunks = [texts[i:i + self.chunk_size] for i in range(0, len(texts), self.chunk_size)]
+        if self.verbose: print("Tokenizing {} documents...".format(len(texts)))
+        if self.processes > 1 and len(chunks) > 1:
+            with Pool(min(self.processes, len(chunks))) as pool:
+                results = pool.map(_tokenize_texts, chunks)
+        else:
+            results = [_tokenize_texts(chunk) for chunk in chunks]
+
+        with self._lock():
+            # Other processes may have added documents, words and segments meanwhile
+            self._read_state()
+            segment = self.n_segments
+            arrays = []
+            offset = 0
+            # Ids are given in the order of the texts, so that the vocabulary is deterministic
+            for key, (words, lemmas, flags) in zip(keys, (result for chunk in results for result in chunk)):
+                if key in self.index:
+                    continue
+                arrays.append(np.array([[self._word_id(word) for word in words],
+                                        [self._word_id(lemma) for lemma in lemmas],
+                                        flags], dtype=np.int32).reshape(3, -1))
+                self.index[key] = (segment, offset, offset + len(words))
+                offset += len(words)
+            if not arrays:
+                return 0
+
+            with open(self._path('segment_{}.tmp.npy'.format(segment)), 'wb') as f:
+                np.save(f, np.concatenate(arrays, axis=1))
+            os.replace(self._path('segment_{}.tmp.npy'.format(segment)), self._path('segment_{}.npy'.format(segment)))
+            self.n_segments += 1
+            # The index is written after the segment, so that it never refers to a missing segment
+            self._dump('index.pickle', {'index': self.index, 'vocabulary': self.vocabulary, 'n_segments': self.n_segments})
+        if self.verbose: print("{} tokens of {} documents saved to segment {}".format(offset, len(arrays), segment))
+        return len(arrays)
+
+    def _segment(self, segment):
+        if segment not in self._segments:
+            self._segments[segment] = np.load(self._path('segment_{}.npy'.format(segment)), mmap_mode='r')
+        return self._segments[segment]
+
+    def _arrays(self, key):
+        segment, start, end = self.index[key]
+        try:
+            return self._segment(segment)[:, start:end]
+        except FileNotFoundError:
+            # Compacted by another process
+            with self._lock():
+                self._read_state()
+            segment, start, end = self.index[key]
+            return self._segment(segment)[:, start:end]
+
+    def get(self, text):
+        '''
+        Returns tokens, lemmas and flags arrays of the text, which are read-only views of the memory-mapped segment.
+        The text is tokenized if it is not in the cache.
+        '''
+        text = text if isinstance(text, str) else ''
+        key = self.key(text)
+        if key not in self.index:
+            self.add([text])
+        arrays = self._arrays(key)
+        return arrays[0], arrays[1], arrays[2]
+
+    def _selected(self, flags, alpha_only, drop_stopwords):
+        mask = np.ones(len(flags), dtype=bool)
+        if alpha_only:
+            mask &= (flags & ALPHA) > 0
+        if drop_stopwords:
+            mask &= (flags & STOPWORD) == 0
+        return mask
+
+    def lemma_ids(self, texts, alpha_only=True, drop_stopwords=True):
+        '''
+        Returns a list of arrays of the lemma ids per text, filtered as tokenize_df() by default
+        '''
+        texts = list(texts)
+        self.add(texts)
+        ids = []
+        for text in texts:
+            tokens, lemmas, flags = self.get(text)
+            ids.append(np.asarray(lemmas[self._selected(flags, alpha_only, drop_stopwords)]))
+        return ids
+
+    def lemma_tokens(self, texts, alpha_only=True, drop_stopwords=True):
+        '''
+        Returns a list of lemma lists per text, the same as tokenize_df() in the training notebook by default
+        '''
+        ids = self.lemma_ids(texts, alpha_only, drop_stopwords)
+        # The vocabulary is read after adding, as it may be reloaded with the words of other processes
+        vocabulary = self.vocabulary
+        return [[vocabulary[i] for i in doc_ids] for doc_ids in ids]
+
+    def lemma_texts(self, texts, alpha_only=True, drop_stopwords=True):
+        '''
+        Returns the lemmas joined by spaces per text, e.g. for TfidfVectorizer or IncrementalTfidf
+        '''
+        return [' '.join(tokens) for tokens in self.lemma_tokens(texts, alpha_only, drop_stopwords)]
+
+    def compact(self):
+        '''
+        Merge all segments into one, so that reading does not open many small files
+        '''
+        with self._lock():
+            self._read_state()
+            if self.n_segments <= 1:
+                return
+            keys = sorted(self.index, key=lambda key: self.index[key])
+            arrays = []
+            index = {}
+            offset = 0
+            for key in keys:
+                segment, start, end = self.index[key]
+                arrays.append(np.array(self._segment(segment)[:, start:end]))
+                index[key] = (self.n_segments, offset, offset + end - start)
+                offset += end - start
+            with open(self._path('segment_{}.tmp.npy'.format(self.n_segments)), 'wb') as f:
+                np.save(f, np.concatenate(arrays, axis=1) if arrays else np.zeros((3, 0), dtype=np.int32))
+            os.replace(self._path('segment_{}.tmp.npy'.format(self.n_segments)), self._path('segment_{}.npy'.format(self.n_segments)))
+            old_segments = set(segment for segment, start, end in self.index.values())
+            self.index = index
+            self.n_segments += 1
+            self._dump('index.pickle', {'index': self.index, 'vocabulary': self.vocabulary, 'n_segments': self.n_segments})
+            self._segments = {}
+            for segment in old_segments:
+                os.remove(self._path('segment_{}.npy'.format(segment)))
+        if self.verbose: print("{} documents compacted to one segment".format(len(self.index)))
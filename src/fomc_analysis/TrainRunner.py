@@ -0,0 +1,310 @@
+from multiprocessing import Pool, cpu_count
+import hashlib
+import json
+import time
+import os
+
+import numpy as np
+import pandas as pd
+
+# Memory-mapped arrays opened once per worker process by _init_worker
+_worker_data = None
+
+def _init_worker(data_dir):
+    global _worker_data
+    _worker_data = {}
+    for name in ('X_train', 'Y_train', 'X_test', 'fold_ids'):
+        _worker_data[name] = np.load(os.path.join(data_dir, name + '.npy'), mmap_mode='r')
+
+def _fit_fold(job):
+    '''
+    Fit one estimator on one fold and return its scores, and the predictions if requested
+    '''
+    from sklearn.metrics import accuracy_score, f1_score
+
+    key, estimator, fold, predict = job
+    X, y, fold_ids = _worker_data['X_train'], _worker_data['Y_train'], _worker_data['fold_ids']
+    train_index = np.flatnonzero(fold_ids != fold)
+    test_index = np.flatnonzero(fold_ids == fold)
+
+    start = time.perf_counter()
+    estimator.fit(X[train_index], y[train_index])
+    fit_time = time.perf_counter() - start
+    pred_train = estimator.predict(X[train_index])
+    pred_test = estimator.predict(X[test_index])
+
+    result = {
+        'fit_time': fit_time,
+        'train_Accuracy': accuracy_score(y[train_index], pred_train),
+        'train_F1': f1_score(y[train_index], pred_train, average='macro'),
+        'test_Accuracy': accuracy_score(y[test_index], pred_test),
+        'test_F1': f1_score(y[test_index], pred_test, average='macro')
+    }
+    predictions = None
+    if predict:
+        predictions = {'test_index': test_index, 'oof': pred_test, 'holdout': estimator.predict(np.asarray(_worker_data['X_test']))}
+    return key, result, predictions
+
+def _convert_class(x):
+    if x == 1:
+        return 3
+    elif x == 0:
+        return 2
+    elif x == -1:
+        return 1
+
+class TrainRunner:
+    '''
+    Cross validation and hyperparameter search runner of the baseline classifiers.
+    The balanced dataset, the train/test split and the stratified folds are materialized once as .npy files,
+     which worker processes open as memory-mapped arrays, so that the data is not copied per job.
+    All model x parameter x fold jobs are scheduled on one process pool, and the result of each fold is cached
+     by the hash of the data and the estimator configuration. An interrupted or extended search resumes,
+     running only the jobs not in the cache.
+
+    Example Usage:
+        runner = TrainRunner(train_df, n_fold=7)
+        runner.run([(name, clf, [{}]) for name, clf in classifiers])
+        cv_res = runner.results()
+
+        ada_res = runner.random_search('AdaBoost', ada_clf, rand_param_grid, n_iter=300)
+        ada_best = runner.best_estimator('AdaBoost', ada_clf)
+        ada_oof_train, ada_oof_test = runner.oof_predictions('AdaBoost', ada_best)
+    '''
+    def __init__(self, train_df, target='target', keep_prob=1, test_size=0.2, n_fold=7, cache_dir='../data/result/cv_cache/',
+                 processes=None, random_state=1, verbose=True):
+        self.target = target
+        self.keep_prob = keep_prob
+        self.test_size = test_size
+        self.n_fold = n_fold
+        self.cache_dir = cache_dir
+        self.processes = processes if processes is not None else cpu_count()
+        self.random_state = random_state
+        self.verbose = verbose
+
+        self.data_dir = self._materialize(train_df)
+        self.results_dir = os.path.join(self.data_dir, 'results')
+        os.makedirs(self.results_dir, exist_ok=True)
+        self.Y_train = np.load(os.path.join(self.data_dir, 'Y_train.npy'), mmap_mode='r')
+        self.Y_test = np.load(os.path.join(self.data_dir, 'Y_test.npy'), mmap_mode='r')
+        self.X_test = np.load(os.path.join(self.data_dir, 'X_test.npy'), mmap_mode='r')
+        self.X_train = np.load(os.path.join(self.data_dir, 'X_train.npy'), mmap_mode='r')
+        self.fold_ids = np.load(os.path.join(self.data_dir, 'fold_ids.npy'), mmap_mode='r')
+
+        # (name, config key) of the jobs run or loaded by this runner
+        self.configs = {}
+
+    def _materialize(self, train_df):
+        '''
+        Balance the classes, split train and test and assign the folds, and save them as .npy files
+         in a directory named by the hash of the data and the settings. Returns the directory.
+        '''
+        from sklearn.model_selection import StratifiedKFold, train_test_split
+
+        balanced = pd.concat([train_df.loc[train_df[self.target] != 0],
+                              train_df.loc[train_df[self.target] == 0].sample(frac=self.keep_prob, random_state=self.random_state)])
+        balanced = balanced.sort_index(ascending=True)
+        Y_balanced = balanced[self.target].map(_convert_class).values
+        X_balanced = balanced.drop(columns=[self.target]).values.astype(np.float64)
+
+        digest = hashlib.sha1()
+        digest.update(np.ascontiguousarray(X_balanced).tobytes())
+        digest.update(np.ascontiguousarray(Y_balanced).tobytes())
+        digest.update(repr((self.test_size, self.n_fold)).encode('utf-8'))
+        data_dir = os.path.join(self.cache_dir, digest.hexdigest()[:16])
+        if os.path.exists(os.path.join(data_dir, 'fold_ids.npy')):
+            return data_dir
+
+        # Because the prediction should be on the latest and should not look back, use shuffle=False
+        X_train, X_test, Y_train, Y_test = train_test_split(X_balanced, Y_balanced, test_size=self.test_size, shuffle=False)
+        fold_ids = np.zeros(len(Y_train), dtype=np.int32)
+        for fold, (train_index, test_index) in enumerate(StratifiedKFold(n_splits=self.n_fold).split(X_train, Y_train)):
+            fold_ids[test_index] = fold
+
+        os.makedirs(data_dir, exist_ok=True)
+        arrays = {'X_train': X_train, 'Y_train': Y_train, 'X_test': X_test, 'Y_test': Y_test}
+        # fold_ids is written last as the marker of a complete directory
+        arrays['fold_ids'] = fold_ids
+        for name, array in arrays.items():
+            np.save(os.path.join(data_dir, name + '.tmp.npy'), array)
+            os.replace(os.path.join(data_dir, name + '.tmp.npy'), os.path.join(data_dir, name + '.npy'))
+        if self.verbose:
+            print("Materialized {} train and {} test rows with {} folds in {}".format(len(Y_train), len(Y_test), self.n_fold, data_dir))
+        return data_dir
+
+    def _config_key(self, estimator, fold):
+        '''
+        Hash of the estimator class, all its parameters and the fold
+        '''
+        items = []
+        for param, value in sorted(estimator.get_params(deep=True).items()):
+            # Nested estimators are identified by class, as their parameters are listed separately
+            items.append((param, type(value).__name__ if hasattr(value, 'get_params') else repr(value)))
+        config = '{}.{}:{}:{}'.format(type(estimator).__module__, type(estimator).__name__, items, fold)
+        return hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+    def _result_path(self, key, ext='.json'):
+        return os.path.join(self.results_dir, key + ext)
+
+    def _save_result(self, key, record, predictions):
+        if predictions is not None:
+            path = self._result_path(key, '.npz')
+            with open(path + '.tmp', 'wb') as f:
+                np.savez(f, **predictions)
+            os.replace(path + '.tmp', path)
+        path = self._result_path(key)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(record, f)
+        os.replace(path + '.tmp', path)
+
+    def _load_result(self, key, predict=False):
+        path = self._result_path(key)
+        if not os.path.exists(path) or (predict and not os.path.exists(self._result_path(key, '.npz'))):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def run(self, searches, predict=False):
+        '''
+        Run all folds of the searches on the process pool, skipping the cached ones.
+        searches is a list of (name, estimator, list of parameter dicts). An empty dict is the estimator as is.
+        If predict is True, out-of-fold and test predictions are kept for stacking.
+        '''
+        from sklearn.base import clone
+
+        jobs = []
+        n_configs = 0
+        for name, estimator, param_list in searches:
+            for params in param_list:
+                configured = clone(estimator).set_params(**params)
+                for fold in range(self.n_fold):
+                    key = self._config_key(configured, fold)
+                    self.configs[(name, key)] = params
+                    n_configs += 1
+                    if self._load_result(key, predict) is None:
+                        jobs.append((key, configured, fold, predict, name, params))
+        if self.verbose:
+            print("{} fold jobs to run, {} cached".format(len(jobs), n_configs - len(jobs)))
+        if not jobs:
+            return
+
+        meta = {job[0]: job for job in jobs}
+        tasks = [job[:4] for job in jobs]
+        done = 0
+        if self.processes > 1:
+            with Pool(self.processes, initializer=_init_worker, initargs=(self.data_dir,)) as pool:
+                for key, result, predictions in pool.imap_unordered(_fit_fold, tasks):
+                    done += 1
+                    self._finish(meta[key], result, predictions, done, len(tasks))
+        else:
+            _init_worker(self.data_dir)
+            for task in tasks:
+                key, result, predictions = _fit_fold(task)
+                done += 1
+                self._finish(meta[key], result, predictions, done, len(tasks))
+
+    def _finish(self, job, result, predictions, done, total):
+        key, configured, fold, predict, name, params = job
+        record = {'name': name, 'params': {k: repr(v) for k, v in params.items()}, 'fold': fold}
+        record.update(result)
+        self._save_result(key, record, predictions)
+        if self.verbose and (done % 100 == 0 or done == total):
+            print("Finished {} / {} fold jobs".format(done, total))
+
+    def cross_validate(self, name, estimator):
+        '''
+        Cross validate the estimator as is. Returns the scores per fold as a DataFrame.
+        '''
+        self.run([(name, estimator, [{}])])
+        return self._fold_results(name)
+
+    def grid_search(self, name, estimator, param_grid):
+        '''
+        Same candidates as GridSearchCV. Returns the results per parameter set ranked by F1.
+        '''
+        from sklearn.model_selection import ParameterGrid
+        self.run([(name, estimator, list(ParameterGrid(param_grid)))])
+        return self.results(name)
+
+    def random_search(self, name, estimator, param_distributions, n_iter=10, random_state=None):
+        '''
+        Same candidates as RandomizedSearchCV with the same random_state. Returns the results per parameter set ranked by F1.
+        '''
+        from sklearn.model_selection import ParameterSampler
+        self.run([(name, estimator, list(ParameterSampler(param_distributions, n_iter=n_iter, random_state=random_state)))])
+        return self.results(name)
+
+    def _fold_results(self, name=None):
+        records = []
+        for (config_name, key), params in self.configs.items():
+            if name is not None and config_name != name:
+                continue
+            record = self._load_result(key)
+            if record is not None:
+                # The same configuration may have been run by another search, so the name and the parameters
+                #  are of this search, not those saved with the cached record
+                record['name'] = config_name
+                record['params'] = params
+                record['config'] = (config_name, repr(sorted(params.items())))
+                records.append(record)
+        return pd.DataFrame(records)
+
+    def results(self, name=None):
+        '''
+        Returns the mean and std of the scores over folds per name and parameter set, ranked by F1 within each name
+        '''
+        folds = self._fold_results(name)
+        if len(folds) == 0:
+            return folds
+        df = folds.groupby('config', sort=False).agg(
+            name=('name', 'first'),
+            params=('params', 'first'),
+            n_folds=('fold', 'count'),
+            mean_fit_time=('fit_time', 'mean'),
+            mean_train_Accuracy=('train_Accuracy', 'mean'),
+            mean_train_F1=('train_F1', 'mean'),
+            mean_test_Accuracy=('test_Accuracy', 'mean'),
+            std_test_Accuracy=('test_Accuracy', 'std'),
+            mean_test_F1=('test_F1', 'mean'),
+            std_test_F1=('test_F1', 'std')).reset_index(drop=True)
+        df['rank_test_F1'] = df.groupby('name')['mean_test_F1'].rank(ascending=False, method='min').astype(int)
+        return df.sort_values(by=['name', 'rank_test_F1']).reset_index(drop=True)
+
+    def best_params(self, name):
+        '''
+        Returns the parameter dict of the best F1 of the name
+        '''
+        best_key, best_f1 = None, None
+        scores = {}
+        for (config_name, key), params in self.configs.items():
+            record = self._load_result(key)
+            if config_name == name and record is not None:
+                config = repr(sorted(params.items()))
+                scores.setdefault(config, (params, []))[1].append(record['test_F1'])
+        for config, (params, f1s) in scores.items():
+            if best_f1 is None or np.mean(f1s) > best_f1:
+                best_key, best_f1 = config, np.mean(f1s)
+        return scores[best_key][0] if best_key is not None else None
+
+    def best_estimator(self, name, estimator):
+        '''
+        Returns the estimator with the best parameters of the name, fitted on the whole train data
+        '''
+        from sklearn.base import clone
+        best = clone(estimator).set_params(**(self.best_params(name) or {}))
+        return best.fit(np.asarray(self.X_train), np.asarray(self.Y_train))
+
+    def oof_predictions(self, name, estimator):
+        '''
+        Returns out-of-fold predictions of the train data and the mean of the fold predictions of the test data
+         as column vectors, for stacking. Fold predictions are cached as well.
+        '''
+        self.run([(name, estimator, [{}])], predict=True)
+        oof_train = np.zeros(len(self.Y_train))
+        oof_test_skf = np.empty((self.n_fold, len(self.Y_test)))
+        for fold in range(self.n_fold):
+            key = self._config_key(estimator, fold)
+            with np.load(self._result_path(key, '.npz')) as predictions:
+                oof_train[predictions['test_index']] = predictions['oof']
+                oof_test_skf[fold, :] = predictions['holdout']
+        return oof_train.reshape(-1, 1), oof_test_skf.mean(axis=0).reshape(-1, 1)
@@ -0,0 +1,267 @@
+from multiprocessing import Pool, cpu_count
+import hashlib
+import pickle
+import re
+import os
+
+import numpy as np
+import pandas as pd
+
+# Negation words preceding a positive word, as in the tone analysis of the training notebook
+negate = ["aint", "arent", "cannot", "cant", "couldnt", "darent", "didnt", "doesnt", "ain't", "aren't", "can't",
+          "couldn't", "daren't", "didn't", "doesn't", "dont", "hadnt", "hasnt", "havent", "isnt", "mightnt", "mustnt",
+          "neither", "don't", "hadn't", "hasn't", "haven't", "isn't", "mightn't", "mustn't", "neednt", "needn't",
+          "never", "none", "nope", "nor", "not", "nothing", "nowhere", "oughtnt", "shant", "shouldnt", "wasnt",
+          "werent", "oughtn't", "shan't", "shouldn't", "wasn't", "weren't", "without", "wont", "wouldnt", "won't",
+          "wouldn't", "rarely", "seldom", "despite", "no", "nobody"]
+
+_word_pattern = re.compile(r'\b([a-zA-Z]+n\'t|[a-zA-Z]+\'s|[a-zA-Z]+)\b')
+
+def tone_counts(positive, negative, article):
+    '''
+    Returns word count, positive and negative counts of the article by Loughran and McDonald word lists.
+    A positive word within three words after a negation word is counted as negative.
+    '''
+    negate_set = set(negate)
+    words = _word_pattern.findall(article.lower())
+    pos_count, neg_count = 0, 0
+    for i, word in enumerate(words):
+        if word in negative:
+            neg_count += 1
+        if word in positive:
+            if any(w in negate_set for w in words[max(0, i - 3):i]):
+                neg_count += 1
+            else:
+                pos_count += 1
+    return len(words), pos_count, neg_count
+
+# Feature matrix, targets and the model shared by the worker processes
+_worker_data = None
+
+def _init_worker(X, y, model):
+    global _worker_data
+    _worker_data = (X, y, model)
+
+def _run_fold(fold):
+    '''
+    Fit the model on the meetings before train_end and predict the meetings from train_end to test_end
+    '''
+    from sklearn.base import clone
+
+    train_end, test_end = fold
+    X, y, model = _worker_data
+    X_train, y_train = X[:train_end], y[:train_end]
+    # Missing values are filled by the means of the training window only
+    means = pd.DataFrame(X_train).mean().fillna(0).values
+    X_train = np.where(np.isnan(X_train), means, X_train)
+    X_test = np.where(np.isnan(X[train_end:test_end]), means, X[train_end:test_end])
+
+    estimator = clone(model)
+    estimator.fit(X_train, y_train)
+    return train_end, test_end, estimator.predict(X_test)
+
+class WalkForwardBacktest:
+    '''
+    Walk-forward backtest of the rate decision prediction over the meetings in the FOMC calendar.
+    Each meeting is predicted by a model trained only on the meetings before it (expanding window), with
+     point-in-time features: the economic indices and Taylor rules of MacroFeatures, which use only published
+     values, and the tone of the documents of the corpus available between the previous meeting and the meeting.
+     Documents are available after the release lag of each content type, e.g. minutes three weeks after the meeting.
+    The models are retrained every retrain_every meetings. Folds are independent and run in parallel.
+    Feature snapshots per meeting are cached by the hash of their inputs, so repeated backtests with new models
+     skip the feature assembly.
+
+    Example Usage:
+        backtest = WalkForwardBacktest(MacroFeatures.load())
+        result = backtest.run(RandomForestClassifier(n_estimators=100, random_state=2), min_train=60)
+        acc, f1 = backtest.score(result)
+    '''
+    # Days from the document date to its publication
+    release_lags = {
+        'statement': 0,
+        'minutes': 21,
+        'presconf_script': 0,
+        'meeting_script': 5 * 365 + 1,
+        'speech': 0,
+        'testimony': 0
+    }
+
+    # Market features per nontext_* output, same as nontext_train_small
+    market_columns = {
+        'nontext_data': ['prev_decision', 'GDP_diff_prev', 'PMI_value'],
+        'nontext_ma2': ['Employ_diff_prev', 'Rsales_diff_year'],
+        'nontext_ma3': ['Unemp_diff_prev', 'Inertia_diff'],
+        'nontext_ma12': ['Hsales_diff_year', 'Balanced_diff']
+    }
+
+    # Changing the assembly logic invalidates the cached snapshots
+    snapshot_version = 1
+
+    def __init__(self, macro_features, corpus_dir='../data/FOMC/',
+                 lmdict_path='../data/LoughranMcDonald/LoughranMcDonald_SentimentWordLists_2018.csv',
+                 content_types=('statement', 'minutes', 'presconf_script', 'speech', 'testimony'),
+                 cache_dir='../data/result/backtest/', processes=None, verbose=True):
+        self.macro_features = macro_features
+        self.corpus_dir = corpus_dir
+        self.lmdict_path = lmdict_path
+        self.content_types = content_types
+        self.cache_dir = cache_dir
+        self.processes = processes if processes is not None else cpu_count()
+        self.verbose = verbose
+        self.snapshot_dir = os.path.join(cache_dir, 'snapshots')
+        self._docs = None
+        self._word_lists = None
+
+    def _market(self):
+        '''
+        Returns the market features and the target indexed by the meeting date
+        '''
+        results = self.macro_features.results or self.macro_features.build()
+        data = results['nontext_data'].copy()
+        # The previous decision is known at the meeting
+        data['prev_decision'] = data['RateDecision'].shift(1).fillna(0)
+        frames = [data[['RateDecision', 'ChairPerson']].rename(columns={'RateDecision': 'target'})]
+        for name, columns in self.market_columns.items():
+            df = data if name == 'nontext_data' else results[name]
+            frames.append(df[columns] if name == 'nontext_data' else df[columns].add_suffix('_' + name.split('_')[-1]))
+        market = pd.concat(frames, axis=1)
+        market['target'] = market['target'].astype(float)
+        return market
+
+    def _documents(self):
+        '''
+        Returns a DataFrame of type, available date, speaker, content hash and contents of the corpus
+        '''
+        if self._docs is not None:
+            return self._docs
+        frames = []
+        for content_type in self.content_types:
+            path = os.path.join(self.corpus_dir, content_type + '.pickle')
+            if not os.path.exists(path):
+                if self.verbose:
+                    print("No corpus of {} in {}".format(content_type, self.corpus_dir))
+                continue
+            df = pd.read_pickle(path)
+            df = df.loc[df['contents'].notnull(), ['date', 'speaker', 'contents']].copy()
+            df['type'] = content_type
+            df['available'] = pd.to_datetime(df['date']) + pd.Timedelta(days=self.release_lags[content_type])
+            frames.append(df)
+        if frames:
+            docs = pd.concat(frames, ignore_index=True)
+        else:
+            docs = pd.DataFrame(columns=['date', 'speaker', 'contents', 'type', 'available'])
+        docs['hash'] = [hashlib.sha1(text.encode('utf-8')).hexdigest() for text in docs['contents']]
+        self._docs = docs.sort_values(by=['available', 'type', 'hash']).reset_index(drop=True)
+        return self._docs
+
+    def _load_word_lists(self):
+        if self._word_lists is None:
+            sentiment_df = pd.read_csv(self.lmdict_path)
+            words = sentiment_df['word'].str.lower()
+            self._word_lists = (set(words[sentiment_df['sentiment'] == 'Positive']), set(words[sentiment_df['sentiment'] == 'Negative']))
+        return self._word_lists
+
+    def _snapshot_key(self, date, market_row, docs):
+        digest = hashlib.sha1()
+        digest.update(repr((self.snapshot_version, self.content_types, sorted(self.release_lags.items()), date.strftime('%Y-%m-%d'))).encode('utf-8'))
+        digest.update(repr(market_row.tolist()).encode('utf-8'))
+        for content_type, doc_hash in zip(docs['type'], docs['hash']):
+            digest.update((content_type + doc_hash).encode('utf-8'))
+        return digest.hexdigest()[:16]
+
+    def _assemble(self, market_row, docs):
+        '''
+        Returns the features of one meeting from its market features and the documents in its window
+        '''
+        positive, negative = self._load_word_lists()
+        snapshot = market_row.to_dict()
+        tones = []
+        for content_type in self.content_types:
+            selected = docs.loc[docs['type'] == content_type]
+            # Speeches and testimonies by the chairperson only
+            if content_type in ('speech', 'testimony') and isinstance(market_row.get('ChairPerson'), str):
+                surname = market_row['ChairPerson'].split()[-1]
+                selected = selected.loc[selected['speaker'].fillna('').str.contains(surname, regex=False)]
+            counts = np.array([tone_counts(positive, negative, text) for text in selected['contents']]).reshape(-1, 3).sum(axis=0)
+            tone = 100 * (counts[1] - counts[2]) / counts[0] if counts[0] > 0 else 0
+            snapshot[content_type + '_tone'] = tone
+            snapshot[content_type + '_docs'] = len(selected)
+            tones.append(tone)
+        snapshot['tone'] = np.mean(tones) if tones else 0
+        return snapshot
+
+    def snapshots(self):
+        '''
+        Returns the point-in-time features of all meetings, assembling only those not in the cache
+        '''
+        market = self._market()
+        docs = self._documents()
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+
+        available = docs['available'].values
+        dates = market.index
+        # Documents available in [previous meeting, meeting), or 90 days before the first meeting
+        starts = np.concatenate([[(dates[0] - pd.Timedelta(days=90)).to_datetime64()], dates[:-1].values]) if len(dates) else dates.values
+        lo = np.searchsorted(available, starts, side='left')
+        hi = np.searchsorted(available, dates.values, side='left')
+
+        records = []
+        n_assembled = 0
+        for i, date in enumerate(dates):
+            window = docs.iloc[lo[i]:hi[i]]
+            row = market.iloc[i]
+            path = os.path.join(self.snapshot_dir, '{}_{}.pickle'.format(date.strftime('%Y-%m-%d'), self._snapshot_key(date, row, window)))
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    snapshot = pickle.load(f)
+            else:
+                snapshot = self._assemble(row, window)
+                with open(path + '.tmp', 'wb') as f:
+                    pickle.dump(snapshot, f)
+                os.replace(path + '.tmp', path)
+                n_assembled += 1
+            records.append(snapshot)
+        if self.verbose:
+            print("Assembled {} of {} meeting snapshots".format(n_assembled, len(dates)))
+        return pd.DataFrame(records, index=dates)
+
+    def run(self, model, min_train=40, retrain_every=1, feature_columns=None):
+        '''
+        Predict each meeting after the first min_train meetings by the model retrained on all meetings before it,
+         every retrain_every meetings. model is an unfitted scikit-learn estimator, cloned per fold.
+        Returns a DataFrame of target, prediction and the number of training meetings per meeting.
+        '''
+        snapshots = self.snapshots().dropna(subset=['target'])
+        if feature_columns is None:
+            feature_columns = [column for column in snapshots.columns if column not in ('target', 'ChairPerson')]
+        X = snapshots[feature_columns].astype(float).values
+        y = snapshots['target'].astype(int).values
+
+        folds = [(train_end, min(train_end + retrain_every, len(y))) for train_end in range(min_train, len(y), retrain_every)]
+        if self.verbose:
+            print("Running {} folds for {} meetings".format(len(folds), len(y) - min(min_train, len(y))))
+        if self.processes > 1 and len(folds) > 1:
+            with Pool(self.processes, initializer=_init_worker, initargs=(X, y, model)) as pool:
+                fold_results = pool.map(_run_fold, folds)
+        else:
+            _init_worker(X, y, model)
+            fold_results = [_run_fold(fold) for fold in folds]
+
+        predictions = np.full(len(y), np.nan)
+        train_sizes = np.zeros(len(y), dtype=int)
+        for train_end, test_end, pred in fold_results:
+            predictions[train_end:test_end] = pred
+            train_sizes[train_end:test_end] = train_end
+        result = pd.DataFrame({'target': y, 'prediction': predictions, 'n_train': train_sizes}, index=snapshots.index)
+        return result.iloc[min_train:]
+
+    def score(self, result):
+        '''
+        Returns accuracy and macro F1 of the backtest result
+        '''
+        from sklearn.metrics import accuracy_score, f1_score
+        acc = accuracy_score(result['target'], result['prediction'])
+        f1 = f1_score(result['target'], result['prediction'], average='macro')
+        if self.verbose:
+            print("Walk-forward over {} meetings - acc: {:.4f}, f1: {:.4f}".format(len(result), acc, f1))
+        return acc, f1
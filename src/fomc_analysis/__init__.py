@@ -0,0 +1,9 @@
+from .KeywordFilter import KeywordFilter
+from .BertInference import BertInference
+from .SentimentStore import SentimentStore
+from .IncrementalTfidf import IncrementalTfidf
+from .CorpusIndex import CorpusIndex
+from .MacroFeatures import MacroFeatures
+from .TrainRunner import TrainRunner
+from .WalkForwardBacktest import WalkForwardBacktest
+from .TokenCache import TokenCache
\ No newline at end of file
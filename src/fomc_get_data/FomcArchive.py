@@ -0,0 +1,173 @@
+from datetime import datetime
+import threading
+import hashlib
+import json
+import gzip
+import os
+
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, guess_json_utf
+from requests.compat import chardet
+
+class FomcArchivedResponse:
+    '''
+    A response read from the archive, with the attributes of requests.Response used by the scrapers.
+    The text is decoded as requests does, by the charset of the Content-Type header, ISO-8859-1 for text/*
+     without a charset, or else the detected encoding, so that a replay gives the same text as the live crawl.
+    '''
+    def __init__(self, url, status_code, content_type, content):
+        self.url = url
+        self.status_code = status_code
+        self.headers = CaseInsensitiveDict({'Content-Type': content_type})
+        self.content = content
+        self.encoding = get_encoding_from_headers(self.headers)
+
+    @property
+    def apparent_encoding(self):
+        return chardet.detect(self.content)['encoding'] if chardet is not None else 'utf-8'
+
+    @property
+    def text(self):
+        encoding = self.encoding if self.encoding is not None else self.apparent_encoding
+        try:
+            return str(self.content, encoding, errors='replace')
+        except (LookupError, TypeError):
+            return str(self.content, errors='replace')
+
+    def json(self):
+        if not self.encoding and len(self.content) > 3:
+            encoding = guess_json_utf(self.content)
+            if encoding is not None:
+                return json.loads(self.content.decode(encoding))
+        return json.loads(self.text)
+
+class FomcArchive:
+    '''
+    An archive of raw responses of the FOMC website, so that the corpus can be rebuilt without the network
+     when the extraction logic changes.
+    Responses are stored as WARC-like records, each compressed as an independent gzip member, in shards of
+     up to shard_size bytes. index.jsonl keeps the shard, offset and length of each record for random access.
+    mode is one of:
+        record - get from the website and archive the response if the body has changed
+        replay - get only from the archive. A url not in the archive raises KeyError.
+    The default mode can be set by FOMC_ARCHIVE environment variable.
+
+    Example Usage:
+        fomc = FomcSpeech()
+        fomc.archive = FomcArchive('../data/FOMC/archive/', mode='replay')
+        df = fomc.get_contents(resume=False)
+    '''
+    def __init__(self, archive_dir='../data/FOMC/archive/', mode=None, shard_size=256 * 1024 * 1024):
+        self.archive_dir = archive_dir
+        self.mode = mode if mode is not None else os.environ.get('FOMC_ARCHIVE', 'record')
+        if self.mode not in ('record', 'replay'):
+            raise ValueError("mode should be either record or replay: " + str(self.mode))
+        self.shard_size = shard_size
+        self.index_path = os.path.join(archive_dir, 'index.jsonl')
+        self.lock = threading.Lock()
+        self.shard = None
+        self.shard_file = None
+        self.shard_seq = 0
+
+        # url -> the latest index record
+        self.index = {}
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    self.index[record['url']] = record
+
+    def __contains__(self, url):
+        return url in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getstate__(self):
+        # Open files and the lock are not passed to worker processes
+        state = self.__dict__.copy()
+        state['lock'] = None
+        state['shard'] = None
+        state['shard_file'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = threading.Lock()
+
+    def _new_shard(self):
+        # Shard names are unique per process, so that concurrent writers never share a file
+        self.shard_seq += 1
+        self.shard = '{}-{}-{:05d}.warc.gz'.format(datetime.now().strftime('%Y%m%d%H%M%S'), os.getpid(), self.shard_seq)
+        os.makedirs(self.archive_dir, exist_ok=True)
+        self.shard_file = open(os.path.join(self.archive_dir, self.shard), 'ab')
+
+    def put(self, url, status_code, content_type, content):
+        '''
+        Append a response to the archive. The same body as the latest archived one is not stored again.
+        '''
+        digest = hashlib.sha1(content).hexdigest()
+        with self.lock:
+            latest = self.index.get(url)
+            if latest is not None and latest['sha1'] == digest and latest['status'] == status_code:
+                return
+            header = '\r\n'.join([
+                'WARC/1.0',
+                'WARC-Type: response',
+                'WARC-Target-URI: ' + url,
+                'WARC-Date: ' + datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+                'WARC-Payload-Digest: sha1:' + digest,
+                'HTTP-Status: ' + str(status_code),
+                'Content-Type: ' + content_type,
+                'Content-Length: ' + str(len(content))
+            ]) + '\r\n\r\n'
+            member = gzip.compress(header.encode('utf-8') + content + b'\r\n\r\n')
+
+            if self.shard_file is None or self.shard_file.tell() + len(member) > self.shard_size:
+                if self.shard_file is not None:
+                    self.shard_file.close()
+                self._new_shard()
+            offset = self.shard_file.tell()
+            self.shard_file.write(member)
+            self.shard_file.flush()
+
+            record = {'url': url, 'shard': self.shard, 'offset': offset, 'length': len(member),
+                      'status': status_code, 'content_type': content_type, 'sha1': digest}
+            with open(self.index_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+            self.index[url] = record
+
+    def read(self, url):
+        '''
+        Returns the archived response of the url
+        '''
+        record = self.index.get(url)
+        if record is None:
+            raise KeyError("Not in the archive: " + url)
+        with open(os.path.join(self.archive_dir, record['shard']), 'rb') as f:
+            f.seek(record['offset'])
+            data = gzip.decompress(f.read(record['length']))
+        header_end = data.index(b'\r\n\r\n') + 4
+        content = data[header_end:header_end + int(data[:header_end].decode('utf-8').rsplit('Content-Length: ', 1)[1].split('\r\n', 1)[0])]
+        return FomcArchivedResponse(url, record['status'], record['content_type'], content)
+
+    def get(self, url, get=requests.get):
+        '''
+        Returns the response of the url from the website or the archive depending on the mode
+        get is a function which takes a url and returns a response from the website, requests.get by default.
+        '''
+        if self.mode == 'replay':
+            return self.read(url)
+        res = get(url)
+        self.put(url, res.status_code, res.headers.get('Content-Type', ''), res.content)
+        return res
+
+    def close(self):
+        with self.lock:
+            if self.shard_file is not None:
+                self.shard_file.close()
+                self.shard_file = None
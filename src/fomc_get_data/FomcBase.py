@@ -1,22 +1,45 @@
 from datetime import date
+from multiprocessing import get_context
 import re
 import threading
 import pickle
 import sys
 import os
 
-import requests
 from bs4 import BeautifulSoup
 
-import numpy as np
-import pandas as pd
-
 from abc import ABCMeta, abstractmethod
 
+# pandas and FomcDedup are imported when used, so that finding links does not load them
+from .FomcCrawlJournal import FomcCrawlJournal
+from .FomcMetrics import FomcMetrics
+from .FomcRateLimiter import FomcRateLimiter
+
+# The instance to extract articles in forked worker processes, set only while the pool is running
+_worker_fomc = None
+
+def _extract_articles(indices):
+    '''
+    Worker of FomcBase._get_articles_multi_process. Returns a list of (index, article, error).
+    '''
+    results = []
+    for index in indices:
+        try:
+            _worker_fomc._add_article(_worker_fomc.links[index], index)
+            results.append((index, _worker_fomc.articles[index], None))
+        except Exception as e:
+            results.append((index, '', "{}: {}".format(type(e).__name__, e)))
+    return results
+
 class FomcBase(metaclass=ABCMeta):
     '''
     A base class for extracting documents from the FOMC website
     '''
+    # FOMC Chairperson's list of Surname, FirstName, FromDate and ToDate
+    chair_list = [["Greenspan", "Alan", "1987-08-11", "2006-01-31"],
+                  ["Bernanke", "Ben", "2006-02-01", "2014-01-31"],
+                  ["Yellen", "Janet", "2014-02-03", "2018-02-03"],
+                  ["Powell", "Jerome", "2018-02-05", "2022-02-05"]]
 
     def __init__(self, content_type, verbose, max_threads, base_dir):
         
@@ -28,24 +51,30 @@ class FomcBase(metaclass=ABCMeta):
 
         # Initialization
         self.df = None
-        self.links = None
-        self.dates = None
+        # FomcLinkRecords of link, date, speaker and title set by _get_links
+        self.records = None
         self.articles = None
-        self.speakers = None
-        self.titles = None
+        self.failures = {}
+        self.journal = None
+        self.metrics = FomcMetrics()
+        # Share one FomcRateLimiter among scrapers running at the same time to keep a global request budget
+        self.limiter = FomcRateLimiter(max_concurrency=max_threads)
+        # FomcArchive of raw responses. In replay mode, articles are extracted from it by processes in parallel.
+        self.archive = None
+        self.processes = os.cpu_count()
 
         # FOMC website URLs
         self.base_url = 'https://www.federalreserve.gov'
         self.calendar_url = self.base_url + '/monetarypolicy/fomccalendars.htm'
 
-        # FOMC Chairperson's list
-        self.chair = pd.DataFrame(
-            data=[["Greenspan", "Alan", "1987-08-11", "2006-01-31"], 
-                  ["Bernanke", "Ben", "2006-02-01", "2014-01-31"], 
-                  ["Yellen", "Janet", "2014-02-03", "2018-02-03"],
-                  ["Powell", "Jerome", "2018-02-05", "2022-02-05"]],
-            columns=["Surname", "FirstName", "FromDate", "ToDate"])
-        
+    @property
+    def chair(self):
+        '''
+        FOMC Chairperson's list as a DataFrame
+        '''
+        import pandas as pd
+        return pd.DataFrame(data=self.chair_list, columns=["Surname", "FirstName", "FromDate", "ToDate"])
+
     def _date_from_link(self, link):
         date = re.findall('[0-9]{8}', link)[0]
         if date[4] == '0':
@@ -55,24 +84,51 @@ class FomcBase(metaclass=ABCMeta):
         return date
 
     def _speaker_from_date(self, article_date):
-        if self.chair.FromDate[0] < article_date and article_date < self.chair.ToDate[0]:
-            speaker = self.chair.FirstName[0] + " " + self.chair.Surname[0]
-        elif self.chair.FromDate[1] < article_date and article_date < self.chair.ToDate[1]:
-            speaker = self.chair.FirstName[1] + " " + self.chair.Surname[1]
-        elif self.chair.FromDate[2] < article_date and article_date < self.chair.ToDate[2]:
-            speaker = self.chair.FirstName[2] + " " + self.chair.Surname[2]
-        elif self.chair.FromDate[3] < article_date and article_date < self.chair.ToDate[3]:
-            speaker = self.chair.FirstName[3] + " " + self.chair.Surname[3]
-        else:
-            speaker = "other"
-        return speaker
+        for surname, first_name, from_date, to_date in self.chair_list:
+            if from_date < article_date and article_date < to_date:
+                return first_name + " " + surname
+        return "other"
         
+    def _get(self, url):
+        '''
+        GET the url, recording the latency and the bytes transferred
+        Requests to the website are throttled by the limiter and retried on 429 and 5xx.
+        '''
+        with self.metrics.timer('fetch', self.content_type):
+            if self.archive is not None:
+                res = self.archive.get(url, self._get_live)
+                if self.archive.mode == 'replay':
+                    # Served from the archive without the network
+                    self.metrics.inc('cache_hits', 1, self.content_type)
+            else:
+                res = self._get_live(url)
+        self.metrics.inc('requests', 1, self.content_type)
+        self.metrics.inc('bytes', len(res.content), self.content_type)
+        if res.status_code >= 400:
+            self.metrics.inc('http_errors', 1, self.content_type)
+        return res
+
+    @property
+    def links(self):
+        return None if self.records is None else self.records.links
+
+    def _get_live(self, url):
+        return self.limiter.get(url, metrics=self.metrics, content_type=self.content_type)
+
+    def _parse_html(self, html):
+        '''
+        Parse html text by BeautifulSoup, recording the latency
+        '''
+        with self.metrics.timer('parse', self.content_type):
+            return BeautifulSoup(html, 'html.parser')
+
     @abstractmethod
     def _get_links(self, from_year):
         '''
         private function that sets all the links for the FOMC meetings
          from the giving from_year to the current most recent year
          from_year is min(2015, from_year)
+        The links are appended to self.records with the date, speaker and title
         '''
         # Implement in sub classes
         pass
@@ -88,49 +144,163 @@ class FomcBase(metaclass=ABCMeta):
         # Implement in sub classes
         pass
 
-    def _get_articles_multi_threaded(self):
+    def _add_article_journaled(self, link, index):
+        '''
+        Calls _add_article and records the article or the exception in the journal,
+         so that a failure in a thread is not lost silently
+        '''
+        try:
+            with self.metrics.timer('article', self.content_type):
+                self._add_article(link, index)
+        except Exception as e:
+            self.articles[index] = ''
+            self.failures[link] = "{}: {}".format(type(e).__name__, e)
+            self.metrics.inc('errors', 1, self.content_type)
+            if self.journal is not None:
+                self.journal.write_failure(link, self.failures[link])
+        else:
+            if self.journal is not None:
+                self.journal.write_article(link, self.articles[index])
+
+    def _get_articles_multi_threaded(self, indices=None):
         '''
         gets all articles using multi-threading
+        indices is the list of the index of the links to get. All links if None.
         '''
         if self.verbose:
             print("Getting articles - Multi-threaded...")
 
-        self.articles = ['']*len(self.links)
+        if indices is None:
+            self.articles = ['']*len(self.links)
+            indices = range(len(self.links))
         jobs = []
         # initiate and start threads:
-        index = 0
-        while index < len(self.links):
-            if len(jobs) < self.MAX_THREADS:
-                t = threading.Thread(target=self._add_article, args=(self.links[index],index,))
-                jobs.append(t)
-                t.start()
-                index += 1
-            else:    # wait for threads to complete and join them back into the main thread
+        for n, index in enumerate(indices):
+            while len(jobs) >= self.MAX_THREADS:
+                # wait for threads to complete and join them back into the main thread
                 t = jobs.pop(0)
                 t.join()
+            t = threading.Thread(target=self._add_article_journaled, args=(self.links[index],index,))
+            jobs.append(t)
+            t.start()
+            self.metrics.set_gauge('queue_depth', len(indices) - n - 1, self.content_type)
+            self.metrics.set_gauge('active_threads', len(jobs), self.content_type)
         for t in jobs:
             t.join()
+        self.metrics.set_gauge('active_threads', 0, self.content_type)
 
         #for row in range(len(self.articles)):
         #    self.articles[row] = self.articles[row].strip()
 
-    def get_contents(self, from_year=1990):
+    def _get_articles_multi_process(self, indices=None):
+        '''
+        gets all articles using forked processes, used when the articles are extracted from the archive
+         without the network so that parsing is not limited by the GIL.
+        indices is the list of the index of the links to get. All links if None.
+        '''
+        global _worker_fomc
+        if self.verbose:
+            print("Getting articles - Multi-process from the archive...")
+
+        if indices is None:
+            self.articles = ['']*len(self.links)
+            indices = range(len(self.links))
+        indices = list(indices)
+        # Small chunks to balance between short statements and long scripts
+        chunk_size = max(1, len(indices) // (self.processes * 8))
+        chunks = [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+
+        _worker_fomc = self
+        try:
+            with get_context('fork').Pool(self.processes) as pool:
+                for results in pool.imap_unordered(_extract_articles, chunks):
+                    for index, article, error in results:
+                        link = self.links[index]
+                        self.articles[index] = article
+                        if error is not None:
+                            self.failures[link] = error
+                            self.metrics.inc('errors', 1, self.content_type)
+                            if self.journal is not None:
+                                self.journal.write_failure(link, error)
+                        elif self.journal is not None:
+                            self.journal.write_article(link, article)
+        finally:
+            _worker_fomc = None
+
+    def _report_failures(self):
+        '''
+        Print the links failed to get in this crawl
+        '''
+        print("")
+        if len(self.failures) == 0:
+            if self.verbose: print("All {} articles are retrieved for {}".format(len(self.links), self.content_type))
+            return
+        print("Failed to get {} of {} articles for {}. Run again to retry only them.".format(len(self.failures), len(self.links), self.content_type))
+        for link, error in self.failures.items():
+            print("  {} - {}".format(link, error))
+
+    def get_contents(self, from_year=1990, resume=True):
         '''
         Returns a Pandas DataFrame with the date as the index for a date range of from_year to the most current.
         Save the same to internal df as well.
+        If resume is True, the crawl is journaled in base_dir/journal/ and a crawl interrupted or having failures
+         resumes from the journal, getting only the missing, failed and newly published articles. The journal
+         is removed when all articles are retrieved.
         '''
-        self._get_links(from_year)
-        self._get_articles_multi_threaded()
-        dict = {
-            'date': self.dates,
-            'contents': self.articles,
-            'speaker': self.speakers, 
-            'title': self.titles
-        }
-        self.df = pd.DataFrame(dict).sort_values(by=['date'])
+        self.failures = {}
+        self.journal = None
+        resumed = False
+        if resume:
+            self.journal = FomcCrawlJournal(self.base_dir + 'journal/' + self.content_type + '.jsonl')
+            if self.journal.load() and self.journal.from_year == from_year:
+                resumed = True
+            else:
+                self.journal.remove()
+                self.journal = FomcCrawlJournal(self.journal.filepath)
+
+        # Links are discovered again even when resuming, as documents may have been published since the journal
+        with self.metrics.timer('links', self.content_type):
+            self._get_links(from_year)
+        if self.journal is not None:
+            self.journal.write_links(from_year, self.records)
+        indices = None
+        if resumed:
+            self.articles = [self.journal.articles.get(link, '') for link in self.links]
+            indices = [i for i, link in enumerate(self.links) if link not in self.journal.articles]
+            new_links = len(set(self.links) - set(self.journal.records.links))
+            print("Resuming from the journal of {}: {} of {} articles to get for {}, {} of them newly found".format(
+                self.journal.crawled, len(indices), len(self.links), self.content_type, new_links))
+        if self.archive is not None and self.archive.mode == 'replay' and self.processes > 1:
+            self._get_articles_multi_process(indices)
+        else:
+            self._get_articles_multi_threaded(indices)
+        self._report_failures()
+
+        if self.journal is not None:
+            if len(self.failures) == 0:
+                self.journal.remove()
+            else:
+                self.journal.close()
+
+        self.df = self.records.to_frame(self.articles).sort_values(by=['date'])
         self.df.reset_index(drop=True, inplace=True)
         return self.df
 
+    def tag_duplicates(self, threshold=0.8, collapse=False):
+        '''
+        Tag near-duplicate documents in the internal df, such as reposted speeches or the same testimony
+         given to both House and Senate. 'duplicate_of' is the index of the earliest same document, or -1.
+        If collapse is True, duplicates are removed from the df.
+        '''
+        from .FomcDedup import FomcDedup
+        dedup = FomcDedup(threshold=threshold)
+        self.df['duplicate_of'] = dedup.find_duplicates(self.df['contents'])
+        if self.verbose: print("{} near-duplicate documents found for {}".format((self.df['duplicate_of'] >= 0).sum(), self.content_type))
+        if collapse:
+            self.df = self.df.loc[self.df['duplicate_of'] < 0].drop(columns=['duplicate_of'])
+            self.df.reset_index(drop=True, inplace=True)
+        return self.df
+
     def pickle_dump_df(self, filename="output.pickle"):
         '''
         Dump an internal DataFrame df to a pickle file
@@ -139,8 +309,20 @@ class FomcBase(metaclass=ABCMeta):
         print("")
         if self.verbose: print("Writing to ", filepath)
         os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, "wb") as output_file:
-            pickle.dump(self.df, output_file)
+        with self.metrics.timer('write', self.content_type):
+            with open(filepath, "wb") as output_file:
+                pickle.dump(self.df, output_file)
+
+    def save_store(self, store=None, target="contents"):
+        '''
+        Save an internal DataFrame df to the compressed corpus store, base_dir + 'store/' by default
+        '''
+        if store is None:
+            from .FomcCorpusStore import FomcCorpusStore
+            store = FomcCorpusStore(self.base_dir + 'store/', verbose=self.verbose)
+        with self.metrics.timer('write', self.content_type):
+            store.write(self.content_type, self.df, target=target)
+        return store
 
     def save_texts(self, prefix="FOMC_", target="contents"):
         '''
@@ -159,5 +341,6 @@ class FomcBase(metaclass=ABCMeta):
             tmp_dates.append(cur_date)
             if self.verbose: print("Writing to ", filepath)
             os.makedirs(os.path.dirname(filepath), exist_ok=True)
-            with open(filepath, "w") as output_file:
-                output_file.write(row[target])
\ No newline at end of file
+            with self.metrics.timer('write', self.content_type):
+                with open(filepath, "w") as output_file:
+                    output_file.write(row[target])
\ No newline at end of file
@@ -0,0 +1,219 @@
+import threading
+import pickle
+import mmap
+import json
+import zlib
+import os
+
+import numpy as np
+
+class FomcCorpusStore:
+    '''
+    Compressed storage of the FomcBase outputs. Each content type has a compression dictionary trained on its
+     own documents, as FOMC documents share a lot of boilerplate, and each document is compressed as an
+     independent frame with the dictionary, so that one document is read and decompressed without the others.
+    Files per content type in store_dir:
+        <content_type>.zdict - the dictionary
+        <content_type>.frames - the compressed documents, concatenated
+        <content_type>.index.npy - offsets of the frames, i.e. document i is in [offsets[i], offsets[i+1])
+        <content_type>.meta.pickle - the DataFrame without the contents column
+        <content_type>.json - codec and sizes
+    zstandard is used if installed. Otherwise zlib with a preset dictionary, which needs no extra package.
+
+    Example Usage:
+        store = FomcCorpusStore('../data/FOMC/store/')
+        store.write('statement', fomc.df)
+        text = store.get('statement', 10)
+        df = store.read_frame('statement')
+    '''
+    def __init__(self, store_dir='../data/FOMC/store/', codec=None, level=10, dict_size=112 * 1024, verbose=True):
+        self.store_dir = store_dir
+        if codec is None:
+            try:
+                import zstandard
+                codec = 'zstd'
+            except ImportError:
+                codec = 'zlib'
+        if codec not in ('zstd', 'zlib'):
+            raise ValueError("codec should be either zstd or zlib: " + str(codec))
+        self.codec = codec
+        self.level = level
+        self.dict_size = dict_size
+        self.verbose = verbose
+        self.lock = threading.Lock()
+        # A decompressor is not safe to use from multiple threads at the same time
+        self.read_lock = threading.Lock()
+        # content_type -> (info, offsets, mmap of frames, decompress function)
+        self._readers = {}
+
+    def _path(self, content_type, ext):
+        return os.path.join(self.store_dir, content_type + ext)
+
+    def _train_dictionary(self, codec, samples):
+        if not samples:
+            return b''
+        if codec == 'zstd':
+            import zstandard
+            try:
+                return zstandard.train_dictionary(self.dict_size, samples).as_bytes()
+            except zstandard.ZstdError:
+                # Too few or too small documents to train. Compress without a dictionary.
+                return b''
+        # zlib looks back 32KB at most, and the strings at the end of the dictionary are the cheapest to refer.
+        # Use the documents themselves, the latest ones last.
+        dictionary = b''
+        for sample in samples:
+            dictionary = (dictionary + sample)[-32768:]
+        return dictionary
+
+    def _compressor(self, codec, dictionary):
+        if codec == 'zstd':
+            import zstandard
+            params = {'level': self.level, 'write_checksum': True}
+            if dictionary:
+                params['dict_data'] = zstandard.ZstdCompressionDict(dictionary)
+            return zstandard.ZstdCompressor(**params).compress
+
+        def compress(data):
+            obj = zlib.compressobj(level=min(self.level, 9), zdict=dictionary) if dictionary else zlib.compressobj(level=min(self.level, 9))
+            return obj.compress(data) + obj.flush()
+        return compress
+
+    def _decompressor(self, codec, dictionary):
+        if codec == 'zstd':
+            import zstandard
+            if dictionary:
+                return zstandard.ZstdDecompressor(dict_data=zstandard.ZstdCompressionDict(dictionary)).decompress
+            return zstandard.ZstdDecompressor().decompress
+
+        def decompress(data):
+            obj = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+            return obj.decompress(data) + obj.flush()
+        return decompress
+
+    def _replace(self, path, data):
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+    def write(self, content_type, df, target='contents'):
+        '''
+        Store the DataFrame of a content type, replacing the stored one
+        '''
+        os.makedirs(self.store_dir, exist_ok=True)
+        docs = [(text if isinstance(text, str) else '').encode('utf-8') for text in df[target]]
+        # Missing contents are stored as empty frames, and their positions kept to restore them
+        nulls = np.flatnonzero(df[target].isnull().values).tolist()
+        # Train on the documents in the order of the data, so that the latest boilerplate is in the dictionary
+        dictionary = self._train_dictionary(self.codec, [doc for doc in docs if doc])
+        compress = self._compressor(self.codec, dictionary)
+
+        offsets = np.zeros(len(docs) + 1, dtype=np.int64)
+        with open(self._path(content_type, '.frames.tmp'), 'wb') as f:
+            for i, doc in enumerate(docs):
+                frame = compress(doc)
+                f.write(frame)
+                offsets[i + 1] = offsets[i] + len(frame)
+
+        info = {'codec': self.codec, 'level': self.level, 'documents': len(docs), 'column': target, 'columns': list(df.columns), 'nulls': nulls,
+                'raw_bytes': int(sum(len(doc) for doc in docs)), 'compressed_bytes': int(offsets[-1]), 'dict_bytes': len(dictionary)}
+        with self.lock:
+            self._close_reader(content_type)
+            self._replace(self._path(content_type, '.zdict'), dictionary)
+            os.replace(self._path(content_type, '.frames.tmp'), self._path(content_type, '.frames'))
+            self._replace(self._path(content_type, '.meta.pickle'), pickle.dumps(df.drop(columns=[target])))
+            with open(self._path(content_type, '.index.tmp.npy'), 'wb') as f:
+                np.save(f, offsets)
+            os.replace(self._path(content_type, '.index.tmp.npy'), self._path(content_type, '.index.npy'))
+            # The info is written last as the marker of a complete content type
+            self._replace(self._path(content_type, '.json'), json.dumps(info).encode('utf-8'))
+        if self.verbose:
+            print("Stored {} {} documents: {:,} bytes to {:,} bytes with a {:,} bytes dictionary".format(
+                info['documents'], content_type, info['raw_bytes'], info['compressed_bytes'] + info['dict_bytes'], info['dict_bytes']))
+        return info
+
+    def _close_reader(self, content_type):
+        reader = self._readers.pop(content_type, None)
+        if reader is not None and reader[2] is not None:
+            reader[2].close()
+
+    def _reader(self, content_type):
+        reader = self._readers.get(content_type)
+        if reader is not None:
+            return reader
+        with self.lock:
+            if content_type not in self._readers:
+                with open(self._path(content_type, '.json'), 'r') as f:
+                    info = json.load(f)
+                info['null_set'] = frozenset(info.get('nulls', []))
+                with open(self._path(content_type, '.zdict'), 'rb') as f:
+                    dictionary = f.read()
+                offsets = np.load(self._path(content_type, '.index.npy'), mmap_mode='r')
+                frames = None
+                if offsets[-1] > 0:
+                    with open(self._path(content_type, '.frames'), 'rb') as f:
+                        frames = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._readers[content_type] = (info, offsets, frames, self._decompressor(info['codec'], dictionary))
+            return self._readers[content_type]
+
+    def __contains__(self, content_type):
+        return os.path.exists(self._path(content_type, '.json'))
+
+    def __len__(self):
+        return len(self.content_types())
+
+    def content_types(self):
+        if not os.path.isdir(self.store_dir):
+            return []
+        return sorted(name[:-len('.json')] for name in os.listdir(self.store_dir) if name.endswith('.json'))
+
+    def count(self, content_type):
+        return self._reader(content_type)[0]['documents']
+
+    def get(self, content_type, index):
+        '''
+        Returns the text of the index-th document of the content type, or None if it was missing.
+        A negative index counts from the end as a list.
+        '''
+        info, offsets, frames, decompress = self._reader(content_type)
+        n = len(offsets) - 1
+        if not -n <= index < n:
+            raise IndexError("Document {} out of range of {} {} documents".format(index, n, content_type))
+        index = index % n
+        if index in info['null_set']:
+            return None
+        start, end = int(offsets[index]), int(offsets[index + 1])
+        if end == start:
+            return ''
+        with self.read_lock:
+            data = decompress(frames[start:end])
+        return data.decode('utf-8')
+
+    def texts(self, content_type, indices=None):
+        '''
+        Returns a list of texts of the indices, or all documents of the content type. Missing ones are None.
+        '''
+        if indices is None:
+            indices = range(self.count(content_type))
+        return [self.get(content_type, i) for i in indices]
+
+    def read_meta(self, content_type):
+        '''
+        Returns the DataFrame without the texts
+        '''
+        with open(self._path(content_type, '.meta.pickle'), 'rb') as f:
+            return pickle.load(f)
+
+    def read_frame(self, content_type):
+        '''
+        Returns the DataFrame as stored, with the texts
+        '''
+        df = self.read_meta(content_type)
+        info = self._reader(content_type)[0]
+        df[info['column']] = self.texts(content_type)
+        return df[info['columns']]
+
+    def close(self):
+        with self.lock:
+            for content_type in list(self._readers):
+                self._close_reader(content_type)
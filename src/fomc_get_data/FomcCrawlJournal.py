@@ -0,0 +1,94 @@
+from datetime import datetime
+import threading
+import json
+import os
+
+import numpy as np
+
+from .FomcLinkRecords import FomcLinkRecords
+
+class FomcCrawlJournal:
+    '''
+    An append-only journal of a crawl, so that get_contents() can resume after a crash.
+    Each line is a JSON record of discovered links, a completed article or a failure.
+    Records are flushed and synced to the disk as soon as they are written.
+    A resumed crawl discovers the links again and appends them, so the articles already retrieved are kept
+     by link while the latest links record decides what to get.
+    '''
+    def __init__(self, filepath):
+        self.filepath = filepath
+        self.lock = threading.Lock()
+        self.file = None
+
+        # State restored from the journal
+        self.from_year = None
+        self.crawled = None
+        self.records = None
+        self.articles = {}
+        self.failures = {}
+
+    def load(self):
+        '''
+        Restore the state from an existing journal. Returns True if links were found.
+        A partially written last line is ignored.
+        '''
+        if not os.path.exists(self.filepath):
+            return False
+        with open(self.filepath, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                event = record.get('event')
+                if event == 'links':
+                    self.from_year = record['from_year']
+                    self.crawled = record.get('crawled')
+                    self.records = FomcLinkRecords()
+                    self.records.extend(record['links'], record['dates'], record['speakers'], record['titles'])
+                elif event == 'article':
+                    self.articles[record['link']] = record['contents']
+                    self.failures.pop(record['link'], None)
+                elif event == 'failure':
+                    self.failures[record['link']] = record['error']
+        return self.records is not None
+
+    def _write(self, record):
+        with self.lock:
+            if self.file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.filepath)), exist_ok=True)
+                self.file = open(self.filepath, 'a')
+            self.file.write(json.dumps(record) + '\n')
+            self.file.flush()
+            os.fsync(self.file.fileno())
+
+    def write_links(self, from_year, records):
+        self._write({
+            'event': 'links',
+            'from_year': from_year,
+            'crawled': datetime.now().strftime('%Y-%m-%dT%H:%M:%S'),
+            'links': records.links,
+            'dates': np.datetime_as_string(records.dates, unit='D').tolist(),
+            'speakers': records.speakers().tolist(),
+            'titles': records.titles().tolist()
+        })
+
+    def write_article(self, link, contents):
+        self._write({'event': 'article', 'link': link, 'contents': contents})
+
+    def write_failure(self, link, error):
+        self._write({'event': 'failure', 'link': link, 'error': error})
+
+    def close(self):
+        with self.lock:
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+
+    def remove(self):
+        '''
+        Remove the journal after a crawl completed without failures
+        '''
+        self.close()
+        if os.path.exists(self.filepath):
+            os.remove(self.filepath)
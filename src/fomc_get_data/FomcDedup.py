@@ -0,0 +1,102 @@
+import zlib
+import re
+
+import numpy as np
+
+class FomcDedup:
+    '''
+    Near-duplicate detection of documents by MinHash signatures and LSH banding.
+    Each document is shingled by words, hashed into a MinHash signature of num_perm values, and the signature
+     is split into bands. Only documents sharing a band bucket are compared, so it does not compare all pairs.
+    Candidates are kept when their estimated Jaccard similarity is threshold or above.
+
+    Example Usage:
+        dedup = FomcDedup()
+        duplicate_of = dedup.find_duplicates(df['contents'])
+    '''
+    # Mersenne prime used for the universal hashing
+    _prime = np.uint64((1 << 61) - 1)
+    _max_hash = np.uint64((1 << 32) - 1)
+
+    def __init__(self, num_perm=128, bands=16, shingle_size=5, threshold=0.8, seed=42):
+        if num_perm % bands != 0:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle_size = shingle_size
+        self.threshold = threshold
+
+        gen = np.random.RandomState(seed)
+        self._a = gen.randint(1, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % self._prime
+        self._b = gen.randint(0, np.iinfo(np.int64).max, size=num_perm, dtype=np.int64).astype(np.uint64) % self._prime
+
+    def _shingles(self, text):
+        '''
+        Returns an array of 32 bit hashes of word shingles. crc32 is used as python hash() differs per process.
+        '''
+        words = re.findall(r'\w+', text.replace("[SECTION]", "").lower())
+        if len(words) < self.shingle_size:
+            shingles = {" ".join(words)}
+        else:
+            shingles = {" ".join(words[i:i + self.shingle_size]) for i in range(len(words) - self.shingle_size + 1)}
+        return np.array([zlib.crc32(shingle.encode('utf-8')) for shingle in shingles], dtype=np.uint64)
+
+    def signature(self, text):
+        '''
+        Returns a MinHash signature of the given text
+        '''
+        hashes = self._shingles(text)
+        # Overflow of uint64 is intended here, the same as the common MinHash implementation
+        with np.errstate(over='ignore'):
+            values = (np.outer(hashes, self._a) + self._b) % self._prime
+        return np.min(values & self._max_hash, axis=0)
+
+    def signatures(self, texts):
+        return np.array([self.signature(text) for text in texts], dtype=np.uint64).reshape(-1, self.num_perm)
+
+    def find_candidates(self, signatures):
+        '''
+        Returns a set of candidate pairs (i, j), i < j, which share at least one LSH band bucket
+        '''
+        candidates = set()
+        for band in range(self.bands):
+            buckets = {}
+            band_values = signatures[:, band * self.rows:(band + 1) * self.rows]
+            for i, value in enumerate(band_values):
+                buckets.setdefault(value.tobytes(), []).append(i)
+            for members in buckets.values():
+                for j in range(1, len(members)):
+                    for i in members[:j]:
+                        candidates.add((i, members[j]))
+        return candidates
+
+    def find_duplicates(self, texts):
+        '''
+        Returns a list of the index of the first document of the same duplicate group for each document,
+         or -1 if the document is not a duplicate of any preceding document.
+        Documents are expected in chronological order, so the earliest one is kept as the original.
+        '''
+        texts = list(texts)
+        signatures = self.signatures(texts)
+        parents = list(range(len(texts)))
+
+        def find(i):
+            while parents[i] != i:
+                parents[i] = parents[parents[i]]
+                i = parents[i]
+            return i
+
+        for i, j in self.find_candidates(signatures):
+            similarity = np.mean(signatures[i] == signatures[j])
+            # Empty texts have the same signature, but they are not duplicates
+            if similarity >= self.threshold and texts[i].strip() and texts[j].strip():
+                root_i, root_j = find(i), find(j)
+                if root_i != root_j:
+                    parents[max(root_i, root_j)] = min(root_i, root_j)
+
+        duplicate_of = []
+        for i in range(len(texts)):
+            root = find(i)
+            duplicate_of.append(root if root != i else -1)
+        return duplicate_of
@@ -0,0 +1,121 @@
+from datetime import datetime, timedelta
+from array import array
+
+import numpy as np
+
+class FomcLink:
+    '''
+    One link record of FomcLinkRecords
+    '''
+    __slots__ = ('link', 'date', 'speaker', 'title')
+
+    def __init__(self, link, date, speaker, title):
+        self.link = link
+        self.date = date
+        self.speaker = speaker
+        self.title = title
+
+    def __repr__(self):
+        return "FomcLink({!r}, {}, {!r}, {!r})".format(self.link, self.date.strftime('%Y-%m-%d'), self.speaker, self.title)
+
+class FomcLinkRecords:
+    '''
+    Columnar container of the links found by FomcBase._get_links, so that the link, date, speaker and title
+     of a document are appended together and never get out of sync.
+    Dates are kept as days in a typed array, and speakers and titles are interned as categorical codes,
+     as only a few distinct values repeat over thousands of links.
+
+    Example Usage:
+        records = FomcLinkRecords()
+        records.append('/newsevents/pressreleases/monetary20200129a.htm', datetime(2020,1,29), 'Jerome Powell', 'FOMC Statement')
+        for record in records:
+            print(record.link, record.date)
+        df = records.to_frame()
+    '''
+    epoch = datetime(1970, 1, 1)
+
+    def __init__(self):
+        self.links = []
+        self._days = array('q')
+        self._speaker_codes = array('i')
+        self._title_codes = array('i')
+        self._speaker_categories = []
+        self._title_categories = []
+        self._speaker_ids = {}
+        self._title_ids = {}
+
+    def _intern(self, value, ids, categories):
+        # None is kept as -1, which is NaN in pandas Categorical
+        if value is None:
+            return -1
+        code = ids.get(value)
+        if code is None:
+            code = len(categories)
+            ids[value] = code
+            categories.append(value)
+        return code
+
+    def append(self, link, date, speaker, title):
+        '''
+        Add one link. date is a datetime, date, numpy datetime64 or 'yyyy-mm-dd' string.
+        '''
+        self.links.append(link)
+        self._days.append(int(np.datetime64(date, 'D').astype(np.int64)))
+        self._speaker_codes.append(self._intern(speaker, self._speaker_ids, self._speaker_categories))
+        self._title_codes.append(self._intern(title, self._title_ids, self._title_categories))
+
+    def extend(self, links, dates, speakers, titles):
+        for link, date, speaker, title in zip(links, dates, speakers, titles):
+            self.append(link, date, speaker, title)
+
+    def __len__(self):
+        return len(self.links)
+
+    def _value(self, categories, code):
+        return None if code < 0 else categories[code]
+
+    def __getitem__(self, index):
+        return FomcLink(
+            self.links[index],
+            self.epoch + timedelta(days=self._days[index]),
+            self._value(self._speaker_categories, self._speaker_codes[index]),
+            self._value(self._title_categories, self._title_codes[index]))
+
+    def __iter__(self):
+        for index in range(len(self.links)):
+            yield self[index]
+
+    @property
+    def dates(self):
+        '''
+        Dates as numpy datetime64[D] array
+        '''
+        return np.array(self._days, dtype=np.int64).view('datetime64[D]')
+
+    def _column(self, codes, categories, categorical):
+        codes = np.array(codes, dtype=np.int32)
+        if categorical:
+            import pandas as pd
+            return pd.Categorical.from_codes(codes, categories=categories)
+        # The last element is for -1, i.e. None
+        return np.array(categories + [None], dtype=object)[codes]
+
+    def speakers(self, categorical=False):
+        return self._column(self._speaker_codes, self._speaker_categories, categorical)
+
+    def titles(self, categorical=False):
+        return self._column(self._title_codes, self._title_categories, categorical)
+
+    def to_frame(self, contents=None, categorical=False):
+        '''
+        Returns a DataFrame of date, contents (if given), speaker and title in the order of the links.
+        If categorical is True, speaker and title are pandas Categorical. Otherwise strings as before.
+        '''
+        data = {'date': self.dates.astype('datetime64[ns]')}
+        if contents is not None:
+            data['contents'] = contents
+        data['speaker'] = self.speakers(categorical)
+        data['title'] = self.titles(categorical)
+        # pandas is imported only here as it is heavy and not needed to find links
+        import pandas as pd
+        return pd.DataFrame(data)
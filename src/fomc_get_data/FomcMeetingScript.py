@@ -5,21 +5,16 @@ import os
 import pickle
 import re
 
-import requests
-from bs4 import BeautifulSoup
-
-import numpy as np
-import pandas as pd
-
 # Tika depends on Java version, so use textract instead as the pdf is anyway a simple text only
 # # User TIKA for pdf parsing
 # os.environ['TIKA_SERVER_JAR'] = 'https://repo1.maven.org/maven2/org/apache/tika/tika-server/1.19/tika-server-1.19.jar'
 # import tika
 # from tika import parser
-import textract
+# textract is imported in _add_article as it is heavy and needed only to extract pdf
 
 # Import parent class
 from .FomcBase import FomcBase
+from .FomcLinkRecords import FomcLinkRecords
 
 class FomcMeetingScript(FomcBase):
     '''
@@ -38,13 +33,10 @@ class FomcMeetingScript(FomcBase):
         Override private function that sets all the links for the contents to download on FOMC website
          from from_year (=min(2015, from_year)) to the current most recent year
         '''
-        self.links = []
-        self.titles = []
-        self.speakers = []
-        self.dates = []
+        self.records = FomcLinkRecords()
 
-        r = requests.get(self.calendar_url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._get(self.calendar_url)
+        soup = self._parse_html(r.text)
         
         # Meeting Script can be found only in the archive as it is published after five years
         if from_year > 2014:
@@ -53,14 +45,13 @@ class FomcMeetingScript(FomcBase):
             for year in range(from_year, 2015):
                 yearly_contents = []
                 fomc_yearly_url = self.base_url + '/monetarypolicy/fomchistorical' + str(year) + '.htm'
-                r_year = requests.get(fomc_yearly_url)
-                soup_yearly = BeautifulSoup(r_year.text, 'html.parser')
+                r_year = self._get(fomc_yearly_url)
+                soup_yearly = self._parse_html(r_year.text)
                 meeting_scripts = soup_yearly.find_all('a', href=re.compile('^/monetarypolicy/files/FOMC\d{8}meeting.pdf'))
                 for meeting_script in meeting_scripts:
-                    self.links.append(meeting_script.attrs['href'])
-                    self.speakers.append(self._speaker_from_date(self._date_from_link(meeting_script.attrs['href'])))
-                    self.titles.append('FOMC Meeting Transcript')
-                    self.dates.append(datetime.strptime(self._date_from_link(meeting_script.attrs['href']), '%Y-%m-%d'))
+                    link = meeting_script.attrs['href']
+                    link_date = self._date_from_link(link)
+                    self.records.append(link, datetime.strptime(link_date, '%Y-%m-%d'), self._speaker_from_date(link_date), 'FOMC Meeting Transcript')
                 if self.verbose: print("YEAR: {} - {} meeting scripts found.".format(year, len(meeting_scripts)))
             print("There are total ", len(self.links), ' links for ', self.content_type)
 
@@ -78,14 +69,17 @@ class FomcMeetingScript(FomcBase):
         pdf_filepath = self.base_dir + 'script_pdf/FOMC_MeetingScript_' + self._date_from_link(link) + '.pdf'
 
         # Scripts are provided only in pdf. Save the pdf and pass the content
-        res = requests.get(link_url)
-        with open(pdf_filepath, 'wb') as f:
-            f.write(res.content)
+        res = self._get(link_url)
+        with self.metrics.timer('write', self.content_type):
+            with open(pdf_filepath, 'wb') as f:
+                f.write(res.content)
 
         # Extract text from the pdf
         # pdf_file_parsed = parser.from_file(pdf_filepath)
         # paragraphs = re.sub('(\n)(\n)+', '\n', pdf_file_parsed['content'].strip())
-        pdf_file_parsed = textract.process(pdf_filepath).decode('utf-8')
+        with self.metrics.timer('pdf', self.content_type):
+            import textract
+            pdf_file_parsed = textract.process(pdf_filepath).decode('utf-8')
         paragraphs = re.sub('(\n)(\n)+', '\n', pdf_file_parsed.strip())
         paragraphs = paragraphs.split('\n')
 
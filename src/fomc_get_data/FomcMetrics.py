@@ -0,0 +1,201 @@
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import threading
+import json
+import time
+import os
+
+class FomcMetrics:
+    '''
+    Per-stage timing and counters of the download pipeline.
+    Stages are links (link discovery), article (one article in total), fetch (network), parse (BeautifulSoup),
+     pdf (textract) and write (disk).
+    mode is one of:
+        off   - nothing is recorded
+        basic - count and total seconds per stage and counters only (low overhead, default)
+        full  - latency histograms and a JSON line per observation to log_path in addition
+    The default mode can be set by FOMC_METRICS environment variable.
+
+    Example Usage:
+        fomc = FomcSpeech()
+        fomc.metrics = FomcMetrics(mode='full', log_path='../data/FOMC/metrics/speech.jsonl')
+        fomc.get_contents()
+        print(fomc.metrics.to_prometheus())
+    '''
+    # Upper bounds in seconds of the latency histogram buckets
+    buckets = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, float('inf'))
+
+    def __init__(self, mode=None, log_path=None):
+        self.mode = mode if mode is not None else os.environ.get('FOMC_METRICS', 'basic')
+        if self.mode not in ('off', 'basic', 'full'):
+            raise ValueError("mode should be one of off, basic and full: " + str(self.mode))
+        self.log_path = log_path
+        self.lock = threading.Lock()
+        self.log_file = None
+
+        # (content_type, stage) -> [count, sum of seconds, bucket counts]
+        self.stages = {}
+        # (content_type, stage) -> list of seconds, kept only in full mode for percentiles
+        self.samples = {}
+        # (content_type, name) -> value. e.g. bytes, requests, errors, retries, cache_hits
+        self.counters = {}
+        # (content_type, name) -> value. e.g. queue_depth, active_threads
+        self.gauges = {}
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def _log(self, record):
+        if self.log_path is None:
+            return
+        if self.log_file is None:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_path)), exist_ok=True)
+            self.log_file = open(self.log_path, 'a')
+        record['ts'] = time.time()
+        self.log_file.write(json.dumps(record) + '\n')
+        self.log_file.flush()
+
+    def observe(self, stage, seconds, content_type=''):
+        '''
+        Record the latency of one stage
+        '''
+        if self.mode == 'off':
+            return
+        key = (content_type, stage)
+        with self.lock:
+            entry = self.stages.get(key)
+            if entry is None:
+                entry = [0, 0.0, [0] * len(self.buckets)]
+                self.stages[key] = entry
+            entry[0] += 1
+            entry[1] += seconds
+            if self.mode == 'full':
+                self.samples.setdefault(key, []).append(seconds)
+                for i, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        entry[2][i] += 1
+                        break
+                self._log({'content_type': content_type, 'stage': stage, 'seconds': seconds})
+
+    @contextmanager
+    def timer(self, stage, content_type=''):
+        '''
+        Context manager to record the latency of the block
+        '''
+        if self.mode == 'off':
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start, content_type)
+
+    def inc(self, name, value=1, content_type=''):
+        '''
+        Increment a counter such as bytes, requests, errors, retries or cache_hits
+        '''
+        if self.mode == 'off':
+            return
+        key = (content_type, name)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def set_gauge(self, name, value, content_type=''):
+        '''
+        Set a gauge such as queue_depth or active_threads
+        '''
+        if self.mode == 'off':
+            return
+        with self.lock:
+            self.gauges[(content_type, name)] = value
+
+    def percentile(self, stage, q, content_type=''):
+        '''
+        Returns the q-th percentile (0-100) of the latency of the stage. Available only in full mode.
+        '''
+        with self.lock:
+            samples = sorted(self.samples.get((content_type, stage), []))
+        if not samples:
+            return None
+        # Nearest rank method
+        rank = max(1, int(-(-q * len(samples) // 100)))
+        return samples[min(rank, len(samples)) - 1]
+
+    def to_dict(self):
+        '''
+        Returns all metrics as a dict which can be dumped to JSON
+        '''
+        with self.lock:
+            stages = []
+            for (content_type, stage), (count, total, bucket_counts) in sorted(self.stages.items()):
+                record = {'content_type': content_type, 'stage': stage, 'count': count, 'seconds': total,
+                          'mean_seconds': total / count if count else 0.0}
+                if self.mode == 'full':
+                    record['buckets'] = {str(bound): n for bound, n in zip(self.buckets, bucket_counts)}
+                stages.append(record)
+            counters = [{'content_type': k[0], 'name': k[1], 'value': v} for k, v in sorted(self.counters.items())]
+            gauges = [{'content_type': k[0], 'name': k[1], 'value': v} for k, v in sorted(self.gauges.items())]
+        return {'mode': self.mode, 'stages': stages, 'counters': counters, 'gauges': gauges}
+
+    def write_json(self, filepath):
+        '''
+        Write all metrics to a JSON file
+        '''
+        os.makedirs(os.path.dirname(os.path.abspath(filepath)), exist_ok=True)
+        with open(filepath, 'w') as output_file:
+            json.dump(self.to_dict(), output_file, indent=2)
+
+    def to_prometheus(self):
+        '''
+        Returns all metrics in Prometheus text exposition format
+        '''
+        lines = []
+        with self.lock:
+            lines.append('# TYPE fomc_stage_seconds {}'.format('histogram' if self.mode == 'full' else 'summary'))
+            for (content_type, stage), (count, total, bucket_counts) in sorted(self.stages.items()):
+                labels = 'content_type="{}",stage="{}"'.format(content_type, stage)
+                if self.mode == 'full':
+                    cumulative = 0
+                    for bound, n in zip(self.buckets, bucket_counts):
+                        cumulative += n
+                        le = '+Inf' if bound == float('inf') else str(bound)
+                        lines.append('fomc_stage_seconds_bucket{{{},le="{}"}} {}'.format(labels, le, cumulative))
+                lines.append('fomc_stage_seconds_sum{{{}}} {}'.format(labels, total))
+                lines.append('fomc_stage_seconds_count{{{}}} {}'.format(labels, count))
+            types = set()
+            for (content_type, name), value in sorted(self.counters.items(), key=lambda x: (x[0][1], x[0][0])):
+                if name not in types:
+                    lines.append('# TYPE fomc_{}_total counter'.format(name))
+                    types.add(name)
+                lines.append('fomc_{}_total{{content_type="{}"}} {}'.format(name, content_type, value))
+            for (content_type, name), value in sorted(self.gauges.items(), key=lambda x: (x[0][1], x[0][0])):
+                if name not in types:
+                    lines.append('# TYPE fomc_{} gauge'.format(name))
+                    types.add(name)
+                lines.append('fomc_{}{{content_type="{}"}} {}'.format(name, content_type, value))
+        return '\n'.join(lines) + '\n'
+
+    def start_http_server(self, port=9108, host='127.0.0.1'):
+        '''
+        Serve to_prometheus() on /metrics from a daemon thread
+        '''
+        metrics = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = metrics.to_prometheus().encode('utf-8')
+                self.send_response(200 if self.path == '/metrics' else 404)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        server = ThreadingHTTPServer((host, port), MetricsHandler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
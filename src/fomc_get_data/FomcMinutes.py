@@ -5,14 +5,9 @@ import os
 import pickle
 import re
 
-import requests
-from bs4 import BeautifulSoup
-
-import numpy as np
-import pandas as pd
-
 # Import parent class
 from .FomcBase import FomcBase
+from .FomcLinkRecords import FomcLinkRecords
 
 class FomcMinutes(FomcBase):
     '''
@@ -21,6 +16,18 @@ class FomcMinutes(FomcBase):
         fomc = FomcMinutes()
         df = fomc.get_contents()
     '''
+    # Sometimes minutes carries the first day of the meeting before 2000, so update them to the 2nd day
+    date_corrections = {
+        datetime(1996,1,30): datetime(1996,1,31),
+        datetime(1996,7,2): datetime(1996,7,3),
+        datetime(1997,2,4): datetime(1997,2,5),
+        datetime(1997,7,1): datetime(1997,7,2),
+        datetime(1998,2,3): datetime(1998,2,4),
+        datetime(1998,6,30): datetime(1998,7,1),
+        datetime(1999,2,2): datetime(1999,2,3),
+        datetime(1999,6,29): datetime(1999,6,30)
+    }
+
     def __init__(self, verbose = True, max_threads = 10, base_dir = '../data/FOMC/'):
         super().__init__('minutes', verbose, max_threads, base_dir)
 
@@ -29,22 +36,16 @@ class FomcMinutes(FomcBase):
         Override private function that sets all the links for the contents to download on FOMC website
          from from_year (=min(2015, from_year)) to the current most recent year
         '''
-        self.links = []
-        self.titles = []
-        self.speakers = []
-        self.dates = []
+        self.records = FomcLinkRecords()
 
-        r = requests.get(self.calendar_url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._get(self.calendar_url)
+        soup = self._parse_html(r.text)
 
         # Getting links from current page. Meetin scripts are not available.
         if self.verbose: print("Getting links for minutes...")
         contents = soup.find_all('a', href=re.compile('^/monetarypolicy/fomcminutes\d{8}.htm'))
-        
-        self.links = [content.attrs['href'] for content in contents]
-        self.speakers = [self._speaker_from_date(self._date_from_link(x)) for x in self.links]
-        self.titles = ['FOMC Meeting Minutes'] * len(self.links)
-        self.dates = [datetime.strptime(self._date_from_link(x), '%Y-%m-%d') for x in self.links]
+        for content in contents:
+            self._add_link(content.attrs['href'])
         if self.verbose: print("{} links found in the current page.".format(len(self.links)))
 
         # Archived before 2015
@@ -53,35 +54,24 @@ class FomcMinutes(FomcBase):
             for year in range(from_year, 2015):
                 yearly_contents = []
                 fomc_yearly_url = self.base_url + '/monetarypolicy/fomchistorical' + str(year) + '.htm'
-                r_year = requests.get(fomc_yearly_url)
-                soup_yearly = BeautifulSoup(r_year.text, 'html.parser')
+                r_year = self._get(fomc_yearly_url)
+                soup_yearly = self._parse_html(r_year.text)
                 yearly_contents = soup_yearly.find_all('a', href=re.compile('(^/monetarypolicy/fomcminutes|^/fomc/minutes|^/fomc/MINUTES)'))
                 for yearly_content in yearly_contents:
-                    self.links.append(yearly_content.attrs['href'])
-                    self.speakers.append(self._speaker_from_date(self._date_from_link(yearly_content.attrs['href'])))
-                    self.titles.append('FOMC Meeting Minutes')
-                    self.dates.append(datetime.strptime(self._date_from_link(yearly_content.attrs['href']), '%Y-%m-%d'))
-                    # Sometimes minutes carries the first day of the meeting before 2000, so update them to the 2nd day
-                    if self.dates[-1] == datetime(1996,1,30):
-                        self.dates[-1] = datetime(1996,1,31)
-                    elif self.dates[-1] == datetime(1996,7,2):
-                        self.dates[-1] = datetime(1996,7,3)
-                    elif self.dates[-1] == datetime(1997,2,4):
-                        self.dates[-1] = datetime(1997,2,5)
-                    elif self.dates[-1] == datetime(1997,7,1):
-                        self.dates[-1] = datetime(1997,7,2)
-                    elif self.dates[-1] == datetime(1998,2,3):
-                        self.dates[-1] = datetime(1998,2,4)
-                    elif self.dates[-1] == datetime(1998,6,30):
-                        self.dates[-1] = datetime(1998,7,1)
-                    elif self.dates[-1] == datetime(1999,2,2):
-                        self.dates[-1] = datetime(1999,2,3)
-                    elif self.dates[-1] == datetime(1999,6,29):
-                        self.dates[-1] = datetime(1999,6,30)
+                    self._add_link(yearly_content.attrs['href'])
 
                 if self.verbose: print("YEAR: {} - {} links found.".format(year, len(yearly_contents)))
         print("There are total ", len(self.links), ' links for ', self.content_type)
 
+    def _add_link(self, link):
+        '''
+        Add the link with the meeting date, the chair and the title to the records
+        '''
+        link_date = self._date_from_link(link)
+        m_date = datetime.strptime(link_date, '%Y-%m-%d')
+        m_date = self.date_corrections.get(m_date, m_date)
+        self.records.append(link, m_date, self._speaker_from_date(link_date), 'FOMC Meeting Minutes')
+
     def _add_article(self, link, index=None):
         '''
         Override a private function that adds a related article for 1 link into the instance variable
@@ -92,7 +82,7 @@ class FomcMinutes(FomcBase):
             sys.stdout.write(".")
             sys.stdout.flush()
 
-        res = requests.get(self.base_url + link)
+        res = self._get(self.base_url + link)
         html = res.text
 
         # p tag is not properly closed in many cases
@@ -105,7 +95,7 @@ class FomcMinutes(FomcBase):
             html = html[:x.start()]
             html += '</body></html>'
         # Parse html text by BeautifulSoup
-        article = BeautifulSoup(html, 'html.parser')
+        article = self._parse_html(html)
 
         #if link == '/fomc/MINUTES/1994/19940517min.htm':
         #    print(article)
@@ -5,21 +5,16 @@ import os
 import pickle
 import re
 
-import requests
-from bs4 import BeautifulSoup
-
-import numpy as np
-import pandas as pd
-
 # Tika depends on Java version, so use textract instead as the pdf is anyway a simple text only
 # # User TIKA for pdf parsing
 # os.environ['TIKA_SERVER_JAR'] = 'https://repo1.maven.org/maven2/org/apache/tika/tika-server/1.19/tika-server-1.19.jar'
 # import tika
 # from tika import parser
-import textract
+# textract is imported in _add_article as it is heavy and needed only to extract pdf
 
 # Import parent class
 from .FomcBase import FomcBase
+from .FomcLinkRecords import FomcLinkRecords
 
 class FomcPresConfScript(FomcBase):
     '''
@@ -37,27 +32,21 @@ class FomcPresConfScript(FomcBase):
         Override private function that sets all the links for the contents to download on FOMC website
          from from_year (=min(2015, from_year)) to the current most recent year
         '''
-        self.links = []
-        self.titles = []
-        self.speakers = []
-        self.dates = []
+        self.records = FomcLinkRecords()
 
-        r = requests.get(self.calendar_url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._get(self.calendar_url)
+        soup = self._parse_html(r.text)
         
         if self.verbose: print("Getting links for press conference scripts...")
         presconfs = soup.find_all('a', href=re.compile('^/monetarypolicy/fomcpresconf\d{8}.htm'))
         presconf_urls = [self.base_url + presconf.attrs['href'] for presconf in presconfs]
         for presconf_url in presconf_urls:
-            r_presconf = requests.get(presconf_url)
-            soup_presconf = BeautifulSoup(r_presconf.text, 'html.parser')
+            r_presconf = self._get(presconf_url)
+            soup_presconf = self._parse_html(r_presconf.text)
             contents = soup_presconf.find_all('a', href=re.compile('^/mediacenter/files/FOMCpresconf\d{8}.pdf'))
             for content in contents:
                 #print(content)
-                self.links.append(content.attrs['href'])
-                self.speakers.append(self._speaker_from_date(self._date_from_link(content.attrs['href'])))
-                self.titles.append('FOMC Press Conference Transcript')
-                self.dates.append(datetime.strptime(self._date_from_link(content.attrs['href']), '%Y-%m-%d'))
+                self._add_link(content.attrs['href'])
         if self.verbose: print("{} links found in current page.".format(len(self.links)))
         
         # Archived before 2015
@@ -66,26 +55,28 @@ class FomcPresConfScript(FomcBase):
             for year in range(from_year, 2015):
                 yearly_contents = []
                 fomc_yearly_url = self.base_url + '/monetarypolicy/fomchistorical' + str(year) + '.htm'
-                r_year = requests.get(fomc_yearly_url)
-                soup_yearly = BeautifulSoup(r_year.text, 'html.parser')
+                r_year = self._get(fomc_yearly_url)
+                soup_yearly = self._parse_html(r_year.text)
 
                 presconf_hists = soup_yearly.find_all('a', href=re.compile('^/monetarypolicy/fomcpresconf\d{8}.htm'))
                 presconf_hist_urls = [self.base_url + presconf_hist.attrs['href'] for presconf_hist in presconf_hists]
                 for presconf_hist_url in presconf_hist_urls:
                     #print(presconf_hist_url)
-                    r_presconf_hist = requests.get(presconf_hist_url)
-                    soup_presconf_hist = BeautifulSoup(r_presconf_hist.text, 'html.parser')
+                    r_presconf_hist = self._get(presconf_hist_url)
+                    soup_presconf_hist = self._parse_html(r_presconf_hist.text)
                     yearly_contents = soup_presconf_hist.find_all('a', href=re.compile('^/mediacenter/files/FOMCpresconf\d{8}.pdf'))
                     for yearly_content in yearly_contents:
                         #print(yearly_content)
-                        self.links.append(yearly_content.attrs['href'])
-                        self.speakers.append(self._speaker_from_date(self._date_from_link(yearly_content.attrs['href'])))
-                        self.titles.append('FOMC Press Conference Transcript')
-                        self.dates.append(datetime.strptime(self._date_from_link(yearly_content.attrs['href']), '%Y-%m-%d'))
+                        self._add_link(yearly_content.attrs['href'])
                 if self.verbose: print("YEAR: {} - {} links found.".format(year, len(presconf_hist_urls)))
             print("There are total ", len(self.links), ' links for ', self.content_type)
 
-
+    def _add_link(self, link):
+        '''
+        Add the link with the meeting date, the chair and the title to the records
+        '''
+        link_date = self._date_from_link(link)
+        self.records.append(link, datetime.strptime(link_date, '%Y-%m-%d'), self._speaker_from_date(link_date), 'FOMC Press Conference Transcript')
 
     def _add_article(self, link, index=None):
         '''
@@ -101,15 +92,18 @@ class FomcPresConfScript(FomcBase):
         pdf_filepath = self.base_dir + 'script_pdf/FOMC_PresConfScript_' + self._date_from_link(link) + '.pdf'
 
         # Scripts are provided only in pdf. Save the pdf and pass the content
-        res = requests.get(link_url)
+        res = self._get(link_url)
 
-        with open(pdf_filepath, 'wb') as f:
-            f.write(res.content)
+        with self.metrics.timer('write', self.content_type):
+            with open(pdf_filepath, 'wb') as f:
+                f.write(res.content)
 
         # Extract text from the pdf
         # pdf_file_parsed = parser.from_file(pdf_filepath)
         # paragraphs = re.sub('(\n)(\n)+', '\n', pdf_file_parsed['content'].strip())
-        pdf_file_parsed = textract.process(pdf_filepath).decode('utf-8')
+        with self.metrics.timer('pdf', self.content_type):
+            import textract
+            pdf_file_parsed = textract.process(pdf_filepath).decode('utf-8')
         paragraphs = re.sub('(\n)(\n)+', '\n', pdf_file_parsed.strip())
         paragraphs = paragraphs.split('\n')
 
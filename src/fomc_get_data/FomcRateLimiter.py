@@ -0,0 +1,154 @@
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from collections import deque
+import threading
+import time
+
+import requests
+
+class FomcRateLimiter:
+    '''
+    A token bucket rate limiter with an adaptive concurrency limit, shared by all scrapers in a process.
+    The rate and the number of requests in flight grow while the latency is stable,
+     and are halved on 429, 5xx or connection errors (AIMD), so that the crawl finds the maximum
+     sustainable throughput by itself. Retry-After of the server pauses all requests until then.
+    429 and 5xx responses are retried with exponential backoff up to max_retries, then raise HTTPError.
+
+    Example Usage:
+        limiter = FomcRateLimiter(rate=5, max_rate=20)
+        for fomc in (FomcStatement(), FomcMinutes()):
+            fomc.limiter = limiter
+            fomc.get_contents()
+    '''
+    def __init__(self, rate=5.0, min_rate=0.5, max_rate=20.0, max_concurrency=10, max_retries=5, backoff=1.0,
+                 latency_tolerance=2.0, latency_window=50, max_retry_after=300):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        # Latency is regarded as stable while the moving average is within this multiple of the best one
+        # of the last latency_window responses, so that one small response does not set the bar forever
+        self.latency_tolerance = latency_tolerance
+        self.max_retry_after = max_retry_after
+
+        self.cond = threading.Condition()
+        self.limit = min(2, max_concurrency)
+        self.in_flight = 0
+        self.tokens = 1.0
+        self.last_refill = time.monotonic()
+        self.paused_until = 0.0
+        self.latency_avg = None
+        self.latencies = deque(maxlen=latency_window)
+        self.successes = 0
+        # The rate doubles per window until the first sign of congestion, then grows additively
+        self.slow_start = True
+
+    def _refill(self, now):
+        # The bucket holds up to one second of requests at the current rate
+        capacity = max(1.0, self.rate)
+        self.tokens = min(capacity, self.tokens + (now - self.last_refill) * self.rate)
+        self.last_refill = now
+
+    def _acquire(self):
+        '''
+        Wait for a token and a free slot of the concurrency limit
+        '''
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.paused_until:
+                    self.cond.wait(self.paused_until - now)
+                elif self.in_flight >= self.limit:
+                    self.cond.wait()
+                elif self.tokens < 1:
+                    self.cond.wait((1 - self.tokens) / self.rate)
+                else:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    return
+
+    def _release(self, seconds, ok, retry_after=None):
+        '''
+        Free the slot and adapt the rate and the concurrency limit by the result
+        '''
+        with self.cond:
+            self.in_flight -= 1
+            if ok:
+                self.latency_avg = seconds if self.latency_avg is None else 0.8 * self.latency_avg + 0.2 * seconds
+                self.latencies.append(seconds)
+                if self.latency_avg <= min(self.latencies) * self.latency_tolerance:
+                    # Increase once per window of the current limit
+                    self.successes += 1
+                    if self.successes >= self.limit:
+                        self.successes = 0
+                        self.limit = min(self.max_concurrency, self.limit + 1)
+                        self.rate = min(self.max_rate, self.rate * 2 if self.slow_start else self.rate + 1)
+                else:
+                    # The server slows down. Stop growing and shrink the concurrency gently.
+                    self.successes = 0
+                    self.slow_start = False
+                    self.limit = max(1, self.limit - 1)
+            else:
+                # Multiplicative decrease
+                self.successes = 0
+                self.slow_start = False
+                self.limit = max(1, self.limit // 2)
+                self.rate = max(self.min_rate, self.rate / 2)
+                self.tokens = min(self.tokens, 0.0)
+                if retry_after is not None:
+                    self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self.cond.notify_all()
+
+    def _retry_after(self, res):
+        '''
+        Returns seconds of Retry-After header, which is either seconds or an HTTP date, or None
+        '''
+        value = res.headers.get('Retry-After')
+        if not value:
+            return None
+        try:
+            seconds = float(value)
+        except ValueError:
+            try:
+                seconds = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return None
+        return min(max(0.0, seconds), self.max_retry_after)
+
+    def get(self, url, get=requests.get, metrics=None, content_type=''):
+        '''
+        GET the url within the rate and concurrency limits, retrying on 429, 5xx and connection errors
+        '''
+        for attempt in range(self.max_retries + 1):
+            self._acquire()
+            start = time.perf_counter()
+            try:
+                res = get(url)
+            except requests.exceptions.RequestException:
+                self._release(time.perf_counter() - start, False)
+                if attempt == self.max_retries:
+                    raise
+                retry_after = None
+            else:
+                retryable = res.status_code == 429 or res.status_code >= 500
+                retry_after = self._retry_after(res) if retryable else None
+                self._release(time.perf_counter() - start, not retryable, retry_after)
+                if not retryable:
+                    break
+                if attempt == self.max_retries:
+                    raise requests.exceptions.HTTPError("{} for {} after {} retries".format(res.status_code, url, self.max_retries), response=res)
+
+            if metrics is not None:
+                metrics.inc('retries', 1, content_type)
+            # Back off exponentially unless Retry-After asked for a longer pause, which _acquire waits for
+            backoff = self.backoff * 2 ** attempt
+            if retry_after is None or retry_after < backoff:
+                time.sleep(backoff - (retry_after or 0))
+
+        if metrics is not None:
+            metrics.set_gauge('rate_limit', self.rate, content_type)
+            metrics.set_gauge('concurrency_limit', self.limit, content_type)
+        return res
@@ -0,0 +1,181 @@
+import threading
+import socket
+import json
+import time
+import os
+
+class FomcShardQueue:
+    '''
+    A task queue in a directory shared by the worker processes, on one box or on nodes sharing a file system.
+    Each task is a JSON file, which moves between the state directories todo/, running/, done/ and failed/.
+    A worker claims a task by an atomic rename from todo/ to running/, so that each task runs only once,
+     and keeps the lease by touching the running file. A task whose lease is older than lease_seconds,
+     e.g. of a killed worker, is put back to todo/ by requeue_stale().
+
+    Example Usage:
+        queue = FomcShardQueue('../data/FOMC/shards/queue/')
+        queue.put('ingest-statement-2019', {'kind': 'ingest', 'content_type': 'statement', 'year': 2019})
+        task = queue.claim()
+        with queue.heartbeat(task):
+            ...
+        queue.complete(task)
+    '''
+    states = ('todo', 'running', 'done', 'failed')
+
+    def __init__(self, queue_dir='../data/FOMC/shards/queue/', lease_seconds=600):
+        self.queue_dir = queue_dir
+        self.lease_seconds = lease_seconds
+        self.worker_id = '{}.{}'.format(socket.gethostname(), os.getpid())
+        for state in self.states:
+            os.makedirs(os.path.join(queue_dir, state), exist_ok=True)
+
+    def _path(self, state, name):
+        return os.path.join(self.queue_dir, state, name)
+
+    def _names(self, state):
+        return sorted(name for name in os.listdir(os.path.join(self.queue_dir, state)) if not name.startswith('.'))
+
+    def put(self, task_id, task, replace=False):
+        '''
+        Add a task to todo/. A task already in any state is not added again unless replace is True.
+        Returns True if added.
+        '''
+        name = task_id + '.json'
+        existing = [state for state in self.states if any(n == name or n.startswith(name + '.') for n in self._names(state))]
+        if existing and not replace:
+            return False
+        for state in existing:
+            for n in self._names(state):
+                if n == name or n.startswith(name + '.'):
+                    os.remove(self._path(state, n))
+        task = dict(task, id=task_id)
+        tmp_path = self._path('todo', '.' + name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(task, f)
+        os.replace(tmp_path, self._path('todo', name))
+        return True
+
+    def claim(self):
+        '''
+        Returns the first task in todo/ moved to running/, or None if nothing to claim
+        '''
+        for name in self._names('todo'):
+            # The worker id in the name tells which worker is running it
+            running = self._path('running', name + '.' + self.worker_id)
+            try:
+                os.rename(self._path('todo', name), running)
+            except FileNotFoundError:
+                # Claimed by another worker
+                continue
+            os.utime(running, None)
+            with open(running, 'r') as f:
+                task = json.load(f)
+            task['_running'] = running
+            return task
+        return None
+
+    def heartbeat(self, task):
+        '''
+        Returns a context manager which keeps the lease of the task while the block runs
+        '''
+        return _Heartbeat(task['_running'], max(1.0, self.lease_seconds / 3))
+
+    def _finish(self, task, state, result):
+        record = dict((k, v) for k, v in task.items() if not k.startswith('_'))
+        record.update(result or {})
+        record['worker'] = self.worker_id
+        record['finished'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        name = task['id'] + '.json'
+        tmp_path = self._path(state, '.' + name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp_path, self._path(state, name))
+        try:
+            os.remove(task['_running'])
+        except FileNotFoundError:
+            # Requeued as stale meanwhile. The result is kept, and the requeued one is removed.
+            todo = self._path('todo', name)
+            if os.path.exists(todo):
+                os.remove(todo)
+
+    def complete(self, task, result=None):
+        self._finish(task, 'done', result)
+
+    def fail(self, task, error):
+        self._finish(task, 'failed', {'error': error})
+
+    def requeue_stale(self):
+        '''
+        Put back the running tasks whose lease has expired. Returns the number of tasks requeued.
+        '''
+        count = 0
+        now = time.time()
+        for name in self._names('running'):
+            path = self._path('running', name)
+            try:
+                if now - os.path.getmtime(path) < self.lease_seconds:
+                    continue
+                os.rename(path, self._path('todo', name.split('.json', 1)[0] + '.json'))
+                count += 1
+            except FileNotFoundError:
+                continue
+        return count
+
+    def retry_failed(self):
+        '''
+        Put back all failed tasks to todo/. Returns the number of tasks.
+        '''
+        count = 0
+        for name in self._names('failed'):
+            with open(self._path('failed', name), 'r') as f:
+                task = json.load(f)
+            for key in ('error', 'worker', 'finished'):
+                task.pop(key, None)
+            if self.put(task.pop('id'), task, replace=True):
+                count += 1
+        return count
+
+    def tasks(self, state):
+        '''
+        Returns the list of tasks in the state
+        '''
+        tasks = []
+        for name in self._names(state):
+            try:
+                with open(self._path(state, name), 'r') as f:
+                    tasks.append(json.load(f))
+            except (FileNotFoundError, ValueError):
+                continue
+        return tasks
+
+    def counts(self):
+        return {state: len(self._names(state)) for state in self.states}
+
+    def empty(self):
+        '''
+        Returns True if no task is waiting or running
+        '''
+        return not self._names('todo') and not self._names('running')
+
+class _Heartbeat:
+    def __init__(self, path, interval):
+        self.path = path
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                os.utime(self.path, None)
+            except FileNotFoundError:
+                return
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stopped.set()
+        self.thread.join()
+        return False
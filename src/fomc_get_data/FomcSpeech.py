@@ -5,14 +5,9 @@ import os
 import pickle
 import re
 
-import requests
-from bs4 import BeautifulSoup
-
-import numpy as np
-import pandas as pd
-
 # Import parent class
 from .FomcBase import FomcBase
+from .FomcLinkRecords import FomcLinkRecords
 
 class FomcSpeech(FomcBase):
     '''
@@ -30,13 +25,10 @@ class FomcSpeech(FomcBase):
         Override private function that sets all the links for the contents to download on FOMC website
          from from_year (=min(2015, from_year)) to the current most recent year
         '''
-        self.links = []
-        self.titles = []
-        self.speakers = []
-        self.dates = []
+        self.records = FomcLinkRecords()
 
-        res = requests.get(self.calendar_url)
-        soup = BeautifulSoup(res.text, 'html.parser')
+        res = self._get(self.calendar_url)
+        soup = self._parse_html(res.text)
 
         if self.verbose: print("Getting links for speeches...")
         to_year = datetime.today().strftime("%Y")
@@ -51,19 +43,14 @@ class FomcSpeech(FomcBase):
             else:
                 speech_url = self.speech_base_url + '/' + str(year) + '-speeches.htm'
 
-            res = requests.get(speech_url)
-            soup = BeautifulSoup(res.text, 'html.parser')
+            res = self._get(speech_url)
+            soup = self._parse_html(res.text)
             speech_links = soup.findAll('a', href=re.compile('^/?newsevents/speech/.*{}\d\d\d\d.*.htm|^/boarddocs/speeches/{}/|^{}\d\d\d\d.*.htm'.format(str(year), str(year), str(year))))
             for speech_link in speech_links:
                 # Sometimes the same link is put for watch live video. Skip those.
                 if speech_link.find({'class': 'watchLive'}):
                     continue
 
-                # Add link, title and date
-                self.links.append(speech_link.attrs['href'])
-                self.titles.append(speech_link.get_text())
-                self.dates.append(datetime.strptime(self._date_from_link(speech_link.attrs['href']), '%Y-%m-%d'))
-
                 # Add speaker
                 # Somehow the speaker is before the link in 1997 only, whereas the others is vice-versa
                 if year == 1997:
@@ -80,7 +67,10 @@ class FomcSpeech(FomcBase):
                     # When a video icon is placed between the link and speaker
                     if tmp_speaker in ('Watch Live', 'Video'):
                         tmp_speaker = speech_link.parent.next_sibling.next_sibling.next_sibling.next_element.get_text().replace('\n', '').strip()
-                self.speakers.append(tmp_speaker)
+
+                # Add link, date, speaker and title
+                link = speech_link.attrs['href']
+                self.records.append(link, datetime.strptime(self._date_from_link(link), '%Y-%m-%d'), tmp_speaker, speech_link.get_text())
             if self.verbose: print("YEAR: {} - {} speeches found.".format(year, len(speech_links)))
 
     def _add_article(self, link, index=None):
@@ -93,7 +83,7 @@ class FomcSpeech(FomcBase):
             sys.stdout.write(".")
             sys.stdout.flush()
 
-        res = requests.get(self.base_url + link)
+        res = self._get(self.base_url + link)
         html = res.text
         # p tag is not properly closed in many cases
         html = html.replace('<P', '<p').replace('</P>', '</p>')
@@ -104,7 +94,7 @@ class FomcSpeech(FomcBase):
             html = html[:x.start()]
             html += '</body></html>'
         # Parse html text by BeautifulSoup
-        article = BeautifulSoup(html, 'html.parser')
+        article = self._parse_html(html)
         # Remove footnote
         for fn in article.find_all('a', {'name': re.compile('fn\d')}):
             if fn.parent:
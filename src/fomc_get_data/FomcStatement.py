@@ -5,14 +5,9 @@ import os
 import pickle
 import re
 
-import requests
-from bs4 import BeautifulSoup
-
-import numpy as np
-import pandas as pd
-
 # Import parent class
 from .FomcBase import FomcBase
+from .FomcLinkRecords import FomcLinkRecords
 
 class FomcStatement(FomcBase):
     '''
@@ -21,6 +16,16 @@ class FomcStatement(FomcBase):
         fomc = FomcStatement()
         df = fomc.get_contents()
     '''
+    # Some date in the link does not match with the meeting date
+    date_corrections = {
+        datetime(2019,10,11): datetime(2019,10,4),
+        datetime(2007,6,18): datetime(2007,6,28),
+        datetime(2007,8,17): datetime(2007,8,16),
+        datetime(2008,1,22): datetime(2008,1,21),
+        datetime(2008,3,11): datetime(2008,3,10),
+        datetime(2008,10,8): datetime(2008,10,7)
+    }
+
     def __init__(self, verbose = True, max_threads = 10, base_dir = '../data/FOMC/'):
         super().__init__('statement', verbose, max_threads, base_dir)
 
@@ -29,25 +34,16 @@ class FomcStatement(FomcBase):
         Override private function that sets all the links for the contents to download on FOMC website
          from from_year (=min(2015, from_year)) to the current most recent year
         '''
-        self.links = []
-        self.titles = []
-        self.speakers = []
-        self.dates = []
+        self.records = FomcLinkRecords()
 
-        r = requests.get(self.calendar_url)
-        soup = BeautifulSoup(r.text, 'html.parser')
+        r = self._get(self.calendar_url)
+        soup = self._parse_html(r.text)
         
         # Getting links from current page. Meetin scripts are not available.
         if self.verbose: print("Getting links for statements...")
         contents = soup.find_all('a', href=re.compile('^/newsevents/pressreleases/monetary\d{8}[ax].htm'))
-        self.links = [content.attrs['href'] for content in contents]
-        self.speakers = [self._speaker_from_date(self._date_from_link(x)) for x in self.links]
-        self.titles = ['FOMC Statement'] * len(self.links)
-        self.dates = [datetime.strptime(self._date_from_link(x), '%Y-%m-%d') for x in self.links]
-        # Correct some date in the link does not match with the meeting date
-        for i, m_date in enumerate(self.dates):
-            if m_date == datetime(2019,10,11):
-                self.dates[i] = datetime(2019,10,4)
+        for content in contents:
+            self._add_link(content.attrs['href'])
 
         if self.verbose: print("{} links found in the current page.".format(len(self.links)))
 
@@ -57,30 +53,26 @@ class FomcStatement(FomcBase):
             for year in range(from_year, 2015):
                 yearly_contents = []
                 fomc_yearly_url = self.base_url + '/monetarypolicy/fomchistorical' + str(year) + '.htm'
-                r_year = requests.get(fomc_yearly_url)
-                soup_yearly = BeautifulSoup(r_year.text, 'html.parser')
+                r_year = self._get(fomc_yearly_url)
+                soup_yearly = self._parse_html(r_year.text)
                 yearly_contents = soup_yearly.findAll('a', text = 'Statement')
                 for yearly_content in yearly_contents:
-                    self.links.append(yearly_content.attrs['href'])
-                    self.speakers.append(self._speaker_from_date(self._date_from_link(yearly_content.attrs['href'])))
-                    self.titles.append('FOMC Statement')
-                    self.dates.append(datetime.strptime(self._date_from_link(yearly_content.attrs['href']), '%Y-%m-%d'))
-                    # Correct some date in the link does not match with the meeting date
-                    if self.dates[-1] == datetime(2007,6,18):
-                        self.dates[-1] = datetime(2007,6,28)
-                    elif self.dates[-1] == datetime(2007,8,17):
-                        self.dates[-1] = datetime(2007,8,16)
-                    elif self.dates[-1] == datetime(2008,1,22):
-                        self.dates[-1] = datetime(2008,1,21)
-                    elif self.dates[-1] == datetime(2008,3,11):
-                        self.dates[-1] = datetime(2008,3,10)
-                    elif self.dates[-1] == datetime(2008,10,8):
-                        self.dates[-1] = datetime(2008,10,7)
+                    self._add_link(yearly_content.attrs['href'])
 
                 if self.verbose: print("YEAR: {} - {} links found.".format(year, len(yearly_contents)))
 
         print("There are total ", len(self.links), ' links for ', self.content_type)
 
+    def _add_link(self, link):
+        '''
+        Add the link with the meeting date, the chair and the title to the records
+        '''
+        link_date = self._date_from_link(link)
+        m_date = datetime.strptime(link_date, '%Y-%m-%d')
+        # Correct some date in the link does not match with the meeting date
+        m_date = self.date_corrections.get(m_date, m_date)
+        self.records.append(link, m_date, self._speaker_from_date(link_date), 'FOMC Statement')
+
     def _add_article(self, link, index=None):
         '''
         Override a private function that adds a related article for 1 link into the instance variable
@@ -91,8 +83,8 @@ class FomcStatement(FomcBase):
             sys.stdout.write(".")
             sys.stdout.flush()
 
-        res = requests.get(self.base_url + link)
+        res = self._get(self.base_url + link)
         html = res.text
-        article = BeautifulSoup(html, 'html.parser')
+        article = self._parse_html(html)
         paragraphs = article.findAll('p')
         self.articles[index] = "\n\n[SECTION]\n\n".join([paragraph.get_text().strip() for paragraph in paragraphs])
\ No newline at end of file
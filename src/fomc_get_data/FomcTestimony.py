@@ -3,17 +3,12 @@ import threading
 import sys
 import os
 import pickle
-import re
-
-import requests
-from bs4 import BeautifulSoup
 import json
-
-import numpy as np
-import pandas as pd
+import re
 
 # Import parent class
 from .FomcBase import FomcBase
+from .FomcLinkRecords import FomcLinkRecords
 
 class FomcTestimony(FomcBase):
     '''
@@ -31,10 +26,7 @@ class FomcTestimony(FomcBase):
         Override private function that sets all the links for the contents to download on FOMC website
          from from_year (=min(1996, from_year)) to the current most recent year
         '''
-        self.links = []
-        self.titles = []
-        self.speakers = []
-        self.dates = []
+        self.records = FomcLinkRecords()
 
         if self.verbose: print("Getting links for testimony...")
         to_year = datetime.today().strftime("%Y")
@@ -46,32 +38,26 @@ class FomcTestimony(FomcBase):
             print("All data from 2006 is in a single json, so return all from 2006 anyway though specified from year is ", from_year)
 
         url = self.base_url + '/json/ne-testimony.json'
-        res = requests.get(url)
+        res = self._get(url)
         res_list = json.loads(res.text)
         for record in res_list:
             doc_link = record.get('l')
             if doc_link:
-                self.links.append(doc_link)
-                self.titles.append(record.get('t'))
-                self.speakers.append(record.get('s'))
                 date_str = record.get('d').split(" ")[0]
-                self.dates.append(datetime.strptime(date_str, '%m/%d/%Y'))
+                self.records.append(doc_link, datetime.strptime(date_str, '%m/%d/%Y'), record.get('s'), record.get('t'))
 
         if from_year < 2006:
             for year in range(from_year, 2006):
                 url = self.base_url + '/newsevents/testimony/' + str(year) + 'testimony.htm'
 
-                res = requests.get(url)
-                soup = BeautifulSoup(res.text, 'html.parser')
+                res = self._get(url)
+                soup = self._parse_html(res.text)
 
                 doc_links = soup.findAll('a', href=re.compile('^/boarddocs/testimony/{}/|^/boarddocs/hh/{}/'.format(str(year), str(year))))
                 for doc_link in doc_links:
                     # Sometimes the same link is put for watch live video. Skip those.
                     if doc_link.find({'class': 'watchLive'}):
                         continue
-                    # Add links
-                    self.links.append(doc_link.attrs['href'])
-
                     # Handle mark-up mistakes
                     if doc_link.get('href') in ('/boarddocs/testimony/2005/20050420/default.htm'):
                         title = doc_link.get_text()
@@ -89,9 +75,8 @@ class FomcTestimony(FomcBase):
                             speaker = doc_link.parent.find_next('p').find_next('p').get_text().replace('\n', '').strip()
                         date_str = doc_link.parent.parent.next_element.replace('\n', '').strip()
 
-                    self.titles.append(doc_link.get_text())
-                    self.speakers.append(speaker)
-                    self.dates.append(datetime.strptime(date_str, '%B %d, %Y'))
+                    # Add link, date, speaker and title
+                    self.records.append(doc_link.attrs['href'], datetime.strptime(date_str, '%B %d, %Y'), speaker, title)
                     
                 if self.verbose: print("YEAR: {} - {} testimony docs found.".format(year, len(doc_links)))
 
@@ -113,7 +98,7 @@ class FomcTestimony(FomcBase):
         # date of the article content
         # self.dates.append(article_date)
 
-        res = requests.get(self.base_url + link)
+        res = self._get(self.base_url + link)
         html = res.text
         # p tag is not properly closed in many cases
         html = html.replace('<P', '<p').replace('</P>', '</p>')
@@ -124,7 +109,7 @@ class FomcTestimony(FomcBase):
             html = html[:x.start()]
             html += '</body></html>'
         # Parse html text by BeautifulSoup
-        article = BeautifulSoup(html, 'html.parser')
+        article = self._parse_html(html)
         # Remove footnote
         for fn in article.find_all('a', {'name': re.compile('fn\d')}):
             # if fn.parent:
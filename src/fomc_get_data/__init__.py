@@ -1,6 +1,33 @@
-from .FomcStatement import FomcStatement
-from .FomcMinutes import FomcMinutes
-from .FomcMeetingScript import FomcMeetingScript
-from .FomcPresConfScript import FomcPresConfScript
-from .FomcSpeech import FomcSpeech
-from .FomcTestimony import FomcTestimony
\ No newline at end of file
+'''
+Classes are imported when first accessed, e.g. fomc_get_data.FomcStatement, so that a script using one
+ content type does not load the modules and dependencies of the others.
+'''
+import importlib
+
+__all__ = [
+    'FomcStatement',
+    'FomcMinutes',
+    'FomcMeetingScript',
+    'FomcPresConfScript',
+    'FomcSpeech',
+    'FomcTestimony',
+    'FomcDedup',
+    'FomcCrawlJournal',
+    'FomcMetrics',
+    'FomcArchive',
+    'FomcRateLimiter',
+    'FomcLinkRecords',
+    'FomcCorpusStore',
+    'FomcShardQueue'
+]
+
+def __getattr__(name):
+    # Each class is in the module of the same name
+    if name in __all__:
+        value = getattr(importlib.import_module('.' + name, __name__), name)
+        globals()[name] = value
+        return value
+    raise AttributeError("module {!r} has no attribute {!r}".format(__name__, name))
+
+def __dir__():
+    return sorted(list(globals().keys()) + __all__)